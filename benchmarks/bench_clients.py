@@ -0,0 +1,49 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Measures boto3 client construction: the import of the Lambda handler (which no longer builds clients at import time), a
+# brand-new config client per account as before, and the cached clients used now. No AWS calls are made. Run from the
+# project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_clients.py --accounts 150
+import argparse
+import os
+import subprocess
+import sys
+import time
+import boto3
+from inventory.clients import clear_cache, get_client
+
+def _credentials(account_index: int) -> dict:
+    return { "AccessKeyId": f"ASIA{account_index:016d}", "SecretAccessKey": "secret", "SessionToken": "token" }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark boto3 client construction")
+    parser.add_argument("--accounts", type=int, default=150)
+    parser.add_argument("--runs", type=int, default=2, help="invocations of a warm Lambda container")
+    args = parser.parse_args()
+
+    region_name = os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import inventory.handler"], check=True)
+    print(f"{'cold import of inventory.handler (subprocess)':<48}{time.perf_counter() - started:>10.3f}s")
+
+    for run in range(1, args.runs + 1):
+        started = time.perf_counter()
+        for account_index in range(args.accounts):
+            credentials = _credentials(account_index)
+            boto3.client("config", region_name=region_name, aws_access_key_id=credentials["AccessKeyId"],
+                         aws_secret_access_key=credentials["SecretAccessKey"], aws_session_token=credentials["SessionToken"])
+        print(f"{f'new client per account, run {run}':<48}{time.perf_counter() - started:>10.3f}s")
+
+    clear_cache()
+    for run in range(1, args.runs + 1):
+        started = time.perf_counter()
+        for account_index in range(args.accounts):
+            get_client("config", region_name=region_name, credentials=_credentials(account_index))
+        print(f"{f'cached client per account, run {run}':<48}{time.perf_counter() - started:>10.3f}s")
+
+if __name__ == "__main__":
+    main()
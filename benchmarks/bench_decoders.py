@@ -0,0 +1,52 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Compares the JSON decoders on the recorded sample.json results scaled up, decoding each result on its own and a page at a time.
+# Pages hold 100 results, the largest page AWS Config returns.
+# Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_decoders.py --records 100000
+import argparse
+import json
+import time
+from inventory.decoders import OrjsonJsonDecoder, StdlibJsonDecoder, orjson_loads
+from synthetic import load_sample
+
+_page_size = 100
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON decoders over AWS Config query results")
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    samples = [ json.dumps(resource) for resource in load_sample("sample.json") ]
+    raw_resources = [ samples[index % len(samples)] for index in range(args.records) ]
+    pages = [ raw_resources[index:index + _page_size] for index in range(0, len(raw_resources), _page_size) ]
+    decoders = [ ("json", StdlibJsonDecoder()) ] + ([ ("orjson", OrjsonJsonDecoder()) ] if orjson_loads is not None else [])
+
+    print(f"{'decoder':<10}{'mode':<10}{'seconds':>10}{'records/s':>14}")
+
+    for name, decoder in decoders:
+        for mode, decode in (("single", lambda: _decode_single(decoder, pages)), ("page", lambda: _decode_pages(decoder, pages))):
+            seconds = min(_time(decode) for _ in range(3))
+
+            print(f"{name:<10}{mode:<10}{seconds:>10.3f}{args.records / seconds:>14.0f}")
+
+# Decoded pages are dropped straight away like the reader does once they are mapped
+def _decode_single(decoder, pages):
+    for page in pages:
+        [ decoder.decode(raw_resource) for raw_resource in page ]
+
+def _decode_pages(decoder, pages):
+    for page in pages:
+        decoder.decode_page(page)
+
+def _time(fn) -> float:
+    start = time.perf_counter()
+    fn()
+
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Measures the memory held by a list of inventory rows for the previous dictionary backed InventoryData, the slotted
+# InventoryData and the columnar InventoryBatch. Values that differ per row (ids, IPs) are created for every row while the
+# remaining values are shared, like they are when mapping AWS Config results. Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_inventory_memory.py --rows 1000000
+import argparse
+import gc
+import tracemalloc
+from inventory.mappers import InventoryBatch, InventoryData
+
+class DictInventoryData:
+    # InventoryData before it was slotted
+    def __init__(self, **kwargs):
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+def _row_values(index: int) -> dict:
+    return { "asset_type": "EC2", "unique_id": f"i-{index:017x}", "ip_address": f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}",
+             "location": None, "is_virtual": "Yes", "authenticated_scan_planned": "Yes", "dns_name": None, "mac_address": "06:d1:af:2f:a4:46",
+             "baseline_config": "ami-6e92711f", "hardware_model": "t3.micro", "is_public": "No", "network_id": "vpc-88e50ee1", "owner": "owner@example.com",
+             "software_product_name": None, "software_vendor": None }
+
+def _measure(build, row_count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+
+    rows = build(row_count)
+    current, _ = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+    del rows
+
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory held by inventory rows")
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    representations = (("dict InventoryData", lambda row_count: [DictInventoryData(**_row_values(index)) for index in range(row_count)]),
+                       ("slotted InventoryData", lambda row_count: [InventoryData(**_row_values(index)) for index in range(row_count)]),
+                       ("InventoryBatch", lambda row_count: InventoryBatch(InventoryData(**_row_values(index)) for index in range(row_count))))
+
+    print(f"{'representation':<24}{'rows':>10}{'MB':>10}{'bytes/row':>12}")
+
+    for name, build in representations:
+        allocated = _measure(build, args.rows)
+
+        print(f"{name:<24}{args.rows:>10}{allocated / 1024 / 1024:>10.1f}{allocated / args.rows:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Measures the cost of finding the mapper for a resource, comparing the previous linear can_map scan with the registry lookup.
+# Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_mapper_dispatch.py
+import argparse
+import timeit
+from inventory.mappers import get_default_mapper_registry
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mapper dispatch cost per resource")
+    parser.add_argument("--resources", type=int, default=1000000)
+    args = parser.parse_args()
+
+    registry = get_default_mapper_registry()
+    mappers = registry.mappers
+    # Last registered resource type is the worst case for the linear scan
+    resource_types = registry.resource_types + ["AWS::Unsupported::Type"]
+
+    def linear_scan():
+        for resource_type in resource_types:
+            next((mapper for mapper in mappers if resource_type in mapper._get_supported_resource_type()), None)
+
+    def registry_lookup():
+        for resource_type in resource_types:
+            registry.get_mapper(resource_type)
+
+    iterations = max(1, args.resources // len(resource_types))
+
+    print(f"{'dispatch':<18}{'ns/resource':>12}")
+
+    for name, dispatch in (("linear can_map", linear_scan), ("registry", registry_lookup)):
+        seconds = min(timeit.repeat(dispatch, number=iterations, repeat=3))
+
+        print(f"{name:<18}{seconds / (iterations * len(resource_types)) * 1e9:>12.1f}")
+
+if __name__ == "__main__":
+    main()
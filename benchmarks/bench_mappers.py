@@ -0,0 +1,119 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Measures mapping throughput over synthetic AWS Config results with many NICs and IPs per instance, comparing the current
+# mappers with the previous implementation that deep copied the row for every additional IP. Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_mappers.py --instances 2000 --nics 4 --ips 4
+import argparse
+import copy
+import time
+from typing import List
+from inventory.mappers import EC2DataMapper, ElbDataMapper, InventoryData, RdsDataMapper
+from synthetic import synthetic_ec2_instance, synthetic_load_balancer, synthetic_rds_instance
+
+def _get_tag_value(tags: dict, tag_name: str) -> str:
+    # Linear scan the mappers used before the tag index
+    return next((tag["value"] for tag in tags if tag["key"].casefold() == tag_name.casefold()), '')
+
+class DeepCopyEC2DataMapper(EC2DataMapper):
+    # EC2DataMapper before the deep copies were removed
+    def _do_mapping(self, config_resource: dict) -> List[InventoryData]:
+        ec2_data_list: List[InventoryData] = []
+
+        for nic in config_resource["configuration"]["networkInterfaces"]:
+            for ipAddress in nic["privateIpAddresses"]:
+                ec2_data = { "asset_type": "EC2",
+                             "unique_id": config_resource["configuration"]["instanceId"],
+                             "ip_address": ipAddress["privateIpAddress"],
+                             "is_virtual": "Yes",
+                             "authenticated_scan_planned": "Yes",
+                             "mac_address": nic["macAddress"],
+                             "baseline_config": config_resource["configuration"]["imageId"],
+                             "hardware_model": config_resource["configuration"]["instanceType"],
+                             "network_id": config_resource["configuration"]["vpcId"],
+                             "owner": _get_tag_value(config_resource["tags"], "owner") }
+
+                if (public_dns_name := config_resource["configuration"].get("publicDnsName")):
+                    ec2_data["dns_name"] = public_dns_name
+                    ec2_data["is_public"] = "Yes"
+                else:
+                    ec2_data["dns_name"] = config_resource["configuration"]["privateDnsName"]
+                    ec2_data["is_public"] = "No"
+
+                ec2_data_list.append(InventoryData(**ec2_data))
+
+                if "association" in ipAddress:
+                    ec2_data = copy.deepcopy(ec2_data)
+                    ec2_data["ip_address"] = ipAddress["association"]["publicIp"]
+
+                    ec2_data_list.append(InventoryData(**ec2_data))
+
+        return ec2_data_list
+
+class DeepCopyElbDataMapper(ElbDataMapper):
+    # ElbDataMapper before the deep copies were removed
+    def _do_mapping(self, config_resource: dict) -> List[InventoryData]:
+        data_list: List[InventoryData] = []
+
+        data = { "asset_type": self._get_asset_type_name(config_resource),
+                 "unique_id": config_resource["arn"],
+                 "is_virtual": "Yes",
+                 "authenticated_scan_planned": "Yes",
+                 "is_public": "Yes" if config_resource.get("configuration").get("scheme", "unknown") == "internet-facing" else "No",
+                 "network_id": config_resource["configuration"]["vpcId"] if "vpcId" in config_resource["configuration"] else config_resource["configuration"]["vpcid"],
+                 "owner": _get_tag_value(config_resource["tags"], "owner") }
+
+        if len(ip_addresses := self._get_ip_addresses(config_resource["configuration"]["availabilityZones"])) > 0:
+            for ip_address in ip_addresses:
+                data = copy.deepcopy(data)
+
+                data["ip_address"] = ip_address
+
+                data_list.append(InventoryData(**data))
+        else:
+            data_list.append(InventoryData(**data))
+
+        return data_list
+
+def _time_mapping(mappers: dict, resources: List[dict], repeat: int) -> tuple:
+    best = float("inf")
+
+    for _ in range(repeat):
+        # Fresh resource dictionaries, the current mappers keep the tag index of a resource on its dictionary
+        repeat_resources = [ dict(resource) for resource in resources ]
+        started = time.perf_counter()
+        row_count = sum(len(mappers[resource["resourceType"]].map(resource)) for resource in repeat_resources)
+        best = min(best, time.perf_counter() - started)
+
+    return row_count, best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mapping of synthetic AWS Config results")
+    parser.add_argument("--instances", type=int, default=2000)
+    parser.add_argument("--nics", type=int, default=4, help="network interfaces per instance")
+    parser.add_argument("--ips", type=int, default=4, help="private IPs per network interface, each with a public IP")
+    parser.add_argument("--load-balancers", type=int, default=500)
+    parser.add_argument("--rds-instances", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    resources = [ synthetic_ec2_instance(index, args.nics, args.ips) for index in range(args.instances) ] \
+                + [ synthetic_load_balancer(index, addresses=6) for index in range(args.load_balancers) ] \
+                + [ synthetic_rds_instance(index) for index in range(args.rds_instances) ]
+    elb_resource_types = ElbDataMapper().supported_resource_types
+    rds_mapper = RdsDataMapper()
+
+    implementations = (("deepcopy", { "AWS::EC2::Instance": DeepCopyEC2DataMapper(), **dict.fromkeys(elb_resource_types, DeepCopyElbDataMapper()), "AWS::RDS::DBInstance": rds_mapper }),
+                       ("current", { "AWS::EC2::Instance": EC2DataMapper(), **dict.fromkeys(elb_resource_types, ElbDataMapper()), "AWS::RDS::DBInstance": rds_mapper }))
+
+    print(f"{'mappers':<12}{'resources':>10}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+
+    for name, mappers in implementations:
+        row_count, seconds = _time_mapping(mappers, resources, args.repeat)
+
+        print(f"{name:<12}{len(resources):>10}{row_count:>10}{seconds:>10.3f}{row_count / seconds:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Scaling of AwsConfigInventoryReader with the mapping stage in worker processes (MAPPING_PROCESS_WORKERS) over a synthetic
+# estate served by a stubbed AWS Config client. 0 workers decodes and maps in the collecting thread, which is the baseline.
+# Worker processes only pay off with as many vCPUs, which Lambda assigns in proportion to memory (6 vCPUs at 10240 MB).
+# Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_mapping_workers.py --resources 50000 --workers 0 1 2 4 6
+import argparse
+import json
+import os
+import time
+from typing import List
+from unittest.mock import MagicMock, patch
+from stubs import StubClientFactory
+from synthetic import parse_resource_mix, synthetic_estate
+
+def _collect(client_factory: StubClientFactory, mapping_workers: int) -> int:
+    from inventory.readers import AwsConfigInventoryReader
+
+    with patch("inventory.readers.get_client", client_factory):
+        reader = AwsConfigInventoryReader(lambda_context=MagicMock(invoked_function_arn="arn:aws:lambda:us-east-1:123456789012:function:InventoryCollector"),
+                                          mapping_workers=mapping_workers)
+        rows = 0
+
+        # Rows are dropped as they arrive, like the streaming report engine does
+        for _ in reader.iter_resources_from_all_accounts():
+            rows += 1
+
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mapping stage with worker processes")
+    parser.add_argument("--resources", type=int, default=50000)
+    parser.add_argument("--resource-mix", default="ec2=0.6,elb=0.1,rds=0.2,dynamodb=0.1")
+    parser.add_argument("--nics", type=int, default=2, help="network interfaces per EC2 instance")
+    parser.add_argument("--ips", type=int, default=2, help="private IPs per network interface")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4, 6])
+    args = parser.parse_args()
+
+    account_id = "123456789012"
+    results: List[str] = [ json.dumps(config_resource) for config_resource in synthetic_estate(args.resources, parse_resource_mix(args.resource_mix), args.nics, args.ips) ]
+    os.environ.update({ "ACCOUNT_LIST": json.dumps([ { "name": account_id, "id": account_id } ]),
+                        "CROSS_ACCOUNT_ROLE_NAME": "InventoryCollector-for-Lambda",
+                        "AWS_REGION": "us-east-1",
+                        # The stub answers instantly, the request scheduler's rate limits would dominate otherwise
+                        "API_RATE_LIMITS": json.dumps({ "SelectResourceConfig": 0, "AssumeRole": 0 }) })
+
+    print(f"{os.cpu_count()} CPUs, {args.resources} resources in pages of {args.page_size}")
+    print(f"{'workers':>8}{'rows':>10}{'seconds':>10}{'rows/s':>10}{'speedup':>10}")
+
+    baseline_seconds = None
+
+    for mapping_workers in args.workers:
+        client_factory = StubClientFactory({ account_id: results }, args.page_size)
+        seconds = float("inf")
+
+        for _ in range(3):
+            started = time.perf_counter()
+            rows = _collect(client_factory, mapping_workers)
+            seconds = min(seconds, time.perf_counter() - started)
+
+        baseline_seconds = baseline_seconds or seconds
+
+        print(f"{mapping_workers:>8}{rows:>10}{seconds:>10.3f}{rows / seconds:>10.0f}{baseline_seconds / seconds:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Runs the whole Lambda handler, AwsConfigInventoryReader to CreateReportCommandHandler to DeliverReportCommandHandler, over a
+# synthetic AWS Config estate served by stubbed STS, AWS Config and S3 clients. Reports throughput, the per-stage timings of the
+# handler and peak RSS. Each report engine runs in its own interpreter so that peak RSS is not polluted by another run.
+#
+# Results can be written to a file with --output and compared to the file of an earlier commit with --baseline, which exits
+# with a non-zero status when throughput or peak RSS regress by more than the tolerance. Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_pipeline.py --resources 20000 --output pipeline.json
+#   PYTHONPATH=./src python benchmarks/bench_pipeline.py --resources 20000 --baseline pipeline.json
+import argparse
+import gc
+import json
+import os
+from pathlib import PurePath
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from unittest.mock import patch
+
+_result_keys = ("engine", "pipeline_mode", "formats", "resources", "resource_mix", "nics", "ips", "accounts", "rate_limited")
+
+class _LambdaContext():
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:InventoryCollector"
+
+    def get_remaining_time_in_millis(self) -> int:
+        return 900000
+
+def _get_peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def _run_pipeline(args) -> dict:
+    from synthetic import parse_resource_mix, synthetic_estate
+    from stubs import StubClientFactory
+
+    account_ids = [ f"{100000000000 + index}" for index in range(args.accounts) ]
+    results_by_account: Dict[str, List[str]] = { account_id: [] for account_id in account_ids }
+
+    for index, config_resource in enumerate(synthetic_estate(args.resources, parse_resource_mix(args.resource_mix), args.nics, args.ips)):
+        results_by_account[account_ids[index % len(account_ids)]].append(json.dumps(config_resource))
+
+    os.environ.update({ "ACCOUNT_LIST": json.dumps([ { "name": account_id, "id": account_id } for account_id in account_ids ]),
+                        "CROSS_ACCOUNT_ROLE_NAME": "InventoryCollector-for-Lambda",
+                        "AWS_REGION": "us-east-1",
+                        "REPORT_TARGET_BUCKET_NAME": "benchmark",
+                        "REPORT_TARGET_BUCKET_PATH": "inventory-reports",
+                        "REPORT_ENGINE": args.child,
+                        "INVENTORY_PIPELINE_MODE": args.pipeline_mode,
+                        "REPORT_FORMATS": args.formats })
+
+    # The stubs answer instantly, without this the benchmark would mostly measure the request scheduler's rate limits
+    if not args.rate_limited:
+        os.environ["API_RATE_LIMITS"] = json.dumps({ "SelectResourceConfig": 0, "AssumeRole": 0 })
+
+    import inventory.reports
+    from inventory.handler import lambda_handler
+
+    client_factory = StubClientFactory(results_by_account, args.page_size)
+    gc.collect()
+    baseline_rss_mb = _get_peak_rss_mb()
+
+    with tempfile.TemporaryDirectory() as output_dir, \
+         patch("inventory.readers.get_client", client_factory), patch("inventory.reports.get_client", client_factory), \
+         patch("inventory.handler.emit_embedded_metrics"):
+        inventory.reports._workbook_output_file_path = PurePath(output_dir, "report.xlsx")
+
+        started = time.perf_counter()
+        response = lambda_handler({}, _LambdaContext())
+        elapsed = time.perf_counter() - started
+
+    stages = response["body"]["metrics"]["stages"]
+    rows = stages["CollectAccount"]["count"]
+
+    return { "engine": args.child,
+             "pipeline_mode": args.pipeline_mode,
+             "formats": args.formats,
+             "resources": args.resources,
+             "resource_mix": args.resource_mix,
+             "nics": args.nics,
+             "ips": args.ips,
+             "accounts": args.accounts,
+             "rate_limited": args.rate_limited,
+             "rows": rows,
+             "seconds": round(elapsed, 3),
+             "resources_per_second": round(args.resources / elapsed),
+             "rows_per_second": round(rows / elapsed),
+             "peak_rss_mb": _get_peak_rss_mb(),
+             "pipeline_rss_mb": round(_get_peak_rss_mb() - baseline_rss_mb, 1),
+             "report_mb": round(client_factory.s3_client.uploaded_bytes / 1024 / 1024, 2),
+             "stages": { stage: round(values["seconds"], 3) for stage, values in stages.items() } }
+
+def _get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _compare(results: List[dict], baseline: dict, tolerance: float) -> bool:
+    baseline_results = { tuple(result.get(key) for key in _result_keys): result for result in baseline["results"] }
+    regressed = False
+
+    print(f"\ncompared to {baseline['commit']} with a tolerance of {tolerance:.0%}")
+
+    for result in results:
+        if not (baseline_result := baseline_results.get(tuple(result.get(key) for key in _result_keys))):
+            print(f"{result['engine']:<12}no baseline result with the same parameters")
+
+            continue
+
+        throughput_change = result["rows_per_second"] / baseline_result["rows_per_second"] - 1
+        memory_change = result["peak_rss_mb"] / baseline_result["peak_rss_mb"] - 1
+        result_regressed = throughput_change < -tolerance or memory_change > tolerance
+        regressed = regressed or result_regressed
+
+        print(f"{result['engine']:<12}rows/s {throughput_change:+.1%}  peak RSS {memory_change:+.1%}{'  REGRESSION' if result_regressed else ''}")
+
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inventory pipeline over a synthetic AWS Config estate")
+    parser.add_argument("--resources", type=int, default=20000)
+    parser.add_argument("--resource-mix", default="ec2=0.6,elb=0.1,rds=0.2,dynamodb=0.1")
+    parser.add_argument("--nics", type=int, default=1, help="network interfaces per EC2 instance")
+    parser.add_argument("--ips", type=int, default=1, help="private IPs per network interface")
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--engines", nargs="+", default=["openpyxl", "streaming"])
+    parser.add_argument("--pipeline-mode", choices=["batch", "streaming"], default="streaming")
+    parser.add_argument("--formats", default="xlsx", help="comma separated report formats, e.g. xlsx,csv,jsonl,parquet")
+    parser.add_argument("--rate-limited", action="store_true", help="keep the default API rate limits of the request scheduler")
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_pipeline(args)))
+
+        return
+
+    results: List[dict] = []
+
+    print(f"{'engine':<12}{'resources':>10}{'rows':>10}{'seconds':>10}{'rows/s':>10}{'peak RSS MB':>14}  stages (seconds)")
+
+    for engine in args.engines:
+        output = subprocess.run([sys.executable, __file__, *sys.argv[1:], "--child", engine], check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+
+        print(f"{result['engine']:<12}{result['resources']:>10}{result['rows']:>10}{result['seconds']:>10}{result['rows_per_second']:>10}{result['peak_rss_mb']:>14}  "
+              f"{', '.join(f'{stage} {seconds}' for stage, seconds in result['stages'].items())}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({ "commit": _get_commit(), "python": platform.python_version(), "results": results }, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            if _compare(results, json.load(baseline_file), args.tolerance):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
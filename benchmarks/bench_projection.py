@@ -0,0 +1,47 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Compares the payload size and decode plus mapping cost of the full configuration with the configuration projected to the paths each mapper declares.
+# AWS Config returns projected properties nested under "configuration", which is what the projected payloads below reproduce.
+# Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_projection.py
+import argparse
+import json
+import timeit
+from inventory.mappers import get_default_mapper_registry
+from synthetic import load_sample
+
+_sample_file_names = ["sample_ec2.json", "sample_classic_elb.json", "sample_v2elb.json", "sample_rds_db.json", "sample_dynamo_table.json"]
+
+def _project(resource: dict, paths) -> dict:
+    projected_resource = { field: resource[field] for field in ("arn", "resourceType", "tags") if field in resource }
+    projected_resource["configuration"] = { path: value for path, value in resource["configuration"].items() if path in paths }
+
+    return projected_resource
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full versus projected AWS Config query results")
+    parser.add_argument("--resources", type=int, default=10000)
+    args = parser.parse_args()
+
+    registry = get_default_mapper_registry()
+
+    print(f"{'resource type':<44}{'full bytes':>12}{'projected':>12}{'full us':>10}{'proj. us':>10}")
+
+    for sample_file_name in _sample_file_names:
+        resource = load_sample(sample_file_name)
+        mapper = registry.get_mapper(resource["resourceType"])
+        full_payload = json.dumps(resource)
+        projected_payload = json.dumps(_project(resource, mapper.configuration_paths))
+        timings = []
+
+        for payload in (full_payload, projected_payload):
+            seconds = min(timeit.repeat(lambda: mapper.map(json.loads(payload)), number=args.resources, repeat=3))
+            timings.append(seconds / args.resources * 1e6)
+
+        print(f"{resource['resourceType']:<44}{len(full_payload):>12}{len(projected_payload):>12}{timings[0]:>10.1f}{timings[1]:>10.1f}")
+
+if __name__ == "__main__":
+    main()
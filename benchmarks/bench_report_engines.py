@@ -0,0 +1,70 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Compares rows per second and peak RSS of the report engines. Each engine runs in its own interpreter so that peak RSS is
+# not polluted by the other engine. Run from the project directory:
+#
+#   PYTHONPATH=./src python benchmarks/bench_report_engines.py --rows 100000
+import argparse
+import json
+import os
+from pathlib import PurePath
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Iterator
+
+def _synthetic_inventory(row_count: int) -> Iterator:
+    from inventory.mappers import InventoryData
+
+    for index in range(row_count):
+        yield InventoryData(asset_type="EC2", unique_id=f"i-{index:017x}", ip_address=f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}",
+                            is_virtual="Yes", authenticated_scan_planned="Yes", dns_name=f"ip-{index}.ec2.internal", mac_address="06:d1:af:2f:a4:46",
+                            baseline_config="ami-6e92711f", hardware_model="t3.micro", is_public="No", network_id="vpc-88e50ee1", owner="owner@example.com")
+
+def _run_engine(engine: str, row_count: int) -> dict:
+    import inventory.reports
+
+    os.environ["REPORT_ENGINE"] = engine
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        inventory.reports._workbook_output_file_path = PurePath(output_dir, "report.xlsx")
+
+        started = time.perf_counter()
+        inventory.reports.get_create_report_command_handler().execute(_synthetic_inventory(row_count))
+        elapsed = time.perf_counter() - started
+
+        report_size = os.path.getsize(inventory.reports._workbook_output_file_path)
+
+    return { "engine": engine,
+             "rows": row_count,
+             "seconds": round(elapsed, 3),
+             "rows_per_second": round(row_count / elapsed),
+             "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+             "report_size_mb": round(report_size / 1024 / 1024, 2) }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the workbook report engines")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--engines", nargs="+", default=["openpyxl", "streaming"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_engine(args.child, args.rows)))
+
+        return
+
+    print(f"{'engine':<12}{'rows':>10}{'seconds':>10}{'rows/s':>10}{'peak RSS MB':>14}{'xlsx MB':>10}")
+
+    for engine in args.engines:
+        output = subprocess.run([sys.executable, __file__, "--rows", str(args.rows), "--child", engine], check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+
+        print(f"{result['engine']:<12}{result['rows']:>10}{result['seconds']:>10}{result['rows_per_second']:>10}{result['peak_rss_mb']:>14}{result['report_size_mb']:>10}")
+
+if __name__ == "__main__":
+    main()
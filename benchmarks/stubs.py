@@ -0,0 +1,51 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# In-memory stand-ins for the STS, AWS Config and S3 clients, so that the whole pipeline can be benchmarked without AWS.
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+class StubStsClient():
+    def assume_role(self, RoleArn: str, **kwargs) -> dict:
+        account_id = RoleArn.split(":")[4]
+
+        return { "Credentials": { "AccessKeyId": f"AKIA{account_id}", "SecretAccessKey": "secret", "SessionToken": "token",
+                                  "Expiration": datetime.now(timezone.utc) + timedelta(hours=1) },
+                 "AssumedRoleUser": { "Arn": RoleArn } }
+
+class StubConfigClient():
+    def __init__(self, results: List[str], page_size: int = 100):
+        self._results = results
+        self._page_size = page_size
+
+    def select_resource_config(self, Expression: str, NextToken: str = "", **kwargs) -> dict:
+        start = int(NextToken or 0)
+        end = start + self._page_size
+
+        return { "Results": self._results[start:end], "NextToken": str(end) if end < len(self._results) else "" }
+
+class StubS3Client():
+    def __init__(self):
+        self.uploaded_bytes = 0
+
+    def put_object(self, Body, **kwargs) -> dict:
+        self.uploaded_bytes += len(Body.read() if hasattr(Body, "read") else Body)
+
+        return {}
+
+class StubClientFactory():
+    # Replaces inventory.clients.get_client, config clients are told apart by the account in their credentials
+    def __init__(self, results_by_account: Dict[str, List[str]], page_size: int = 100):
+        self.sts_client = StubStsClient()
+        self.s3_client = StubS3Client()
+        self._config_clients = { account_id: StubConfigClient(results, page_size) for account_id, results in results_by_account.items() }
+
+    def __call__(self, service_name: str, region_name=None, credentials=None):
+        if service_name == "sts":
+            return self.sts_client
+
+        if service_name == "s3":
+            return self.s3_client
+
+        return self._config_clients[credentials["AccessKeyId"][len("AKIA"):]]
@@ -0,0 +1,95 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+#
+# Builds synthetic AWS Config query results for the benchmarks from the recorded samples used by the unit tests.
+import copy
+import json
+import os
+from typing import Dict, Iterator, List
+
+_sample_dir_name = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "sample_config_query_results")
+
+def load_sample(file_name: str):
+    with open(os.path.join(_sample_dir_name, file_name)) as file_data:
+        return json.load(file_data)
+
+_sample_ec2_instance: dict = load_sample("sample_ec2.json")
+_sample_load_balancer: dict = load_sample("sample_v2elb.json")
+_sample_rds_instances: List[dict] = load_sample("sample.json")
+_sample_dynamo_table: dict = load_sample("sample_dynamo_table.json")
+DEFAULT_RESOURCE_MIX = { "ec2": 0.6, "elb": 0.1, "rds": 0.2, "dynamodb": 0.1 }
+
+def _ip_address(index: int, offset: int) -> str:
+    value = index * 64 + offset
+
+    return f"10.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+def synthetic_ec2_instance(index: int, nics_per_instance: int = 1, ips_per_nic: int = 1, public_ips: bool = True) -> dict:
+    resource = copy.deepcopy(_sample_ec2_instance)
+    configuration = resource["configuration"]
+    sample_nic = configuration["networkInterfaces"][0]
+    sample_ip_address = sample_nic["privateIpAddresses"][0]
+
+    configuration["instanceId"] = f"i-{index:017x}"
+    resource["arn"] = f"arn:aws:ec2:us-east-1:123456789012:instance/{configuration['instanceId']}"
+    resource["tags"] = resource["tags"] + [ { "key": "Owner", "value": f"owner-{index % 97}@example.com" } ]
+    configuration["networkInterfaces"] = []
+
+    for nic_index in range(nics_per_instance):
+        nic = dict(sample_nic, networkInterfaceId=f"eni-{index:08x}{nic_index:09x}", macAddress=f"06:{index >> 16 & 255:02x}:{index >> 8 & 255:02x}:{index & 255:02x}:{nic_index:02x}:46")
+        nic["privateIpAddresses"] = [ dict(sample_ip_address, privateIpAddress=_ip_address(index, nic_index * ips_per_nic + ip_index), primary=ip_index == 0)
+                                      for ip_index in range(ips_per_nic) ]
+
+        if not public_ips:
+            for ip_address in nic["privateIpAddresses"]:
+                ip_address.pop("association", None)
+
+        configuration["networkInterfaces"].append(nic)
+
+    return resource
+
+def synthetic_load_balancer(index: int, addresses: int = 2) -> dict:
+    resource = copy.deepcopy(_sample_load_balancer)
+
+    resource["arn"] = f"{resource['arn']}{index:08x}"
+    resource["configuration"]["availabilityZones"] = [ { "zoneName": f"us-east-1{chr(ord('a') + address_index % 6)}",
+                                                          "loadBalancerAddresses": [ { "ipAddress": _ip_address(index, address_index) } ] }
+                                                        for address_index in range(addresses) ]
+
+    return resource
+
+def synthetic_rds_instance(index: int) -> dict:
+    resource = copy.deepcopy(_sample_rds_instances[index % len(_sample_rds_instances)])
+
+    resource["arn"] = f"{resource['arn']}-{index}"
+
+    return resource
+
+def synthetic_dynamo_table(index: int) -> dict:
+    resource = copy.deepcopy(_sample_dynamo_table)
+
+    resource["arn"] = f"{resource['arn']}-{index}"
+
+    return resource
+
+def parse_resource_mix(resource_mix: str) -> Dict[str, float]:
+    # e.g. "ec2=0.6,elb=0.1,rds=0.2,dynamodb=0.1", weights are normalized
+    weights = { name.strip(): float(weight) for name, weight in (part.split("=") for part in resource_mix.split(",")) }
+    total = sum(weights.values())
+
+    return { name: weight / total for name, weight in weights.items() }
+
+def synthetic_estate(resource_count: int, resource_mix: Dict[str, float] = DEFAULT_RESOURCE_MIX, nics_per_instance: int = 1, ips_per_nic: int = 1) -> Iterator[dict]:
+    # Resource types are interleaved deterministically, so the same arguments always produce the same estate
+    generators = { "ec2": lambda index: synthetic_ec2_instance(index, nics_per_instance, ips_per_nic),
+                   "elb": synthetic_load_balancer,
+                   "rds": synthetic_rds_instance,
+                   "dynamodb": synthetic_dynamo_table }
+    produced = { name: 0 for name in resource_mix }
+
+    for index in range(resource_count):
+        name = max(resource_mix, key=lambda name: resource_mix[name] * (index + 1) - produced[name])
+        produced[name] += 1
+
+        yield generators[name](index)
@@ -0,0 +1,69 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, NamedTuple, Optional
+from inventory.mappers import InventoryData
+
+_logger = logging.getLogger("inventory.checkpoints")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+CHECKPOINT_FORMAT_VERSION = 1
+DEFAULT_CHECKPOINT_MARGIN_SECONDS = 120
+# Conservative rate of the openpyxl engine, used to keep time for the report of the rows collected so far
+DEFAULT_CHECKPOINT_REPORT_ROWS_PER_SECOND = 2000
+
+class CheckpointDeadlineReached(Exception):
+    pass
+
+class RegionProgress(NamedTuple):
+    rows: List[InventoryData]
+    complete: bool
+    # Query and NextToken of the next page to retrieve when the region is not complete
+    expression: str = ""
+    next_token: str = ""
+
+# Progress of a collection run by account and region, which lets a later invocation carry on from where the run stopped
+class InventoryCheckpoint():
+    def __init__(self, regions: Optional[Dict[str, RegionProgress]] = None):
+        self._regions: Dict[str, RegionProgress] = regions or {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._regions)
+
+    def get_region(self, region_key: str) -> Optional[RegionProgress]:
+        return self._regions.get(region_key)
+
+    def set_region(self, region_key: str, progress: RegionProgress):
+        with self._lock:
+            self._regions[region_key] = progress
+
+    @property
+    def completed_regions(self) -> int:
+        return sum(1 for progress in self._regions.values() if progress.complete)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return json.dumps({ "version": CHECKPOINT_FORMAT_VERSION,
+                                "regions": { region_key: { "rows": [ row.as_tuple() for row in progress.rows ],
+                                                           "complete": progress.complete,
+                                                           "expression": progress.expression,
+                                                           "nextToken": progress.next_token }
+                                             for region_key, progress in self._regions.items() } },
+                              separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, checkpoint_json: str) -> "InventoryCheckpoint":
+        checkpoint_data = json.loads(checkpoint_json)
+
+        if checkpoint_data.get("version") != CHECKPOINT_FORMAT_VERSION:
+            _logger.warning(f"ignoring checkpoint with unsupported version {checkpoint_data.get('version')}")
+
+            return cls()
+
+        return cls({ region_key: RegionProgress(rows=[ InventoryData.from_tuple(row) for row in progress["rows"] ], complete=progress["complete"],
+                                                expression=progress["expression"], next_token=progress["nextToken"])
+                     for region_key, progress in checkpoint_data["regions"].items() })
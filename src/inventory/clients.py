@@ -0,0 +1,90 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+import boto3
+
+_logger = logging.getLogger("inventory.clients")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DEFAULT_CREDENTIAL_EXPIRY_MARGIN_SECONDS = 300
+
+# Clients and assumed role credentials are kept at module level so that they, and their connection pools, are reused across
+# accounts and across invocations of a warm Lambda container. boto3 sessions are not thread safe, hence the lock.
+_cache_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[Tuple[str, Optional[str], Optional[str]], Tuple[object, Optional[datetime]]] = {}
+_assumed_role_responses: Dict[str, dict] = {}
+
+def _get_credential_expiry_margin() -> timedelta:
+    return timedelta(seconds=int(os.environ.get("CREDENTIAL_EXPIRY_MARGIN_SECONDS", DEFAULT_CREDENTIAL_EXPIRY_MARGIN_SECONDS)))
+
+def _is_expired(expiration: Optional[datetime]) -> bool:
+    return expiration is not None and expiration - _get_credential_expiry_margin() <= datetime.now(timezone.utc)
+
+def _get_expiration(sts_response) -> Optional[datetime]:
+    try:
+        expiration = sts_response["Credentials"]["Expiration"]
+    except (KeyError, TypeError):
+        return None
+
+    return expiration if isinstance(expiration, datetime) else None
+
+def get_client(service_name: str, region_name: Optional[str] = None, credentials: Optional[dict] = None):
+    client_key = (service_name, region_name, credentials["AccessKeyId"] if credentials else None)
+
+    with _cache_lock:
+        if (cached_client := _clients.get(client_key)) and not _is_expired(cached_client[1]):
+            return cached_client[0]
+
+        global _session
+
+        if _session is None:
+            _session = boto3.session.Session()
+
+        _logger.debug(f"creating {service_name} client for region {region_name}")
+
+        if credentials:
+            client = _session.client(service_name, region_name=region_name, aws_access_key_id=credentials["AccessKeyId"],
+                                     aws_secret_access_key=credentials["SecretAccessKey"], aws_session_token=credentials["SessionToken"])
+        else:
+            client = _session.client(service_name, region_name=region_name)
+
+        # Drop clients whose credentials have expired, they are replaced by clients of newer credentials with a different key
+        for expired_key in [key for key, (_, expiration) in _clients.items() if _is_expired(expiration)]:
+            del _clients[expired_key]
+
+        _clients[client_key] = (client, credentials.get("Expiration") if credentials else None)
+
+        return client
+
+def assume_role(sts_client, request_scheduler=None, **kwargs) -> dict:
+    role_arn: str = kwargs["RoleArn"]
+
+    with _cache_lock:
+        cached_response = _assumed_role_responses.get(role_arn)
+
+    if cached_response and not _is_expired(_get_expiration(cached_response)):
+        _logger.debug(f"using cached credentials for role {role_arn}")
+
+        return cached_response
+
+    sts_response = request_scheduler.call("AssumeRole", sts_client.assume_role, **kwargs) if request_scheduler else sts_client.assume_role(**kwargs)
+
+    # Responses without an expiration cannot be reused safely
+    if _get_expiration(sts_response):
+        with _cache_lock:
+            _assumed_role_responses[role_arn] = sts_response
+
+    return sts_response
+
+def clear_cache():
+    global _session
+
+    with _cache_lock:
+        _session = None
+        _clients.clear()
+        _assumed_role_responses.clear()
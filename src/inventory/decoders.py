@@ -0,0 +1,76 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from abc import ABC, abstractmethod
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Type, Union
+
+orjson_loads: Optional[Callable[[Union[str, bytes]], Any]]
+
+try:
+    from orjson import loads as orjson_loads  # type: ignore[import]
+except ImportError:
+    orjson_loads = None
+
+_logger = logging.getLogger("inventory.decoders")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DEFAULT_JSON_DECODER = "auto"
+
+def _join_page(raw_page: List[str]) -> str:
+    # Every result of an AWS Config query is a JSON object, so a page can be decoded as one JSON array in a single call
+    return f"[{','.join(raw_page)}]"
+
+class JsonDecoder(ABC):
+    @abstractmethod
+    def decode(self, raw: str) -> dict:
+        pass
+
+    @abstractmethod
+    def decode_page(self, raw_page: List[str]) -> List[dict]:
+        pass
+
+class StdlibJsonDecoder(JsonDecoder):
+    def decode(self, raw: str) -> dict:
+        return json.loads(raw)
+
+    def decode_page(self, raw_page: List[str]) -> List[dict]:
+        return json.loads(_join_page(raw_page)) if raw_page else []
+
+class OrjsonJsonDecoder(JsonDecoder):
+    def __init__(self) -> None:
+        if orjson_loads is None:
+            raise ImportError("orjson is not installed")
+
+        self._loads: Callable[[Union[str, bytes]], Any] = orjson_loads
+
+    def decode(self, raw: str) -> dict:
+        return self._loads(raw)
+
+    def decode_page(self, raw_page: List[str]) -> List[dict]:
+        # Unlike the json module, orjson has no per call overhead worth saving by joining the page first
+        return [ self._loads(raw) for raw in raw_page ]
+
+_json_decoders: Dict[str, Type[JsonDecoder]] = { "json": StdlibJsonDecoder, "orjson": OrjsonJsonDecoder }
+
+def register_json_decoder(name: str, decoder_class: Type[JsonDecoder]) -> None:
+    _json_decoders[name] = decoder_class
+
+def get_json_decoder(name: Optional[str] = None) -> JsonDecoder:
+    name = (name or os.environ.get("INVENTORY_JSON_DECODER", DEFAULT_JSON_DECODER)).lower()
+
+    if name == "auto":
+        return OrjsonJsonDecoder() if orjson_loads is not None else StdlibJsonDecoder()
+
+    if name not in _json_decoders:
+        _logger.warning(f"unknown JSON decoder {name}, falling back to json")
+
+        return StdlibJsonDecoder()
+
+    try:
+        return _json_decoders[name]()
+    except ImportError as ex:
+        _logger.warning(f"unable to use JSON decoder {name}, falling back to json: {ex}")
+
+        return StdlibJsonDecoder()
@@ -0,0 +1,139 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from datetime import datetime
+import json
+import logging
+import os
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from inventory.instrumentation import get_stage_metrics
+from inventory.mappers import INVENTORY_DATA_FIELDS, InventoryData
+
+_logger = logging.getLogger("inventory.deltas")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DELTA_BASELINE_FORMAT_VERSION = 1
+DELTA_CHANGES = ("added", "removed", "changed")
+_unique_id_index = INVENTORY_DATA_FIELDS.index("unique_id")
+_ip_address_index = INVENTORY_DATA_FIELDS.index("ip_address")
+
+def get_delta_key(values: tuple) -> Tuple[Optional[str], Optional[str]]:
+    # Rows are identified by their asset and address, an asset has one row per address
+    return values[_unique_id_index], values[_ip_address_index]
+
+# Rows of a run in their tuple form keyed by get_delta_key, stored with the snapshot stores as the baseline of the next run's delta.
+# Keys are derived from the rows again when a baseline is loaded, so only the rows are stored.
+class InventoryBaseline():
+    def __init__(self, rows: Optional[Dict[Tuple[Optional[str], Optional[str]], tuple]] = None, generated: Optional[str] = None):
+        self.rows: Dict[Tuple[Optional[str], Optional[str]], tuple] = rows if rows is not None else {}
+        self.generated = generated
+
+    def add(self, inventory_row: InventoryData):
+        values = inventory_row.as_tuple()
+
+        # The first of several rows with the same key is kept, the same as in the previous run
+        self.rows.setdefault(get_delta_key(values), values)
+
+    def to_json(self) -> str:
+        return json.dumps({ "version": DELTA_BASELINE_FORMAT_VERSION, "generated": self.generated, "rows": list(self.rows.values()) }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, baseline_json: str) -> "InventoryBaseline":
+        baseline_data = json.loads(baseline_json)
+
+        if baseline_data.get("version") != DELTA_BASELINE_FORMAT_VERSION:
+            _logger.warning(f"ignoring delta baseline with unsupported version {baseline_data.get('version')}")
+
+            return cls()
+
+        baseline = cls(generated=baseline_data.get("generated"))
+
+        for values in baseline_data["rows"]:
+            values = tuple(values)
+            baseline.rows.setdefault(get_delta_key(values), values)
+
+        return baseline
+
+class InventoryDeltaRow(NamedTuple):
+    change: str
+    row: InventoryData
+    # Previous row and the attributes that differ from it, only for changed rows
+    previous_row: Optional[InventoryData] = None
+    changed_fields: Tuple[str, ...] = ()
+
+class InventoryDelta():
+    def __init__(self, rows: Optional[List[InventoryDeltaRow]] = None, previous_generated: Optional[str] = None):
+        self.rows: List[InventoryDeltaRow] = rows or []
+        self.previous_generated = previous_generated
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(DELTA_CHANGES, 0)
+
+        for delta_row in self.rows:
+            counts[delta_row.change] += 1
+
+        return counts
+
+def compute_inventory_delta(current: InventoryBaseline, previous: InventoryBaseline) -> InventoryDelta:
+    delta_rows: List[InventoryDeltaRow] = []
+
+    # Hash join of both runs on their keys, one pass over each
+    with get_stage_metrics().timer("ComputeDelta"):
+        for key, values in current.rows.items():
+            if (previous_values := previous.rows.get(key)) is None:
+                delta_rows.append(InventoryDeltaRow("added", InventoryData.from_tuple(values)))
+            elif previous_values != values:
+                # Baselines stored before a field was added have shorter rows
+                previous_row = InventoryData.from_tuple(previous_values)
+                changed_fields = tuple(name for name, value, previous_value in zip(INVENTORY_DATA_FIELDS, values, previous_row.as_tuple()) if value != previous_value)
+
+                if changed_fields:
+                    delta_rows.append(InventoryDeltaRow("changed", InventoryData.from_tuple(values), previous_row, changed_fields))
+
+        delta_rows.extend(InventoryDeltaRow("removed", InventoryData.from_tuple(values)) for key, values in previous.rows.items() if key not in current.rows)
+
+    return InventoryDelta(delta_rows, previous.generated)
+
+# Keeps the rows of the current run on their way to the report, then compares them with the baseline of the previous run and
+# stores them as the baseline of the next one. Only the compact tuple of every row is kept, not the report.
+class InventoryDeltaTracker():
+    def __init__(self, baseline_store):
+        self._baseline_store = baseline_store
+        self._current = InventoryBaseline()
+
+    def track(self, inventory: Iterable[InventoryData]) -> Iterable[InventoryData]:
+        # A list from the batch pipeline is indexed right away, rows of the streaming pipeline as the report pulls them
+        if isinstance(inventory, list):
+            for inventory_row in inventory:
+                self._current.add(inventory_row)
+
+            return inventory
+
+        return self._iter_tracked(inventory)
+
+    def _iter_tracked(self, inventory: Iterable[InventoryData]) -> Iterator[InventoryData]:
+        for inventory_row in inventory:
+            self._current.add(inventory_row)
+
+            yield inventory_row
+
+    def compute_delta(self) -> Optional[InventoryDelta]:
+        with get_stage_metrics().timer("LoadBaseline"):
+            previous: InventoryBaseline = self._baseline_store.load()
+
+        # Without a baseline every asset would show up as added
+        delta = compute_inventory_delta(self._current, previous) if previous.generated else None
+
+        if delta is None:
+            _logger.info("no previous delta baseline found, the delta report starts with the next run")
+        else:
+            _logger.info(f"delta against the baseline of {previous.generated}: {', '.join(f'{count} {change}' for change, count in delta.counts.items())}")
+
+        return delta
+
+    def save_baseline(self):
+        # Only once the delta is delivered, a failed delta report is created again by the next run against the same baseline
+        self._current.generated = datetime.now().isoformat(timespec="seconds")
+
+        with get_stage_metrics().timer("SaveBaseline"):
+            self._baseline_store.save(self._current)
@@ -0,0 +1,136 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import logging
+import os
+from typing import Callable, Iterator, List, Optional
+import uuid
+import boto3
+from botocore.config import Config
+from inventory.instrumentation import get_stage_metrics
+from inventory.mappers import InventoryData
+from inventory.readers import InventoryReader
+from inventory.snapshots import get_snapshot_store
+
+_logger = logging.getLogger("inventory.distributed")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+PARTIAL_INVENTORY_FORMAT_VERSION = 1
+DEFAULT_ACCOUNTS_PER_WORKER = 10
+DEFAULT_DISTRIBUTED_MAX_WORKERS = 10
+# Workers can run for as long as the Lambda timeout allows, the invoke call has to wait for them
+WORKER_INVOKE_READ_TIMEOUT_SECONDS = 960
+
+# Rows collected by one worker, stored with the snapshot stores
+class PartialInventory():
+    def __init__(self, rows: Optional[List[InventoryData]] = None):
+        # Snapshot stores load a missing partial file as a partial without rows
+        self.missing = rows is None
+        self.rows: List[InventoryData] = rows if rows is not None else []
+
+    def to_json(self) -> str:
+        return json.dumps({ "version": PARTIAL_INVENTORY_FORMAT_VERSION, "rows": [ row.as_tuple() for row in self.rows ] }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, partial_json: str) -> "PartialInventory":
+        partial_data = json.loads(partial_json)
+
+        if partial_data.get("version") != PARTIAL_INVENTORY_FORMAT_VERSION:
+            raise ValueError(f"Partial inventory has unsupported version {partial_data.get('version')}.")
+
+        return cls([ InventoryData.from_tuple(row) for row in partial_data["rows"] ])
+
+def split_accounts(accounts: List[dict], accounts_per_worker: int) -> List[List[dict]]:
+    return [ accounts[index:index + accounts_per_worker] for index in range(0, len(accounts), accounts_per_worker) ]
+
+# Invokers run a worker event and return the worker's response
+class LambdaInvoker():
+    def __init__(self, function_name: str, lambda_client=None):
+        self._function_name = function_name
+        # Not the shared client of get_client, retrying a timed out invoke would run the worker a second time
+        self._lambda_client = lambda_client or boto3.session.Session().client('lambda', config=Config(read_timeout=WORKER_INVOKE_READ_TIMEOUT_SECONDS, retries={ "max_attempts": 0 }))
+
+    def invoke(self, payload: dict) -> dict:
+        response = self._lambda_client.invoke(FunctionName=self._function_name, InvocationType="RequestResponse", Payload=json.dumps(payload))
+        response_payload = json.loads(response["Payload"].read() or "null")
+
+        if response.get("FunctionError"):
+            raise RuntimeError(f"Worker invocation of {self._function_name} failed: {response_payload}")
+
+        return response_payload
+
+# Stand-in for the invoke API that runs workers in the current process, so the distributed mode can run locally and in tests.
+# Events and responses go through JSON like they would with Lambda.
+class InProcessInvoker():
+    def __init__(self, handler: Callable[[dict, object], dict], lambda_context=None):
+        self._handler = handler
+        self._lambda_context = lambda_context
+
+    def invoke(self, payload: dict) -> dict:
+        return json.loads(json.dumps(self._handler(json.loads(json.dumps(payload)), self._lambda_context)))
+
+# Coordinator of the distributed mode. Splits the account list into batches, collects every batch in a worker invocation that
+# writes its rows to a partial file, then reads the partial files back in batch order. Rows come out in the same order as from
+# AwsConfigInventoryReader, so the report handlers merge the partial files into the report without any changes.
+class DistributedInventoryReader(InventoryReader):
+    def __init__(self, invoker, partials_location: str, accounts: Optional[List[dict]] = None, accounts_per_worker: Optional[int] = None, max_workers: Optional[int] = None):
+        # Workers invoked through Lambda write to their own /tmp, which the coordinator can't read
+        if not partials_location.startswith("s3://") and not isinstance(invoker, InProcessInvoker):
+            raise ValueError(f"Distributed partials location {partials_location} is not an S3 location, which is only supported with the local invoker.")
+
+        self._invoker = invoker
+        self._partials_location = partials_location.rstrip("/")
+        self._accounts = accounts
+        self._accounts_per_worker: int = accounts_per_worker or int(os.environ.get("DISTRIBUTED_ACCOUNTS_PER_WORKER", DEFAULT_ACCOUNTS_PER_WORKER))
+        self._max_workers: int = max_workers or int(os.environ.get("DISTRIBUTED_MAX_WORKERS", DEFAULT_DISTRIBUTED_MAX_WORKERS))
+        self._run_id = f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}-{uuid.uuid4().hex[:8]}"
+        self.failed_batches: List[int] = []
+
+    def _get_partial_location(self, batch: int) -> str:
+        return f"{self._partials_location}/{self._run_id}/batch-{batch:04d}.json.gz"
+
+    def _invoke_worker(self, batch: int, accounts: List[dict]) -> Optional[dict]:
+        _logger.info(f"invoking worker for batch {batch} with {len(accounts)} accounts")
+
+        try:
+            with get_stage_metrics().timer("InvokeWorker"):
+                response = self._invoker.invoke({ "worker": { "runId": self._run_id, "batch": batch, "accounts": accounts, "location": self._get_partial_location(batch) } })
+        except Exception as ex:
+            get_stage_metrics().record("FailedWorker")
+            _logger.error(f"worker for batch {batch} with accounts {', '.join(account['id'] for account in accounts)} failed, moving onto next batch: {ex}", exc_info=True)
+
+            return None
+
+        return response["body"]["worker"]
+
+    def iter_resources_from_all_accounts(self) -> Iterator[InventoryData]:
+        accounts: List[dict] = self._accounts if self._accounts is not None else json.loads(os.environ["ACCOUNT_LIST"])
+        batches = split_accounts(accounts, self._accounts_per_worker)
+
+        _logger.info(f"starting distributed retrieval of inventory from {len(accounts)} accounts in {len(batches)} worker batches, run {self._run_id}")
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            worker_results = list(executor.map(self._invoke_worker, range(1, len(batches) + 1), batches))
+
+        self.failed_batches = [ batch for batch, worker_result in enumerate(worker_results, start=1) if worker_result is None ]
+        total_rows: int = 0
+
+        # Only one partial file is held in memory at a time
+        for batch, worker_result in enumerate(worker_results, start=1):
+            if worker_result is None:
+                continue
+
+            with get_stage_metrics().timer("LoadPartial"):
+                partial_inventory: PartialInventory = get_snapshot_store(worker_result["location"], snapshot_class=PartialInventory).load()
+
+            # A batch reported as collected is never left out silently, unlike a failed one
+            if partial_inventory.missing or len(partial_inventory.rows) != worker_result["rows"]:
+                raise RuntimeError(f"Partial inventory of batch {batch} at {worker_result['location']} is missing or has {len(partial_inventory.rows)} rows, the worker saved {worker_result['rows']}.")
+
+            total_rows += len(partial_inventory.rows)
+
+            yield from partial_inventory.rows
+
+        _logger.info(f"merged {total_rows} rows from {len(batches) - len(self.failed_batches)} of {len(batches)} worker batches")
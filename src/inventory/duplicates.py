@@ -0,0 +1,70 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from hashlib import blake2b
+import logging
+import os
+from typing import Dict, Iterable, Iterator, Set
+from inventory.instrumentation import get_stage_metrics
+from inventory.mappers import InventoryData
+
+_logger = logging.getLogger("inventory.duplicates")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+# 128 bit digests, a collision dropping a distinct row is out of reach even for billions of rows
+_KEY_DIGEST_SIZE = 16
+
+def get_row_key_digest(inventory_row: InventoryData) -> bytes:
+    return blake2b(f"{inventory_row.unique_id!r}\0{inventory_row.ip_address!r}".encode("utf-8"), digest_size=_KEY_DIGEST_SIZE).digest()
+
+# Drops rows whose unique_id and ip_address were already seen, e.g. an address reported twice, a shared VPC resource seen from
+# two accounts or an account collected again after a retry. The first row wins. Only a fixed size digest of every key is kept,
+# not the rows or their ARNs, so memory stays bounded by the number of distinct rows whatever the length of their keys.
+class InventoryDeduplicator():
+    def __init__(self):
+        self._seen_key_digests: Set[bytes] = set()
+        self.unique_rows = 0
+        self.duplicate_rows_by_asset_type: Dict[str, int] = {}
+
+    @property
+    def duplicate_rows(self) -> int:
+        return sum(self.duplicate_rows_by_asset_type.values())
+
+    def _is_duplicate(self, inventory_row: InventoryData) -> bool:
+        key_digest = get_row_key_digest(inventory_row)
+
+        if key_digest in self._seen_key_digests:
+            asset_type = inventory_row.asset_type or "Unknown"
+            self.duplicate_rows_by_asset_type[asset_type] = self.duplicate_rows_by_asset_type.get(asset_type, 0) + 1
+
+            return True
+
+        self._seen_key_digests.add(key_digest)
+        self.unique_rows += 1
+
+        return False
+
+    def deduplicate(self, inventory: Iterable[InventoryData]) -> Iterable[InventoryData]:
+        # A list from the batch pipeline stays a list, rows of the streaming pipeline are dropped as the report pulls them
+        if isinstance(inventory, list):
+            deduplicated_inventory = [ inventory_row for inventory_row in inventory if not self._is_duplicate(inventory_row) ]
+            self._complete()
+
+            return deduplicated_inventory
+
+        return self._iter_deduplicated(inventory)
+
+    def _iter_deduplicated(self, inventory: Iterable[InventoryData]) -> Iterator[InventoryData]:
+        for inventory_row in inventory:
+            if not self._is_duplicate(inventory_row):
+                yield inventory_row
+
+        self._complete()
+
+    def _complete(self):
+        for asset_type, duplicate_rows in self.duplicate_rows_by_asset_type.items():
+            get_stage_metrics().record("DuplicateRows", count=duplicate_rows, AssetType=asset_type)
+
+        if self.duplicate_rows:
+            _logger.warning(f"dropped {self.duplicate_rows} duplicate rows ({', '.join(f'{count} {asset_type}' for asset_type, count in self.duplicate_rows_by_asset_type.items())}), kept {self.unique_rows} rows")
+        else:
+            _logger.info(f"no duplicate rows among {self.unique_rows} rows")
@@ -1,18 +1,180 @@
 # (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
 # License:
 # This sample code is made available under the MIT-0 license. See the LICENSE file.
-from inventory.readers import AwsConfigInventoryReader
-from inventory.reports import CreateReportCommandHandler, DeliverReportCommandHandler
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional
+from inventory.checkpoints import CheckpointDeadlineReached, InventoryCheckpoint
+from inventory.clients import get_client
+from inventory.deltas import InventoryBaseline, InventoryDeltaTracker
+from inventory.distributed import DistributedInventoryReader, InProcessInvoker, LambdaInvoker, PartialInventory
+from inventory.duplicates import InventoryDeduplicator
+from inventory.instrumentation import emit_embedded_metrics, get_stage_metrics, profiling
+from inventory.mappers import InventoryData
+from inventory.readers import AwsConfigAggregatorInventoryReader, AwsConfigInventoryReader, CheckpointingAwsConfigInventoryReader, IncrementalAwsConfigInventoryReader, InventoryReader
+from inventory.reports import CreateDeltaReportCommandHandler, DeliverReportCommandHandler, MultiFormatCreateReportCommandHandler, ShardedCreateReportCommandHandler, get_create_report_command_handler, get_report_formats
+from inventory.snapshots import get_snapshot_store
+
+_logger = logging.getLogger("inventory.handler")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DEFAULT_CHECKPOINT_MAX_CONTINUATIONS = 10
+
+def _continue_in_new_invocation(event, context) -> dict:
+    continuation = ((event or {}).get("continuation") or 0) + 1
+
+    # Without a continuation the next scheduled run resumes from the checkpoint
+    if os.environ.get("CHECKPOINT_CONTINUATION", "invoke").lower() == "invoke" and continuation <= int(os.environ.get("CHECKPOINT_MAX_CONTINUATIONS", DEFAULT_CHECKPOINT_MAX_CONTINUATIONS)):
+        _logger.info(f"invoking {context.invoked_function_arn} to continue collection, continuation {continuation}")
+
+        get_client('lambda').invoke(FunctionName=context.invoked_function_arn, InvocationType="Event", Payload=json.dumps({ "continuation": continuation }))
+    else:
+        _logger.warning(f"not invoking a continuation after {continuation - 1} continuations, the next run resumes from the checkpoint")
+
+    return {'statusCode': 202,
+            'body': {
+                    'checkpoint': { 'continuation': continuation }
+                }
+            }
 
 def lambda_handler(event, context):
-    inventory = AwsConfigInventoryReader(lambda_context=context).get_resources_from_all_accounts()
+    stage_metrics = get_stage_metrics()
+    stage_metrics.reset()
+
+    with profiling():
+        try:
+            # Events of the coordinator of the distributed mode ask for one batch of accounts to be collected
+            if (event or {}).get("worker"):
+                response = handle_worker_event(event, context)
+            else:
+                response = _collect_and_report(event, context)
+        finally:
+            emit_embedded_metrics()
+
+    response['body']['metrics'] = stage_metrics.summary()
+
+    return response
+
+def handle_worker_event(event, context) -> dict:
+    worker_event = event["worker"]
+    stage_metrics = get_stage_metrics()
+
+    # Always a full collection, incremental snapshots and checkpoints are kept by the coordinator's account list as a whole
+    with stage_metrics.timer("CollectInventory"):
+        inventory = AwsConfigInventoryReader(lambda_context=context, accounts=worker_event["accounts"]).get_resources_from_all_accounts()
+
+    with stage_metrics.timer("SavePartial"):
+        get_snapshot_store(worker_event["location"], snapshot_class=PartialInventory).save(PartialInventory(inventory))
+
+    _logger.info(f"worker for batch {worker_event['batch']} of run {worker_event['runId']} saved {len(inventory)} rows to {worker_event['location']}")
+
+    return {'statusCode': 200,
+            'body': {
+                    'worker': { 'batch': worker_event['batch'], 'rows': len(inventory), 'location': worker_event['location'] }
+                }
+            }
+
+def _get_worker_invoker(context):
+    if os.environ.get("DISTRIBUTED_INVOKER", "lambda").lower() == "local":
+        return InProcessInvoker(handle_worker_event, context)
+
+    return LambdaInvoker(context.invoked_function_arn)
+
+def _collect_and_report(event, context) -> dict:
+    stage_metrics = get_stage_metrics()
+    checkpointing_reader = None
+    reader: InventoryReader
+
+    if partials_location := os.environ.get("DISTRIBUTED_PARTIALS_LOCATION"):
+        reader = DistributedInventoryReader(_get_worker_invoker(context), partials_location)
+    elif aggregator_name := os.environ.get("CONFIG_AGGREGATOR_NAME"):
+        reader = AwsConfigAggregatorInventoryReader(lambda_context=context, aggregator_name=aggregator_name)
+    elif snapshot_location := os.environ.get("INVENTORY_SNAPSHOT_LOCATION"):
+        reader = IncrementalAwsConfigInventoryReader(lambda_context=context, snapshot_store=get_snapshot_store(snapshot_location))
+    elif checkpoint_location := os.environ.get("CHECKPOINT_LOCATION"):
+        reader = checkpointing_reader = CheckpointingAwsConfigInventoryReader(lambda_context=context, checkpoint_store=get_snapshot_store(checkpoint_location, snapshot_class=InventoryCheckpoint))
+    else:
+        reader = AwsConfigInventoryReader(lambda_context=context)
+
+    # The delta against the previous run is only computed and its baseline only replaced once the report is complete
+    delta_tracker = InventoryDeltaTracker(get_snapshot_store(delta_baseline_location, snapshot_class=InventoryBaseline)) if (delta_baseline_location := os.environ.get("DELTA_BASELINE_LOCATION")) else None
+
+    inventory: Iterable[InventoryData]
+
+    try:
+        # Streaming mode hands rows to the report as they are mapped instead of building the full inventory list first. CreateReport
+        # then includes the time spent pulling rows, which CollectInventory measures on its own.
+        if os.environ.get("INVENTORY_PIPELINE_MODE", "batch").lower() == "streaming":
+            inventory = stage_metrics.timed_iter(reader.iter_resources_from_all_accounts(), "CollectInventory")
+        else:
+            with stage_metrics.timer("CollectInventory"):
+                inventory = reader.get_resources_from_all_accounts()
+
+        if os.environ.get("INVENTORY_DEDUPLICATION", "false").lower() == "true":
+            inventory = InventoryDeduplicator().deduplicate(inventory)
+
+        if delta_tracker:
+            inventory = delta_tracker.track(inventory)
+
+        create_report_command_handler = get_create_report_command_handler()
+        report_formats = get_report_formats()
+        deliver_report_command_handler = DeliverReportCommandHandler()
+        report_urls: Optional[Dict[str, str]] = None
+
+        if os.environ.get("REPORT_SHARD_BY"):
+            sharded_create_report_command_handler = ShardedCreateReportCommandHandler(create_report_command_handler)
+
+            with stage_metrics.timer("CreateReport"):
+                report_shards = sharded_create_report_command_handler.execute(inventory)
+
+            report_url = deliver_report_command_handler.execute_sharded(report_shards, sharded_create_report_command_handler.shard_by)
+        elif report_formats != [ "xlsx" ]:
+            multi_format_create_report_command_handler = MultiFormatCreateReportCommandHandler(report_formats, create_report_command_handler)
+
+            if os.environ.get("REPORT_DELIVERY_MODE", "file").lower() == "stream":
+                with stage_metrics.timer("CreateReport"):
+                    report_urls = deliver_report_command_handler.execute_streaming_formats(report_formats, lambda report_outputs: multi_format_create_report_command_handler.execute(inventory, report_outputs))
+            else:
+                with stage_metrics.timer("CreateReport"):
+                    report_paths = multi_format_create_report_command_handler.execute(inventory)
+
+                report_urls = { report_format: deliver_report_command_handler.execute(report_path) for report_format, report_path in report_paths.items() }
+
+            report_url = report_urls.get("xlsx") or report_urls[report_formats[0]]
+        elif os.environ.get("REPORT_DELIVERY_MODE", "file").lower() == "stream":
+            # The report is created while it is uploaded, so CreateReport also covers the upload
+            with stage_metrics.timer("CreateReport"):
+                report_url = deliver_report_command_handler.execute_streaming(lambda report_output: create_report_command_handler.execute(inventory, report_output))
+        else:
+            with stage_metrics.timer("CreateReport"):
+                report_path = create_report_command_handler.execute(inventory)
+
+            report_url = deliver_report_command_handler.execute(report_path)
+    except CheckpointDeadlineReached:
+        return _continue_in_new_invocation(event, context)
+
+    # The checkpoint outlives a report that fails or times out, the next run then reports from it without collecting again
+    if checkpointing_reader:
+        checkpointing_reader.complete()
+
+    report: Dict[str, Any] = { 'url': report_url }
+
+    if report_urls:
+        report['formats'] = report_urls
+
+    if delta_tracker:
+        if delta := delta_tracker.compute_delta():
+            with stage_metrics.timer("CreateReport"):
+                delta_report_path = CreateDeltaReportCommandHandler().execute(delta)
+
+            # Delivered with the timestamp of the report it belongs to
+            report['delta'] = { 'url': deliver_report_command_handler.execute(delta_report_path, suffix="-delta.csv"), **delta.counts }
 
-    report_path = CreateReportCommandHandler().execute(inventory)
-    report_url = DeliverReportCommandHandler().execute(report_path)
+        delta_tracker.save_baseline()
 
     return {'statusCode': 200,
             'body': {
-                    'report': { 'url': report_url }
+                    'report': report
                 }
             }
 
@@ -0,0 +1,148 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from contextlib import contextmanager
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+_logger = logging.getLogger("inventory.instrumentation")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DEFAULT_METRICS_NAMESPACE = "InventoryCollector"
+DEFAULT_PROFILER_TOP_ENTRIES = 25
+T = TypeVar("T")
+
+# Accumulates seconds and counts by stage and an optional dimension (AccountId, ResourceType, Api). Readers, report handlers and
+# the request scheduler record into the module level collector, which the handler resets and reports once per invocation.
+class StageMetrics():
+    def __init__(self):
+        self._values: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float = 0.0, count: int = 1, **dimensions: str):
+        key = (stage, tuple(dimensions.items()))
+
+        with self._lock:
+            if (values := self._values.get(key)) is None:
+                values = self._values[key] = [0.0, 0]
+
+            values[0] += seconds
+            values[1] += count
+
+    @contextmanager
+    def timer(self, stage: str, **dimensions: str):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, 1, **dimensions)
+
+    def timed_iter(self, iterable: Iterable[T], stage: str, **dimensions: str) -> Iterator[T]:
+        # Only the time spent producing items is counted, not the time the consumer spends between them
+        seconds = 0.0
+        count = 0
+        iterator = iter(iterable)
+
+        try:
+            while True:
+                start = time.perf_counter()
+
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - start
+
+                count += 1
+
+                yield item
+        finally:
+            self.record(stage, seconds, count, **dimensions)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def summary(self) -> dict:
+        summary: Dict[str, dict] = { "stages": {} }
+
+        with self._lock:
+            values = list(self._values.items())
+
+        for (stage, dimensions), (seconds, count) in sorted(values):
+            stage_total = summary["stages"].setdefault(stage, { "seconds": 0.0, "count": 0 })
+            stage_total["seconds"] = round(stage_total["seconds"] + seconds, 6)
+            stage_total["count"] += count
+
+            for name, value in dimensions:
+                summary.setdefault(name, {}).setdefault(value, {})[stage] = { "seconds": round(seconds, 6), "count": count }
+
+        return summary
+
+    def to_embedded_metrics(self, namespace: str) -> List[str]:
+        # CloudWatch Embedded Metric Format, see https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+        timestamp = int(time.time() * 1000)
+
+        with self._lock:
+            values = list(self._values.items())
+
+        return [ json.dumps({ "_aws": { "Timestamp": timestamp,
+                                        "CloudWatchMetrics": [ { "Namespace": namespace,
+                                                                 "Dimensions": [ [ "Stage", *(name for name, _ in dimensions) ] ],
+                                                                 "Metrics": [ { "Name": "Duration", "Unit": "Seconds" }, { "Name": "Count", "Unit": "Count" } ] } ] },
+                              "Stage": stage,
+                              **dict(dimensions),
+                              "Duration": seconds,
+                              "Count": count })
+                 for (stage, dimensions), (seconds, count) in values ]
+
+_stage_metrics = StageMetrics()
+
+def get_stage_metrics() -> StageMetrics:
+    return _stage_metrics
+
+def emit_embedded_metrics():
+    # Printed rather than logged, CloudWatch only extracts metrics from log events that are entirely JSON
+    for embedded_metric in _stage_metrics.to_embedded_metrics(os.environ.get("METRICS_NAMESPACE", DEFAULT_METRICS_NAMESPACE)):
+        print(embedded_metric, flush=True)
+
+@contextmanager
+def profiling():
+    profiler_name = os.environ.get("INVENTORY_PROFILER", "").lower()
+    top_entries = int(os.environ.get("INVENTORY_PROFILER_TOP_ENTRIES", DEFAULT_PROFILER_TOP_ENTRIES))
+
+    if profiler_name == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profile_output = io.StringIO()
+            pstats.Stats(profiler, stream=profile_output).sort_stats("cumulative").print_stats(top_entries)
+
+            _logger.info(f"cProfile statistics by cumulative time:\n{profile_output.getvalue()}")
+    elif profiler_name == "tracemalloc":
+        tracemalloc.start()
+
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current_size, peak_size = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top_statistics = "\n".join(str(statistic) for statistic in snapshot.statistics("lineno")[:top_entries])
+
+            _logger.info(f"tracemalloc peak of {peak_size / 1024 / 1024:.1f} MiB, {current_size / 1024 / 1024:.1f} MiB still allocated by:\n{top_statistics}")
+    else:
+        yield
@@ -1,22 +1,61 @@
 # (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
 # License:
 # This sample code is made available under the MIT-0 license. See the LICENSE file.
-import copy
+from functools import cached_property
+from importlib.metadata import entry_points
 import logging
+from operator import attrgetter
 import os
-from typing import List
+import sys
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Type
 from abc import ABC, abstractmethod
 
 _logger = logging.getLogger("inventory.mappers")
 _logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+MAPPER_ENTRY_POINT_GROUP = "inventory.mappers"
 
-def _get_tag_value(tags: dict, tag_name: str) -> str:
-    return next((tag["value"] for tag in tags if tag["key"].casefold() == tag_name.casefold()), '')
+# Kept on the resource dictionary, so the index is built once however many mappers and rows look up tags of the resource
+_TAG_INDEX_KEY = "tagIndex"
+_inventory_tag_names: Dict[str, Tuple[str, ...]] = {}
+
+def get_tag_index(config_resource: dict) -> Dict[str, str]:
+    if (tag_index := config_resource.get(_TAG_INDEX_KEY)) is None:
+        tag_index = {}
+
+        # Keys differing only in case keep the first value, like the linear scan this replaces
+        for tag in config_resource.get("tags") or ():
+            tag_index.setdefault(tag["key"].casefold(), tag["value"])
+
+        config_resource[_TAG_INDEX_KEY] = tag_index
+
+    return tag_index
+
+def get_tag_value(config_resource: dict, tag_name: str) -> str:
+    return get_tag_index(config_resource).get(tag_name.casefold(), '')
+
+def get_inventory_tag_names() -> Tuple[str, ...]:
+    # Tags copied into the tags attribute of every row, casefolded
+    setting = os.environ.get("INVENTORY_TAG_NAMES", "")
+
+    if (tag_names := _inventory_tag_names.get(setting)) is None:
+        tag_names = _inventory_tag_names[setting] = tuple(dict.fromkeys(tag_name.strip().casefold() for tag_name in setting.split(",") if tag_name.strip()))
+
+    return tag_names
+
+# Attribute names of InventoryData, in the order used by its tuple and columnar forms
+# account_id is not part of the report, the readers set it for grouping rows by account. tags holds the values of the tags named
+# by INVENTORY_TAG_NAMES, which report layouts can write into columns of their own.
+INVENTORY_DATA_FIELDS = ("asset_type", "unique_id", "ip_address", "location", "is_virtual", "authenticated_scan_planned", "dns_name", "mac_address",
+                         "baseline_config", "hardware_model", "is_public", "network_id", "owner", "software_product_name", "software_vendor", "account_id",
+                         "tags")
 
 class InventoryData:
+    # One instance is created for every IP of every resource, so avoid the per-instance __dict__
+    __slots__ = INVENTORY_DATA_FIELDS
+
     def __init__(self, *, asset_type = None, unique_id = None, ip_address = None, location = None, is_virtual = None, 
                 authenticated_scan_planned = None, dns_name = None, mac_address = None, baseline_config = None, hardware_model = None, 
-                is_public = None, network_id = None, owner = None, software_product_name = None, software_vendor = None):
+                is_public = None, network_id = None, owner = None, software_product_name = None, software_vendor = None, account_id = None, tags = None):
         self.asset_type = asset_type
         self.unique_id = unique_id
         self.ip_address = ip_address
@@ -32,6 +71,71 @@ class InventoryData:
         self.owner = owner
         self.software_product_name = software_product_name
         self.software_vendor = software_vendor
+        self.account_id = account_id
+        self.tags = tags
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, InventoryData) and self.as_tuple() == other.as_tuple()
+
+    def __hash__(self) -> int:
+        # Consistent with __eq__, the tags dictionary is left out as it is not hashable
+        return hash(_get_inventory_data_hashed_values(self))
+
+    def __repr__(self) -> str:
+        return f"InventoryData({', '.join(f'{name}={getattr(self, name)!r}' for name in INVENTORY_DATA_FIELDS if getattr(self, name) is not None)})"
+
+    def as_tuple(self) -> tuple:
+        return _get_inventory_data_values(self)
+
+    @classmethod
+    def from_tuple(cls, values: Iterable) -> "InventoryData":
+        inventory_data = cls.__new__(cls)
+        values = tuple(values)
+
+        # Tuples stored before a field was added are shorter, the missing fields are None
+        if len(values) < len(INVENTORY_DATA_FIELDS):
+            values += (None,) * (len(INVENTORY_DATA_FIELDS) - len(values))
+
+        # Unpacked in one statement rather than with setattr per field, which is several times faster for the millions of rows
+        # read back from worker processes, checkpoints and partial files. Keep in the order of INVENTORY_DATA_FIELDS.
+        (inventory_data.asset_type, inventory_data.unique_id, inventory_data.ip_address, inventory_data.location, inventory_data.is_virtual,
+         inventory_data.authenticated_scan_planned, inventory_data.dns_name, inventory_data.mac_address, inventory_data.baseline_config,
+         inventory_data.hardware_model, inventory_data.is_public, inventory_data.network_id, inventory_data.owner, inventory_data.software_product_name,
+         inventory_data.software_vendor, inventory_data.account_id, inventory_data.tags) = values
+
+        return inventory_data
+
+_get_inventory_data_values = attrgetter(*INVENTORY_DATA_FIELDS)
+_get_inventory_data_hashed_values = attrgetter(*(name for name in INVENTORY_DATA_FIELDS if name != "tags"))
+
+class InventoryBatch:
+    # Columnar form of a list of InventoryData, one list per attribute, for writers and post-processing that work column by column
+    __slots__ = ("_columns",)
+
+    def __init__(self, rows: Iterable[InventoryData] = ()):
+        self._columns: Dict[str, list] = { name: [] for name in INVENTORY_DATA_FIELDS }
+
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self._columns["unique_id"])
+
+    def __iter__(self) -> Iterator[InventoryData]:
+        return map(InventoryData.from_tuple, self.rows())
+
+    def append(self, row: InventoryData):
+        for column, value in zip(self._columns.values(), row.as_tuple()):
+            column.append(value)
+
+    def extend(self, rows: Iterable[InventoryData]):
+        for row in rows:
+            self.append(row)
+
+    def column(self, name: str) -> list:
+        return self._columns[name]
+
+    def rows(self) -> Iterator[tuple]:
+        return zip(*self._columns.values())
 
 class DataMapper(ABC):
     @abstractmethod
@@ -42,8 +146,20 @@ class DataMapper(ABC):
     def _get_supported_resource_type(self) -> List[str]:
         pass
 
+    # Paths below "configuration" read by the mapper, used to only select those from AWS Config. None selects the whole configuration.
+    def _get_configuration_paths(self) -> Optional[List[str]]:
+        return None
+
+    @cached_property
+    def configuration_paths(self) -> Optional[List[str]]:
+        return self._get_configuration_paths()
+
+    @cached_property
+    def supported_resource_types(self) -> FrozenSet[str]:
+        return frozenset(self._get_supported_resource_type())
+
     def can_map(self, resource_type: str) -> bool:
-        return resource_type in self._get_supported_resource_type()
+        return resource_type in self.supported_resource_types
 
     def map(self, config_resource: dict) -> List[InventoryData]:
         if not self.can_map(config_resource["resourceType"]):
@@ -55,52 +171,137 @@ class DataMapper(ABC):
 
         mapped_data.extend(self._do_mapping(config_resource))
 
+        if account_id := config_resource.get("accountId"):
+            for inventory_data in mapped_data:
+                inventory_data.account_id = account_id
+
+        if tag_names := get_inventory_tag_names():
+            tag_index = get_tag_index(config_resource)
+            # One dictionary shared by every row of the resource
+            tags = { tag_name: tag_index.get(tag_name, '') for tag_name in tag_names }
+
+            for inventory_data in mapped_data:
+                inventory_data.tags = tags
+
         _logger.debug(f"mapping resulted in a total of {len(mapped_data)} rows")
 
         return mapped_data    
 
+    def map_into(self, config_resource: dict, batch: InventoryBatch):
+        batch.extend(self.map(config_resource))
+
+class MapperRegistry():
+    def __init__(self, mappers: Iterable[DataMapper] = ()):
+        self._mappers_by_resource_type: Dict[str, DataMapper] = {}
+
+        for mapper in mappers:
+            self.register(mapper)
+
+    @property
+    def resource_types(self) -> List[str]:
+        return list(self._mappers_by_resource_type)
+
+    @property
+    def mappers(self) -> List[DataMapper]:
+        return list({ id(mapper): mapper for mapper in self._mappers_by_resource_type.values() }.values())
+
+    def register(self, mapper: DataMapper) -> DataMapper:
+        # Sorted, the order of a frozenset changes between processes with the hash seed and so would the text of the select queries
+        for resource_type in sorted(mapper.supported_resource_types):
+            if resource_type in self._mappers_by_resource_type:
+                _logger.warning(f"replacing mapper {type(self._mappers_by_resource_type[resource_type]).__name__} for resource type {resource_type} with {type(mapper).__name__}")
+
+            self._mappers_by_resource_type[resource_type] = mapper
+
+        return mapper
+
+    def register_entry_points(self, group: str = MAPPER_ENTRY_POINT_GROUP):
+        # Python 3.10 added the selection by group, earlier versions return a dictionary keyed by group
+        if sys.version_info >= (3, 10):
+            group_entry_points = entry_points().select(group=group)
+        else:
+            group_entry_points = entry_points().get(group, [])
+
+        for entry_point in group_entry_points:
+            _logger.info(f"registering mapper {entry_point.value} from entry point {entry_point.name}")
+
+            self.register(entry_point.load()())
+
+    def get_mapper(self, resource_type: str) -> Optional[DataMapper]:
+        return self._mappers_by_resource_type.get(resource_type)
+
+    def get_configuration_projections(self) -> List[Tuple[List[str], Optional[List[str]]]]:
+        # Resource types of each mapper along with the configuration paths that mapper reads
+        return [([resource_type for resource_type, registered_mapper in self._mappers_by_resource_type.items() if registered_mapper is mapper], mapper.configuration_paths)
+                for mapper in self.mappers]
+
+_default_mapper_registry = MapperRegistry()
+_default_mapper_registry_entry_points_registered = False
+
+def register_mapper(mapper_class: Type[DataMapper]) -> Type[DataMapper]:
+    _default_mapper_registry.register(mapper_class())
+
+    return mapper_class
+
+def get_default_mapper_registry() -> MapperRegistry:
+    global _default_mapper_registry_entry_points_registered
+
+    if not _default_mapper_registry_entry_points_registered:
+        _default_mapper_registry.register_entry_points()
+        _default_mapper_registry_entry_points_registered = True
+
+    return _default_mapper_registry
+
+@register_mapper
 class EC2DataMapper(DataMapper):
     def _get_supported_resource_type(self) -> List[str]:
         return ["AWS::EC2::Instance"]
 
+    def _get_configuration_paths(self) -> Optional[List[str]]:
+        return ["instanceId", "imageId", "instanceType", "vpcId", "publicDnsName", "privateDnsName", "networkInterfaces"]
+
     def _do_mapping(self, config_resource: dict) -> List[InventoryData]:
         ec2_data_list: List[InventoryData] = []
+        configuration: dict = config_resource["configuration"]
+
+        if not configuration["networkInterfaces"]:
+            return ec2_data_list
+
+        # Shared by every row of the instance, only the addresses differ between rows
+        instance_data = { "asset_type": "EC2",
+                          "unique_id": configuration["instanceId"],
+                          "is_virtual": "Yes",
+                          "authenticated_scan_planned": "Yes",
+                          "baseline_config": configuration["imageId"],
+                          "hardware_model": configuration["instanceType"],
+                          "network_id": configuration["vpcId"],
+                          "owner": get_tag_value(config_resource, "owner") }
+
+        if (public_dns_name := configuration.get("publicDnsName")):
+            instance_data["dns_name"] = public_dns_name
+            instance_data["is_public"] = "Yes"
+        else:
+            instance_data["dns_name"] = configuration["privateDnsName"]
+            instance_data["is_public"] = "No"
 
-        for nic in config_resource["configuration"]["networkInterfaces"]:
+        for nic in configuration["networkInterfaces"]:
             for ipAddress in nic["privateIpAddresses"]:
-                ec2_data = { "asset_type": "EC2",
-                             "unique_id": config_resource["configuration"]["instanceId"],
-                             "ip_address": ipAddress["privateIpAddress"],
-                             "is_virtual": "Yes",
-                             "authenticated_scan_planned": "Yes",
-                             "mac_address": nic["macAddress"],
-                             "baseline_config": config_resource["configuration"]["imageId"],
-                             "hardware_model": config_resource["configuration"]["instanceType"],
-                             "network_id": config_resource["configuration"]["vpcId"],
-                             "owner": _get_tag_value(config_resource["tags"], "owner") }
-
-                if (public_dns_name := config_resource["configuration"].get("publicDnsName")):
-                    ec2_data["dns_name"] = public_dns_name
-                    ec2_data["is_public"] = "Yes"
-                else:
-                    ec2_data["dns_name"] = config_resource["configuration"]["privateDnsName"]
-                    ec2_data["is_public"] = "No"
-
-                ec2_data_list.append(InventoryData(**ec2_data))
+                ec2_data_list.append(InventoryData(**instance_data, ip_address=ipAddress["privateIpAddress"], mac_address=nic["macAddress"]))
 
                 if "association" in ipAddress:
                     # Each IP address needs its own row in report so public IP requires an additional row
-                    ec2_data = copy.deepcopy(ec2_data)
-                    ec2_data["ip_address"] = ipAddress["association"]["publicIp"]
-
-                    ec2_data_list.append(InventoryData(**ec2_data))
+                    ec2_data_list.append(InventoryData(**instance_data, ip_address=ipAddress["association"]["publicIp"], mac_address=nic["macAddress"]))
 
         return ec2_data_list
 
+@register_mapper
 class ElbDataMapper(DataMapper):
     def _get_supported_resource_type(self) -> List[str]:
         return ["AWS::ElasticLoadBalancing::LoadBalancer", "AWS::ElasticLoadBalancingV2::LoadBalancer"]
 
+    def _get_configuration_paths(self) -> Optional[List[str]]:
+        return ["type", "scheme", "vpcId", "vpcid", "availabilityZones"]
+
     def _get_asset_type_name(self, config_resource: dict) -> str:
         if config_resource["resourceType"] == "AWS::ElasticLoadBalancing::LoadBalancer":
             return "Load Balancer-Classic"
@@ -124,27 +325,27 @@ class ElbDataMapper(DataMapper):
                  "unique_id": config_resource["arn"],
                  "is_virtual": "Yes",
                  "authenticated_scan_planned": "Yes",
-                 "is_public": "Yes" if config_resource.get("configuration").get("scheme", "unknown") == "internet-facing" else "No",
+                 "is_public": "Yes" if config_resource["configuration"].get("scheme", "unknown") == "internet-facing" else "No",
                  # Classic ELBs have key of "vpcid" while V2 ELBs have key of "vpcId"
                  "network_id": config_resource["configuration"]["vpcId"] if "vpcId" in config_resource["configuration"] else config_resource["configuration"]["vpcid"],
-                 "owner": _get_tag_value(config_resource["tags"], "owner") }
+                 "owner": get_tag_value(config_resource, "owner") }
 
         if len(ip_addresses := self._get_ip_addresses(config_resource["configuration"]["availabilityZones"])) > 0:
             for ip_address in ip_addresses:
-                data = copy.deepcopy(data)
-
-                data["ip_address"] = ip_address
-
-                data_list.append(InventoryData(**data))
+                data_list.append(InventoryData(**data, ip_address=ip_address))
         else:
             data_list.append(InventoryData(**data))
 
         return data_list
 
+@register_mapper
 class RdsDataMapper(DataMapper):
     def _get_supported_resource_type(self) -> List[str]:
         return ["AWS::RDS::DBInstance"]
 
+    def _get_configuration_paths(self) -> Optional[List[str]]:
+        return ["publiclyAccessible", "dBInstanceClass", "engine", "engineVersion", "dBSubnetGroup"]
+
     def _do_mapping(self, config_resource: dict) -> List[InventoryData]:
         data = { "asset_type": "RDS",
                  "unique_id": config_resource["arn"],
@@ -154,14 +355,18 @@ class RdsDataMapper(DataMapper):
                  "hardware_model": config_resource["configuration"]["dBInstanceClass"],
                  "software_product_name": f"{config_resource['configuration']['engine']}-{config_resource['configuration']['engineVersion']}",
                  "network_id": config_resource['configuration']['dBSubnetGroup']['vpcId'] if "dBSubnetGroup" in config_resource['configuration'] else '',
-                 "owner": _get_tag_value(config_resource["tags"], "owner") }
+                 "owner": get_tag_value(config_resource, "owner") }
 
         return [InventoryData(**data)]
 
+@register_mapper
 class DynamoDbTableDataMapper(DataMapper):
     def _get_supported_resource_type(self) -> List[str]:
         return ["AWS::DynamoDB::Table"]
 
+    def _get_configuration_paths(self) -> Optional[List[str]]:
+        return []
+
     def _do_mapping(self, config_resource: dict) -> List[InventoryData]:
         data = { "asset_type": "DynamoDB",
                  "unique_id": config_resource["arn"],
@@ -169,6 +374,6 @@ class DynamoDbTableDataMapper(DataMapper):
                  "is_public": "No",
                  "software_vendor": "AWS",
                  "software_product_name": "DynamoDB",
-                 "owner": _get_tag_value(config_resource["tags"], "owner") }
+                 "owner": get_tag_value(config_resource, "owner") }
 
         return [InventoryData(**data)]
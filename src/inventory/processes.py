@@ -0,0 +1,134 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from concurrent.futures import Future
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+import os
+import queue
+import threading
+from typing import Callable, List, Optional, Tuple
+
+_logger = logging.getLogger("inventory.processes")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+
+def is_fork_available() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+def _run_worker(connection: Connection, fn: Callable):
+    while (args := connection.recv()) is not None:
+        try:
+            connection.send((True, fn(*args)))
+        except Exception as ex:
+            # The exception itself may not be picklable
+            connection.send((False, f"{type(ex).__name__}: {ex}"))
+
+# Pool of forked worker processes for CPU bound work. Lambda has no /dev/shm, which multiprocessing.Pool and
+# ProcessPoolExecutor need for their queues and locks, so every worker gets its own pipe and a thread in this process that
+# feeds it one task at a time. Workers inherit fn and everything it refers to when they are forked, only the arguments and
+# results of tasks are pickled. submit is thread safe.
+class ForkedProcessPool():
+    def __init__(self, fn: Callable, max_workers: int):
+        self._fn = fn
+        self._max_workers = max_workers
+        self._tasks: "queue.Queue[Optional[Tuple[Future, tuple]]]" = queue.Queue()
+        self._workers: List[Tuple[BaseProcess, Connection, threading.Thread]] = []
+        self._live_workers = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> "ForkedProcessPool":
+        process_context = multiprocessing.get_context("fork")
+
+        # Every process is forked before any dispatcher thread is started, a fork only copies the thread calling it
+        for index in range(self._max_workers):
+            parent_connection, child_connection = process_context.Pipe()
+            process = process_context.Process(target=_run_worker, args=(child_connection, self._fn), name=f"inventory-worker-{index}", daemon=True)
+            process.start()
+            child_connection.close()
+
+            self._workers.append((process, parent_connection, threading.Thread(target=self._dispatch, args=(parent_connection,), name=f"inventory-worker-{index}-dispatcher", daemon=True)))
+
+        self._live_workers = len(self._workers)
+
+        for _, _, dispatcher in self._workers:
+            dispatcher.start()
+
+        _logger.info(f"started {self._max_workers} worker processes")
+
+        return self
+
+    def _dispatch(self, connection: Connection):
+        while (task := self._tasks.get()) is not None:
+            future, args = task
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                connection.send(args)
+                succeeded, result = connection.recv()
+            except (EOFError, OSError) as ex:
+                future.set_exception(RuntimeError(f"Worker process exited unexpectedly: {ex}"))
+                self._stop_dispatching()
+
+                return
+
+            if succeeded:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f"Worker process failed: {result}"))
+
+    def _stop_dispatching(self):
+        # Remaining tasks are left to the other workers, unless there are none left to run them
+        with self._lock:
+            self._live_workers -= 1
+
+            if self._live_workers > 0:
+                return
+
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                return
+
+            if task is not None and task[0].set_running_or_notify_cancel():
+                task[0].set_exception(RuntimeError("No worker processes left"))
+
+    def submit(self, *args) -> Future:
+        future: Future = Future()
+
+        with self._lock:
+            if self._live_workers == 0:
+                future.set_exception(RuntimeError("No worker processes left"))
+
+                return future
+
+        self._tasks.put((future, args))
+
+        return future
+
+    def close(self):
+        for _ in self._workers:
+            self._tasks.put(None)
+
+        for process, connection, dispatcher in self._workers:
+            dispatcher.join()
+
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+
+            connection.close()
+            process.join()
+
+        self._workers.clear()
+
+    def __enter__(self) -> "ForkedProcessPool":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
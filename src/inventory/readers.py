@@ -1,58 +1,147 @@
 # (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
 # License:
 # This sample code is made available under the MIT-0 license. See the LICENSE file.
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from hashlib import blake2b
 import json
 import logging
 import os
-from typing import Iterator, List, Optional
+import time
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 import boto3
 from botocore.exceptions import ClientError
-from  inventory.mappers import DataMapper, EC2DataMapper, ElbDataMapper, DynamoDbTableDataMapper, InventoryData, RdsDataMapper
+from inventory.checkpoints import DEFAULT_CHECKPOINT_MARGIN_SECONDS, DEFAULT_CHECKPOINT_REPORT_ROWS_PER_SECOND, CheckpointDeadlineReached, InventoryCheckpoint, RegionProgress
+from inventory.clients import assume_role, get_client
+from inventory.decoders import JsonDecoder, get_json_decoder
+from inventory.instrumentation import get_stage_metrics
+from inventory.processes import ForkedProcessPool, is_fork_available
+from  inventory.mappers import DataMapper, InventoryBatch, InventoryData, MapperRegistry, get_default_mapper_registry, get_inventory_tag_names
+from inventory.snapshots import InventorySnapshot, SnapshotResource
+from inventory.throttling import RequestScheduler
 
 _logger = logging.getLogger("inventory.readers")
 _logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DEFAULT_ACCOUNT_COLLECTION_MAX_WORKERS = 1
+DEFAULT_REGION_COLLECTION_MAX_WORKERS = 4
+DEFAULT_ASSUME_ROLE_DURATION_SECONDS = 900
+DEFAULT_MAPPING_PROCESS_WORKERS = 0
+MAX_SELECT_EXPRESSION_LENGTH = 4096
+T = TypeVar("T")
+R = TypeVar("R")
 
-class AwsConfigInventoryReader():
-    def __init__(self, lambda_context, sts_client=boto3.client('sts'), mappers=[EC2DataMapper(), ElbDataMapper(), DynamoDbTableDataMapper(), RdsDataMapper()]):
+def _ordered_map(executor: Executor, fn: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    # Results are yielded in the order of items, regardless of which one finishes first, which keeps the report rows in a
+    # deterministic order. At most window items are in flight so that results do not pile up ahead of the consumer.
+    pending: Deque[Future] = deque()
+
+    for item in items:
+        pending.append(executor.submit(fn, item))
+
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+def _get_default_regions() -> List[str]:
+    if inventory_regions := os.environ.get("INVENTORY_REGIONS"):
+        return json.loads(inventory_regions)
+
+    return [os.environ["AWS_REGION"]]
+
+# Every reader yields the rows of all accounts, either as they are mapped or as one list
+class InventoryReader(ABC):
+    @abstractmethod
+    def iter_resources_from_all_accounts(self) -> Iterator[InventoryData]:
+        pass
+
+    def get_resources_from_all_accounts(self) -> List[InventoryData]:
+        return list(self.iter_resources_from_all_accounts())
+
+class AwsConfigInventoryReader(InventoryReader):
+    def __init__(self, lambda_context, sts_client=None, mappers: Optional[Iterable[DataMapper]] = None,
+                 max_workers: Optional[int] = None, max_region_workers: Optional[int] = None, json_decoder: Optional[JsonDecoder] = None,
+                 request_scheduler: Optional[RequestScheduler] = None, accounts: Optional[List[dict]] = None, mapping_workers: Optional[int] = None):
         self._lambda_context = lambda_context
+        self._accounts = accounts
         self._sts_client = sts_client
-        self._mappers: List[DataMapper] = mappers
+        self._mapper_registry: MapperRegistry = MapperRegistry(mappers) if mappers is not None else get_default_mapper_registry()
+        self._resource_type_filter: str = f"resourceType IN ({', '.join(repr(resource_type) for resource_type in self._mapper_registry.resource_types)})"
+        self._max_workers: int = max_workers or int(os.environ.get("ACCOUNT_COLLECTION_MAX_WORKERS", DEFAULT_ACCOUNT_COLLECTION_MAX_WORKERS))
+        self._max_region_workers: int = max_region_workers or int(os.environ.get("REGION_COLLECTION_MAX_WORKERS", DEFAULT_REGION_COLLECTION_MAX_WORKERS))
+        self._regions_by_account: Dict[str, List[str]] = {}
+        self._select_projection: bool = os.environ.get("CONFIG_SELECT_PROJECTION", "false").lower() == "true"
+        self._json_decoder: JsonDecoder = json_decoder or get_json_decoder()
+        self._request_scheduler: RequestScheduler = request_scheduler or RequestScheduler()
+        self._mapping_workers: int = mapping_workers if mapping_workers is not None else int(os.environ.get("MAPPING_PROCESS_WORKERS", DEFAULT_MAPPING_PROCESS_WORKERS))
+        self._mapping_pool: Optional[ForkedProcessPool] = None
 
     # Moved into it's own method to make it easier to mock boto3 client
-    def _get_config_client(self, sts_response) -> boto3.client:
-        return boto3.client('config', 
-                            aws_access_key_id=sts_response['Credentials']['AccessKeyId'],
-                            aws_secret_access_key=sts_response['Credentials']['SecretAccessKey'],
-                            aws_session_token=sts_response['Credentials']['SessionToken'],
-                            region_name=os.environ['AWS_REGION'])
-
-    def _get_resources_from_account(self, account_id: str) -> Iterator[List[str]]:
-        try:
-            _logger.info(f"assuming role on account {account_id}")
+    def _get_config_client(self, sts_response, region_name: Optional[str] = None) -> boto3.client:
+        return get_client('config', region_name=region_name or os.environ['AWS_REGION'], credentials=sts_response['Credentials'])
+
+    def _get_sts_client(self) -> boto3.client:
+        return self._sts_client or get_client('sts')
+
+    def _get_resource_type_filter(self) -> str:
+        return self._resource_type_filter
+
+    def _get_select_expressions(self, extra_fields: Iterable[str] = (), condition: str = "") -> List[str]:
+        condition = f" AND {condition}" if condition else ""
+
+        if not self._select_projection:
+            return [f"SELECT {', '.join(['arn', 'resourceType', 'configuration', 'tags', *extra_fields])} WHERE {self._get_resource_type_filter()}{condition}"]
+
+        # One query per mapper that only selects the configuration properties the mapper reads
+        return [f"SELECT {', '.join(['arn', 'resourceType', 'tags', *(f'configuration.{path}' for path in paths), *extra_fields]) if paths is not None else ', '.join(['arn', 'resourceType', 'configuration', 'tags', *extra_fields])} "
+                f"WHERE resourceType IN ({', '.join(repr(resource_type) for resource_type in resource_types)}){condition}"
+                for resource_types, paths in self._mapper_registry.get_configuration_projections()]
+
+    def _get_accounts(self) -> List[dict]:
+        return self._accounts if self._accounts is not None else json.loads(os.environ["ACCOUNT_LIST"])
+
+    def _get_regions(self, account_id: str) -> List[str]:
+        return self._regions_by_account.get(account_id) or _get_default_regions()
+
+    def _assume_role(self, account_id: str) -> dict:
+        _logger.info(f"assuming role on account {account_id}")
+
+        # Credentials of the assumed role are shared by the config clients of every region of the account and are reused by later
+        # invocations of a warm Lambda container until shortly before they expire
+        return assume_role(self._get_sts_client(), request_scheduler=self._request_scheduler,
+                           RoleArn=f"arn:{self._get_aws_partition()}:iam::{account_id}:role/{os.environ['CROSS_ACCOUNT_ROLE_NAME']}",
+                           RoleSessionName=f"{account_id}-Assumed-Role",
+                           DurationSeconds=int(os.environ.get("ASSUME_ROLE_DURATION_SECONDS", DEFAULT_ASSUME_ROLE_DURATION_SECONDS)))
 
-            sts_response = self._sts_client.assume_role(RoleArn=f"arn:{self._get_aws_partition()}:iam::{account_id}:role/{os.environ['CROSS_ACCOUNT_ROLE_NAME']}",
-                                                        RoleSessionName=f"{account_id}-Assumed-Role",
-                                                        DurationSeconds=900)
-            config_client = self._get_config_client(sts_response)
+    def _select_resource_page(self, config_client, expression: str, next_token: str) -> dict:
+        return self._request_scheduler.call("SelectResourceConfig", config_client.select_resource_config, scope=config_client, Expression=expression, NextToken=next_token)
 
-            next_token: str = ''
-            while True:
-                resources_result = config_client.select_resource_config(Expression="SELECT arn, resourceType, configuration, tags "
-                                                                                   "WHERE resourceType IN ('AWS::EC2::Instance', 'AWS::ElasticLoadBalancingV2::LoadBalancer', "
-                                                                                       "'AWS::ElasticLoadBalancing::LoadBalancer', 'AWS::DynamoDB::Table', 'AWS::RDS::DBInstance')",
-                                                                        NextToken=next_token)
-                
-                next_token = resources_result.get('NextToken', '')
-                results: List[str] = resources_result.get('Results', [])
+    def _select_resources(self, config_client, expression: str) -> Iterator[List[str]]:
+        next_token: str = ''
+        while True:
+            resources_result = self._select_resource_page(config_client, expression, next_token)
+            
+            next_token = resources_result.get('NextToken', '')
+            results: List[str] = resources_result.get('Results', [])
 
-                _logger.debug(f"page returned {len(results)} and next token of '{next_token}'")
+            _logger.debug(f"page returned {len(results)} and next token of '{next_token}'")
 
-                yield results
+            yield results
 
-                if not next_token:
-                    break
+            if not next_token:
+                break
+
+    def _get_resources_from_region(self, account_id: str, sts_response: dict, region: str) -> Iterator[List[str]]:
+        try:
+            config_client = self._get_config_client(sts_response, region)
+
+            for select_expression in self._get_select_expressions():
+                yield from self._select_resources(config_client, select_expression)
         except ClientError as ex:
-            _logger.error("Received error: %s while retrieving resources from account %s, moving onto next account.", ex, account_id, exc_info=True)
+            _logger.error("Received error: %s while retrieving resources from account %s in region %s, moving onto next account or region.", ex, account_id, region, exc_info=True)
 
             yield []
 
@@ -61,33 +150,440 @@ class AwsConfigInventoryReader():
 
         return arn_parts[1] if len(arn_parts) >= 1 else ''
 
-    def get_resources_from_all_accounts(self) -> List[InventoryData]:
+    def _decode_resources(self, resource_list_page: List[str]) -> List[dict]:
+        with get_stage_metrics().timer("DecodeJson"):
+            resources: List[dict] = self._json_decoder.decode_page(resource_list_page)
+
+        # AWS Config leaves out the configuration when none of the projected properties exist on the resource
+        if self._select_projection:
+            for resource in resources:
+                resource.setdefault("configuration", {})
+
+        return resources
+
+    def _map_resource(self, resource: dict, account_id: Optional[str] = None) -> List[InventoryData]:
+        # One line item returned from AWS Config can result in multiple inventory line items (e.g. multiple IPs)
+        mapper: Optional[DataMapper] = self._mapper_registry.get_mapper(resource["resourceType"])
+        
+        if not mapper:
+            _logger.warning(f"skipping mapping, unable to find mapper for resource type of {resource['resourceType']}")
+
+            return []
+
+        # Aggregator results carry their account, other results come from the account being read
+        if account_id:
+            resource.setdefault("accountId", account_id)
+
+        return mapper.map(resource)
+
+    def _map_resource_page(self, resources: List[dict], account_id: Optional[str] = None) -> Iterator[Tuple[dict, List[InventoryData]]]:
+        # Mapping a resource takes a few microseconds, about as long as a timer taking the metrics lock. Durations are summed by
+        # resource type here and recorded once per page.
+        map_totals: Dict[str, List[float]] = {}
+
+        try:
+            for resource in resources:
+                started = time.perf_counter()
+                rows = self._map_resource(resource, account_id)
+                seconds = time.perf_counter() - started
+
+                if (totals := map_totals.get(resource["resourceType"])) is None:
+                    totals = map_totals[resource["resourceType"]] = [0.0, 0]
+
+                totals[0] += seconds
+                totals[1] += 1
+
+                yield resource, rows
+        finally:
+            stage_metrics = get_stage_metrics()
+
+            for resource_type, (seconds, count) in map_totals.items():
+                stage_metrics.record("Map", seconds, int(count), ResourceType=resource_type)
+
+    def _map_resources(self, resource_list_page: List[str], account_id: Optional[str] = None) -> Iterator[InventoryData]:
+        _logger.debug(f"current page of inventory contained {len(resource_list_page)} items from AWS Config")
+
+        for _, rows in self._map_resource_page(self._decode_resources(resource_list_page), account_id):
+            yield from rows
+
+    def _map_resources_to_tuples(self, resource_list_page: List[str], account_id: Optional[str] = None) -> List[tuple]:
+        return [ inventory_row.as_tuple() for inventory_row in self._map_resources(resource_list_page, account_id) ]
+
+    @contextmanager
+    def _mapping_processes(self):
+        # Started before any collection thread exists, so that nothing but the calling thread is forked
+        if self._mapping_workers > 0 and is_fork_available():
+            with ForkedProcessPool(self._map_resources_to_tuples, self._mapping_workers) as self._mapping_pool:
+                try:
+                    yield
+                finally:
+                    self._mapping_pool = None
+        else:
+            if self._mapping_workers > 0:
+                _logger.warning("fork is not available, mapping resources in the collecting threads")
+
+            yield
+
+    def _iter_mapped_pages(self, resource_list_pages: Iterable[List[str]], account_id: Optional[str] = None) -> Iterator[InventoryData]:
+        if self._mapping_pool is None:
+            for resource_list_page in resource_list_pages:
+                yield from self._map_resources(resource_list_page, account_id)
+
+            return
+
+        # Raw pages are decoded and mapped in the worker processes while the next pages are retrieved, rows come back as tuples
+        # in page order. DecodeJson and Map are recorded by the workers and not part of the metrics of this process.
+        pending: Deque[Future] = deque()
+
+        for resource_list_page in resource_list_pages:
+            pending.append(self._mapping_pool.submit(resource_list_page, account_id))
+
+            if len(pending) > self._mapping_workers:
+                yield from map(InventoryData.from_tuple, pending.popleft().result())
+
+        while pending:
+            yield from map(InventoryData.from_tuple, pending.popleft().result())
+
+    def _iter_inventory_from_region(self, account_id: str, sts_response: dict, region: str) -> Iterator[InventoryData]:
+        yield from self._iter_mapped_pages(self._get_resources_from_region(account_id, sts_response, region), account_id)
+
+    def _iter_inventory_from_failed_account(self, account_id: str) -> Iterator[InventoryData]:
+        return iter(())
+
+    def _iter_inventory_from_account(self, account_id: str) -> Iterator[InventoryData]:
+        _logger.info(f"retrieving inventory for account {account_id}")
+
+        try:
+            sts_response = self._assume_role(account_id)
+        except ClientError as ex:
+            _logger.error("Received error: %s while retrieving resources from account %s, moving onto next account.", ex, account_id, exc_info=True)
+
+            yield from self._iter_inventory_from_failed_account(account_id)
+
+            return
+
+        regions = self._get_regions(account_id)
+
+        if self._max_region_workers > 1 and len(regions) > 1:
+            _logger.info(f"retrieving inventory for account {account_id} from {len(regions)} regions using up to {self._max_region_workers} workers")
+
+            with ThreadPoolExecutor(max_workers=min(self._max_region_workers, len(regions))) as executor:
+                for region_inventory in _ordered_map(executor, lambda region: list(self._iter_inventory_from_region(account_id, sts_response, region)), regions, window=self._max_region_workers):
+                    yield from region_inventory
+        else:
+            for region in regions:
+                yield from self._iter_inventory_from_region(account_id, sts_response, region)
+
+    def _iter_timed_inventory_from_account(self, account_id: str) -> Iterator[InventoryData]:
+        return get_stage_metrics().timed_iter(self._iter_inventory_from_account(account_id), "CollectAccount", AccountId=account_id)
+
+    def _get_inventory_from_account(self, account_id: str) -> List[InventoryData]:
+        return list(self._iter_timed_inventory_from_account(account_id))
+
+    def iter_resources_from_all_accounts(self) -> Iterator[InventoryData]:
+        with self._mapping_processes():
+            yield from self._iter_resources_from_all_accounts()
+
+    def _iter_resources_from_all_accounts(self) -> Iterator[InventoryData]:
         _logger.info("starting retrieval of inventory from AWS Config")
 
-        all_inventory : List[InventoryData] = []
-        accounts = json.loads(os.environ["ACCOUNT_LIST"])
+        accounts: List[dict] = self._get_accounts()
+        account_ids: List[str] = [account["id"] for account in accounts]
+        self._regions_by_account = { account["id"]: account["regions"] for account in accounts if account.get("regions") }
+        total_rows: int = 0
+
+        if self._max_workers > 1 and len(account_ids) > 1:
+            _logger.info(f"retrieving inventory from {len(account_ids)} accounts using up to {self._max_workers} workers")
+
+            with ThreadPoolExecutor(max_workers=min(self._max_workers, len(account_ids))) as executor:
+                for account_inventory in _ordered_map(executor, self._get_inventory_from_account, account_ids, window=self._max_workers):
+                    total_rows += len(account_inventory)
+
+                    yield from account_inventory
+        else:
+            for account_id in account_ids:
+                for inventory_row in self._iter_timed_inventory_from_account(account_id):
+                    total_rows += 1
+
+                    yield inventory_row
+
+        _logger.info(f"completed getting inventory, with a total of {total_rows}")
+        _logger.info(f"AWS API request metrics: {json.dumps(self._request_scheduler.metrics)}")
+
+    def get_resources_batch_from_all_accounts(self) -> InventoryBatch:
+        return InventoryBatch(self.iter_resources_from_all_accounts())
+
+def _get_snapshot_key(account_id: str, region: str) -> str:
+    return f"{account_id}:{region}"
+
+# Only re-fetches and re-maps resources whose configuration item was captured after the watermark of the account and region
+# from the previous run. Unchanged resources are carried over from the snapshot, and resources that no longer exist in AWS
+# Config are dropped.
+class IncrementalAwsConfigInventoryReader(AwsConfigInventoryReader):
+    def __init__(self, lambda_context, snapshot_store, **kwargs):
+        super().__init__(lambda_context, **kwargs)
+        self._snapshot_store = snapshot_store
+        # Resources are mapped one by one to keep them apart in the snapshot, worker processes would have nothing to map
+        self._mapping_workers = 0
+        self._previous_snapshot = InventorySnapshot()
+        self._current_snapshot = InventorySnapshot()
+
+    def get_mapping_fingerprint(self) -> str:
+        # Everything that decides the rows of a resource besides its configuration item
+        mapping = { "tagNames": get_inventory_tag_names(),
+                    "mappers": { resource_type: f"{type(mapper).__module__}.{type(mapper).__qualname__}"
+                                 for resource_type in sorted(self._mapper_registry.resource_types) if (mapper := self._mapper_registry.get_mapper(resource_type)) },
+                    "projections": self._mapper_registry.get_configuration_projections() if self._select_projection else None }
 
-        for account in accounts:
-            _logger.info(f"retrieving inventory for account {account['id']}")
+        return blake2b(json.dumps(mapping, sort_keys=True, default=repr).encode("utf-8"), digest_size=16).hexdigest()
 
-            for resource_list_page in self._get_resources_from_account(account["id"]):
-                _logger.debug(f"current page of inventory contained {len(resource_list_page)} items from AWS Config")
+    def _select_mapped_resources(self, config_client, account_id: str, expressions: List[str]) -> Iterator[SnapshotResource]:
+        for resource_list_page in (page for expression in expressions for page in self._select_resources(config_client, expression)):
+            for resource, rows in self._map_resource_page(self._decode_resources(resource_list_page), account_id):
+                yield SnapshotResource(arn=resource["arn"], capture_time=resource["configurationItemCaptureTime"], rows=rows)
 
-                for raw_resource in resource_list_page:
-                    resource : dict = json.loads(raw_resource)
+    def _get_changed_resources(self, config_client, account_id: str, snapshot_key: str, watermark: Optional[str]) -> Dict[str, SnapshotResource]:
+        previous_resources = self._previous_snapshot.get_resources(snapshot_key)
 
-                    # One line item returned from AWS Config can result in multiple inventory line items (e.g. multiple IPs)
-                    # Mappers that do not support the resource type will return False
-                    mapper: Optional[DataMapper] = next((mapper for mapper in self._mappers if mapper.can_map(resource["resourceType"])), None)
-                    
-                    if not mapper:
-                        _logger.warning(f"skipping mapping, unable to find mapper for resource type of {resource['resourceType']}")
+        if watermark:
+            capture_times: Dict[str, str] = { resource["arn"]: resource["configurationItemCaptureTime"]
+                                              for resource_list_page in self._select_resources(config_client, f"SELECT arn, configurationItemCaptureTime WHERE {self._get_resource_type_filter()}")
+                                              for resource in self._json_decoder.decode_page(resource_list_page) }
 
-                        continue
+            # Anything unchanged since the watermark must already be in the snapshot, otherwise fall back to a full retrieval
+            if all(arn in previous_resources for arn, capture_time in capture_times.items() if capture_time <= watermark):
+                _logger.info(f"retrieving resources changed since {watermark} for {snapshot_key}")
 
-                    if len(inventory_items := mapper.map(resource)) > 0:
-                        all_inventory.extend(inventory_items)
+                changed_resources = { resource.arn: resource for resource in self._select_mapped_resources(config_client, account_id, self._get_select_expressions(["configurationItemCaptureTime"], f"configurationItemCaptureTime > '{watermark}'")) }
+
+                _logger.info(f"re-mapped {len(changed_resources)} of {len(capture_times)} resources for {snapshot_key}")
+
+                # Keep the order of the listing, resources created after the listing was taken are added at the end
+                resources = { arn: resource for arn in capture_times if (resource := changed_resources.pop(arn, None) or previous_resources.get(arn)) }
+                resources.update(changed_resources)
+
+                return resources
+
+            _logger.warning(f"snapshot for {snapshot_key} is missing resources, retrieving all resources")
+
+        return { resource.arn: resource for resource in self._select_mapped_resources(config_client, account_id, self._get_select_expressions(["configurationItemCaptureTime"])) }
+
+    def _iter_inventory_from_region(self, account_id: str, sts_response: dict, region: str) -> Iterator[InventoryData]:
+        snapshot_key = _get_snapshot_key(account_id, region)
+        watermark = self._previous_snapshot.get_watermark(snapshot_key)
+
+        try:
+            resources = self._get_changed_resources(self._get_config_client(sts_response, region), account_id, snapshot_key, watermark)
+            watermark = max((resource.capture_time for resource in resources.values()), default=watermark)
+        except ClientError as ex:
+            _logger.error("Received error: %s while retrieving resources from account %s in region %s, using previous snapshot and moving onto next account or region.", ex, account_id, region, exc_info=True)
+
+            resources = self._previous_snapshot.get_resources(snapshot_key)
+
+        self._current_snapshot.set_account(snapshot_key, watermark, resources)
+
+        for resource in resources.values():
+            yield from resource.rows
+
+    def _iter_inventory_from_failed_account(self, account_id: str) -> Iterator[InventoryData]:
+        _logger.info(f"using previous snapshot for account {account_id}")
+
+        for region in self._get_regions(account_id):
+            snapshot_key = _get_snapshot_key(account_id, region)
+            resources = self._previous_snapshot.get_resources(snapshot_key)
+
+            self._current_snapshot.set_account(snapshot_key, self._previous_snapshot.get_watermark(snapshot_key), resources)
+
+            for resource in resources.values():
+                yield from resource.rows
+
+    def iter_resources_from_all_accounts(self) -> Iterator[InventoryData]:
+        mapping_fingerprint = self.get_mapping_fingerprint()
+        self._previous_snapshot = self._snapshot_store.load()
+        self._current_snapshot = InventorySnapshot(mapping_fingerprint=mapping_fingerprint)
+
+        # Rows of unchanged resources are copied as they are, e.g. without the tags added to INVENTORY_TAG_NAMES since
+        if self._previous_snapshot.mapping_fingerprint != mapping_fingerprint:
+            _logger.info("snapshot was not taken with the current mappers, tag names and projection, retrieving all resources")
+
+            self._previous_snapshot = InventorySnapshot()
+
+        yield from super().iter_resources_from_all_accounts()
+
+        self._snapshot_store.save(self._current_snapshot)
+
+# Records the rows of each account and region as it is collected, along with the query and NextToken of the next page. Once the
+# remaining time of the Lambda invocation drops below the margin the progress is saved and CheckpointDeadlineReached is raised,
+# and the next invocation replays completed regions from the checkpoint and carries on from the saved page of the others.
+class CheckpointingAwsConfigInventoryReader(AwsConfigInventoryReader):
+    def __init__(self, lambda_context, checkpoint_store, **kwargs):
+        super().__init__(lambda_context, **kwargs)
+        self._checkpoint_store = checkpoint_store
+        # Pages are mapped one at a time so that a checkpoint never holds a page that was retrieved but not mapped
+        self._mapping_workers = 0
+        self._checkpoint = InventoryCheckpoint()
+        self._checkpoint_margin_millis: int = int(os.environ.get("CHECKPOINT_MARGIN_SECONDS", DEFAULT_CHECKPOINT_MARGIN_SECONDS)) * 1000
+        self._report_rows_per_second: float = float(os.environ.get("CHECKPOINT_REPORT_ROWS_PER_SECOND", DEFAULT_CHECKPOINT_REPORT_ROWS_PER_SECOND))
+        self._collected_rows = 0
+        self._retrieved_pages = False
+
+    def _is_deadline_reached(self) -> bool:
+        get_remaining_time_in_millis = getattr(self._lambda_context, "get_remaining_time_in_millis", None)
+        # The report of the rows collected so far still has to be created and delivered within the same invocation
+        report_reserve_millis = self._collected_rows * 1000 / self._report_rows_per_second if self._report_rows_per_second > 0 else 0
+
+        return callable(get_remaining_time_in_millis) and get_remaining_time_in_millis() < self._checkpoint_margin_millis + report_reserve_millis
+
+    def _iter_inventory_from_region(self, account_id: str, sts_response: dict, region: str) -> Iterator[InventoryData]:
+        region_key = _get_snapshot_key(account_id, region)
+        progress = self._checkpoint.get_region(region_key)
+
+        if progress and progress.complete:
+            yield from progress.rows
+
+            return
+
+        select_expressions = self._get_select_expressions()
+        rows: List[InventoryData] = []
+        start_index = 0
+
+        # Queries before the saved one are complete, an unknown query means the configuration changed and the region starts over
+        if progress and progress.expression in select_expressions:
+            rows = list(progress.rows)
+            start_index = select_expressions.index(progress.expression)
+
+            yield from rows
+
+        try:
+            config_client = self._get_config_client(sts_response, region)
+
+            for select_expression in select_expressions[start_index:]:
+                next_token: str = progress.next_token if progress and select_expression == progress.expression else ''
+
+                while True:
+                    if self._is_deadline_reached():
+                        self._checkpoint.set_region(region_key, RegionProgress(rows=rows, complete=False, expression=select_expression, next_token=next_token))
+
+                        raise CheckpointDeadlineReached(f"stopped retrieving resources for {region_key} before the Lambda timeout")
+
+                    resources_result = self._select_resource_page(config_client, select_expression, next_token)
+                    self._retrieved_pages = True
+                    page_rows = list(self._map_resources(resources_result.get('Results', []), account_id))
+                    rows.extend(page_rows)
+                    next_token = resources_result.get('NextToken') or ''
+
+                    yield from page_rows
+
+                    if not next_token:
+                        break
+        except ClientError as ex:
+            _logger.error("Received error: %s while retrieving resources from account %s in region %s, moving onto next account or region.", ex, account_id, region, exc_info=True)
+
+        self._checkpoint.set_region(region_key, RegionProgress(rows=rows, complete=True))
+
+    def _iter_inventory_from_account(self, account_id: str) -> Iterator[InventoryData]:
+        region_progress = [ self._checkpoint.get_region(_get_snapshot_key(account_id, region)) for region in self._get_regions(account_id) ]
+
+        # No need to assume the role of accounts that were completed by an earlier invocation
+        if all(progress and progress.complete for progress in region_progress):
+            _logger.info(f"using checkpoint for account {account_id}")
+
+            for progress in region_progress:
+                yield from progress.rows
+
+            return
+
+        yield from super()._iter_inventory_from_account(account_id)
+
+    def iter_resources_from_all_accounts(self) -> Iterator[InventoryData]:
+        self._checkpoint = self._checkpoint_store.load()
+
+        if len(self._checkpoint):
+            _logger.info(f"resuming from checkpoint with {self._checkpoint.completed_regions} of {len(self._checkpoint)} regions complete")
+
+        self._collected_rows = 0
+        self._retrieved_pages = False
+
+        try:
+            for inventory_row in super().iter_resources_from_all_accounts():
+                yield inventory_row
+
+                self._collected_rows += 1
+
+            # Kept until the report is delivered, a run that times out while reporting resumes with every region complete. Only
+            # a run that retrieved pages stops here, one that resumed with every region complete creates its report regardless.
+            if self._retrieved_pages and self._is_deadline_reached():
+                raise CheckpointDeadlineReached("stopped before creating the report to leave it the time of a new invocation")
+        except CheckpointDeadlineReached:
+            _logger.warning(f"saving checkpoint with {self._checkpoint.completed_regions} completed regions, the Lambda invocation is close to its timeout")
+
+            self._checkpoint_store.save(self._checkpoint)
+
+            raise
+
+        self._checkpoint_store.save(self._checkpoint)
+
+    def complete(self):
+        # Called once the report is delivered, the next run starts from scratch
+        self._checkpoint_store.save(InventoryCheckpoint())
+
+# Queries a Config aggregator instead of assuming a role on every account, which returns the resources of every account and
+# region of the aggregator in a single paginated result
+class AwsConfigAggregatorInventoryReader(AwsConfigInventoryReader):
+    def __init__(self, lambda_context, aggregator_name: str, config_client=None, **kwargs):
+        super().__init__(lambda_context, **kwargs)
+        self._aggregator_name = aggregator_name
+        self._config_client = config_client or get_client('config')
+
+    def _select_resource_page(self, config_client, expression: str, next_token: str) -> dict:
+        return self._request_scheduler.call("SelectAggregateResourceConfig", config_client.select_aggregate_resource_config, scope=config_client,
+                                            Expression=expression, ConfigurationAggregatorName=self._aggregator_name, NextToken=next_token)
+
+    def _get_aggregator_select_expressions(self) -> List[str]:
+        extra_fields = ["accountId", "awsRegion"]
+
+        # The aggregator may span more accounts than are part of the system, only keep the ones in the account list when it is set
+        if self._accounts is None and not os.environ.get("ACCOUNT_LIST"):
+            return self._get_select_expressions(extra_fields)
+
+        # AWS Config rejects expressions longer than 4096 characters, a long account list is split over several queries
+        unfiltered_length = max(len(select_expression) for select_expression in self._get_select_expressions(extra_fields, "accountId IN ()"))
+        select_expressions: List[str] = []
+        account_ids: List[str] = []
+        filter_length = 0
+
+        for account in self._get_accounts():
+            account_id = repr(account['id'])
+
+            if account_ids and unfiltered_length + filter_length + len(", ") + len(account_id) > MAX_SELECT_EXPRESSION_LENGTH:
+                select_expressions.extend(self._get_select_expressions(extra_fields, f"accountId IN ({', '.join(account_ids)})"))
+                account_ids, filter_length = [], 0
+
+            filter_length += len(account_id) + (len(", ") if account_ids else 0)
+            account_ids.append(account_id)
+
+        if account_ids:
+            select_expressions.extend(self._get_select_expressions(extra_fields, f"accountId IN ({', '.join(account_ids)})"))
+
+        return select_expressions
+
+    def iter_resources_from_all_accounts(self) -> Iterator[InventoryData]:
+        _logger.info(f"starting retrieval of inventory from AWS Config aggregator {self._aggregator_name}")
+
+        total_rows: int = 0
+
+        try:
+            with self._mapping_processes():
+                for select_expression in self._get_aggregator_select_expressions():
+                    for inventory_row in self._iter_mapped_pages(self._select_resources(self._config_client, select_expression)):
+                        total_rows += 1
+
+                        yield inventory_row
+        except ClientError as ex:
+            # Every account is queried at once, a report without the rest of them would look complete
+            _logger.error("Received error: %s while retrieving resources from aggregator %s.", ex, self._aggregator_name, exc_info=True)
 
-        _logger.info(f"completed getting inventory, with a total of {len(all_inventory)}")
+            raise
 
-        return all_inventory
+        _logger.info(f"completed getting inventory, with a total of {total_rows}")
+        _logger.info(f"AWS API request metrics: {json.dumps(self._request_scheduler.metrics)}")
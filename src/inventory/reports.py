@@ -1,76 +1,574 @@
 # (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
 # License:
 # This sample code is made available under the MIT-0 license. See the LICENSE file.
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
+import csv
+import json
 import logging
-from pathlib import PurePath
+import multiprocessing
+from multiprocessing.process import BaseProcess
+from operator import attrgetter
+from pathlib import PurePath, PurePosixPath
 import os, os.path
-from typing import List
-import boto3
-from openpyxl import load_workbook
+import re
+import threading
+from typing import Callable, Deque, Dict, IO, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple, Union, cast
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import column_index_from_string, get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
-from inventory.mappers import InventoryData
+from inventory.clients import get_client
+from inventory.deltas import InventoryDelta
+from inventory.instrumentation import get_stage_metrics
+from inventory.mappers import INVENTORY_DATA_FIELDS, InventoryData, get_inventory_tag_names
+from inventory.uploads import DEFAULT_UPLOAD_MAX_WORKERS, S3MultipartUploadStream
+from inventory.writers import ReportWriter, get_report_writer, get_report_writer_names, get_text_value
 
 _logger = logging.getLogger("inventory.reports")
 _logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
 _current_dir_name = os.path.dirname(__file__)
 _workbook_template_file_name = os.path.join(_current_dir_name, "SSP-A13-FedRAMP-Integrated-Inventory-Workbook-Template.xlsx")
+_workbook_layout_file_name = os.path.join(_current_dir_name, "SSP-A13-FedRAMP-Integrated-Inventory-Workbook-Template.layout.json")
 _workbook_output_file_path = PurePath("/tmp/SSP-A13-FedRAMP-Integrated-Inventory.xlsx")
 DEFAULT_REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER = 6
+DEFAULT_REPORT_ENGINE = "openpyxl"
+REPORT_LAYOUT_FORMAT_VERSION = 1
+DEFAULT_REPORT_FORMATS = "xlsx"
+DEFAULT_REPORT_WRITER_BATCH_ROWS = 10000
+# Well below the 1,048,576 rows Excel can open in one worksheet, the template's header rows included
+DEFAULT_REPORT_SHARD_MAX_ROWS = 1000000
+REPORT_SHARD_KEYS = ("account", "asset_type", "rows")
+_spreadsheet_namespace = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_relationships_namespace = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_package_relationships_namespace = "http://schemas.openxmlformats.org/package/2006/relationships"
+_worksheet_row_pattern = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.DOTALL)
+_worksheet_cell_style_pattern = re.compile(r'<c\b[^>]*?\br="([A-Z]+)\d+"[^>]*?\bs="(\d+)"')
+_worksheet_dimension_pattern = re.compile(r'<dimension\b[^>]*/>')
+_shard_name_pattern = re.compile(r'[^A-Za-z0-9]+')
+_tag_column_prefix = "tags."
+_delta_report_fields = ("change", "changed_fields", "previous_values", *INVENTORY_DATA_FIELDS)
+
+def _get_output_name(output: Union[PurePath, IO[bytes]]) -> str:
+    return str(output) if isinstance(output, (str, PurePath)) else str(getattr(output, "name", output))
+
+# Where InventoryData attributes go in the template. Layouts are JSON files kept next to the template they describe, so a new
+# revision of the template ships with its own layout:
+#   { "version": 1, "template": "<template file, relative to the layout>", "worksheet": "Inventory", "firstWriteableRow": 6,
+#     "columns": { "A": "unique_id", "B": "ip_address", ... } }
+class ReportLayout():
+    def __init__(self, template_file_name: str, worksheet_name: str, first_row_number: int, columns: Iterable[Tuple[int, str]]):
+        self.template_file_name = template_file_name
+        self.worksheet_name = worksheet_name
+        self.first_row_number = first_row_number
+        # Column numbers (not indexes) and the attribute written into them, in column order
+        self.columns: Tuple[Tuple[int, str], ...] = tuple(sorted(columns))
+        self.column_numbers: Tuple[int, ...] = tuple(column for column, _ in self.columns)
+
+        # Columns named "tags.<tag name>" take the value of a tag listed in INVENTORY_TAG_NAMES
+        self.tag_names: Tuple[str, ...] = tuple(attribute_name[len(_tag_column_prefix):].casefold() for _, attribute_name in self.columns if attribute_name.startswith(_tag_column_prefix))
+
+        if unknown_attribute_names := sorted({ attribute_name for _, attribute_name in self.columns if not attribute_name.startswith(_tag_column_prefix) } - set(INVENTORY_DATA_FIELDS)):
+            raise ValueError(f"Report layout refers to unknown inventory attributes {', '.join(unknown_attribute_names)}.")
+
+        attribute_names = [ attribute_name for _, attribute_name in self.columns ]
+
+        if self.tag_names:
+            value_getters = [ self._get_tag_value_getter(attribute_name[len(_tag_column_prefix):].casefold()) if attribute_name.startswith(_tag_column_prefix) else attrgetter(attribute_name)
+                              for attribute_name in attribute_names ]
+            self._get_values: Callable[[InventoryData], tuple] = lambda inventory_row: tuple(value_getter(inventory_row) for value_getter in value_getters)
+        else:
+            # One call per row gets every value of the row, attrgetter returns a bare value rather than a tuple for a single name
+            self._get_values = attrgetter(*attribute_names) if len(attribute_names) > 1 else lambda inventory_row: tuple(getattr(inventory_row, attribute_name) for attribute_name in attribute_names)
+
+    @staticmethod
+    def _get_tag_value_getter(tag_name: str) -> Callable[[InventoryData], Optional[str]]:
+        return lambda inventory_row: inventory_row.tags.get(tag_name) if inventory_row.tags else None
+
+    def get_values(self, inventory_row: InventoryData) -> tuple:
+        return self._get_values(inventory_row)
+
+    @classmethod
+    def from_file(cls, layout_file_name: str, worksheet_name: Optional[str] = None, first_row_number: Optional[int] = None) -> "ReportLayout":
+        with open(layout_file_name) as layout_file:
+            layout_data = json.load(layout_file)
+
+        if layout_data.get("version") != REPORT_LAYOUT_FORMAT_VERSION:
+            raise ValueError(f"Report layout {layout_file_name} has unsupported version {layout_data.get('version')}.")
+
+        return cls(template_file_name=os.path.join(os.path.dirname(layout_file_name), layout_data["template"]),
+                   worksheet_name=worksheet_name or layout_data.get("worksheet", "Inventory"),
+                   first_row_number=first_row_number or int(layout_data.get("firstWriteableRow", DEFAULT_REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER)),
+                   columns=[ (column_index_from_string(letter), attribute_name) for letter, attribute_name in layout_data["columns"].items() ])
+
+_report_layouts: Dict[Tuple[str, str, str], ReportLayout] = {}
+
+def get_report_layout() -> ReportLayout:
+    # REPORT_WORKSHEET_NAME and REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER still take precedence over the layout file
+    layout_key = (os.environ.get("REPORT_COLUMN_LAYOUT") or _workbook_layout_file_name, os.environ.get("REPORT_WORKSHEET_NAME", ""), os.environ.get("REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER", ""))
+
+    if (report_layout := _report_layouts.get(layout_key)) is None:
+        layout_file_name, worksheet_name, first_row_number = layout_key
+        report_layout = _report_layouts[layout_key] = ReportLayout.from_file(layout_file_name, worksheet_name or None, int(first_row_number) if first_row_number else None)
+
+        _logger.info(f"loaded report layout {layout_file_name} with {len(report_layout.columns)} columns")
+
+        if missing_tag_names := [ tag_name for tag_name in report_layout.tag_names if tag_name not in get_inventory_tag_names() ]:
+            _logger.warning(f"report layout {layout_file_name} has columns for tags {', '.join(missing_tag_names)} that are not in INVENTORY_TAG_NAMES and stay empty")
+
+    return report_layout
+
+# Template of the reports. openpyxl workbooks are mutable, so every report parses the xlsx into a workbook of its own. There is no
+# cheaper copy, unpickling a parsed template takes nearly as long as parsing it. The streaming engine only needs the raw parts of
+# the template, which are kept in memory for warm invocations.
+class ReportTemplate():
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self._parts: Optional[List[Tuple[ZipInfo, bytes]]] = None
+        self._lock = threading.Lock()
+
+    def new_workbook(self) -> Workbook:
+        with get_stage_metrics().timer("LoadTemplate"):
+            return load_workbook(self.file_name)
+
+    @property
+    def parts(self) -> List[Tuple[ZipInfo, bytes]]:
+        with self._lock:
+            if self._parts is None:
+                with get_stage_metrics().timer("LoadTemplate"), ZipFile(self.file_name) as template:
+                    self._parts = [ (template_part, template.read(template_part)) for template_part in template.infolist() ]
+
+        return self._parts
+
+_report_templates: Dict[str, ReportTemplate] = {}
+
+def get_report_template(file_name: str) -> ReportTemplate:
+    if (report_template := _report_templates.get(file_name)) is None:
+        report_template = _report_templates.setdefault(file_name, ReportTemplate(file_name))
+
+    return report_template
 
 class CreateReportCommandHandler():
     def _write_cell_if_value_provided(self, worksheet: Worksheet, column:int, row: int, value: str):
         if value:
             worksheet.cell(column=column, row=row, value=value)
 
-    def execute(self, inventory: List[InventoryData]) -> str:
-        workbook = load_workbook(_workbook_template_file_name)
-        reportWorksheetName = os.environ.get("REPORT_WORKSHEET_NAME", "Inventory")
+    def execute(self, inventory: Iterable[InventoryData], output: Union[PurePath, IO[bytes], None] = None) -> str:
+        report_output = output or _workbook_output_file_path
+        report_layout = get_report_layout()
+        workbook = get_report_template(report_layout.template_file_name).new_workbook()
+
+        reportWorksheetName = report_layout.worksheet_name
         reportWorksheet = workbook[reportWorksheetName]
-        rowNumber: int = int(os.environ.get("REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER", DEFAULT_REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER))
+        rowNumber: int = report_layout.first_row_number
+        column_numbers = report_layout.column_numbers
 
-        _logger.info(f"writing {len(inventory)} rows into worksheet {reportWorksheetName} starting at row {rowNumber}")
+        firstRowNumber: int = rowNumber
+
+        _logger.info(f"writing inventory into worksheet {reportWorksheetName} starting at row {rowNumber}")
 
         for inventory_row in inventory:
-            self._write_cell_if_value_provided(reportWorksheet, 1, rowNumber, inventory_row.unique_id)
-            self._write_cell_if_value_provided(reportWorksheet, 2, rowNumber, inventory_row.ip_address)
-            self._write_cell_if_value_provided(reportWorksheet, 3, rowNumber, inventory_row.is_virtual)
-            self._write_cell_if_value_provided(reportWorksheet, 4, rowNumber, inventory_row.is_public)
-            self._write_cell_if_value_provided(reportWorksheet, 5, rowNumber, inventory_row.dns_name)
-            self._write_cell_if_value_provided(reportWorksheet, 7, rowNumber, inventory_row.mac_address)
-            self._write_cell_if_value_provided(reportWorksheet, 8, rowNumber, inventory_row.authenticated_scan_planned)
-            self._write_cell_if_value_provided(reportWorksheet, 9, rowNumber, inventory_row.baseline_config)
-            self._write_cell_if_value_provided(reportWorksheet, 12, rowNumber, inventory_row.asset_type)
-            self._write_cell_if_value_provided(reportWorksheet, 13, rowNumber, inventory_row.hardware_model)
-            self._write_cell_if_value_provided(reportWorksheet, 15, rowNumber, inventory_row.software_vendor)
-            self._write_cell_if_value_provided(reportWorksheet, 16, rowNumber, inventory_row.software_product_name)
-            self._write_cell_if_value_provided(reportWorksheet, 21, rowNumber, inventory_row.network_id)
-            self._write_cell_if_value_provided(reportWorksheet, 22, rowNumber, inventory_row.owner)
-            self._write_cell_if_value_provided(reportWorksheet, 23, rowNumber, inventory_row.owner)
+            for column, value in zip(column_numbers, report_layout.get_values(inventory_row)):
+                self._write_cell_if_value_provided(reportWorksheet, column, rowNumber, value)
 
             rowNumber += 1
 
-        workbook.save(_workbook_output_file_path)
+        _logger.info(f"wrote {rowNumber - firstRowNumber} rows into worksheet {reportWorksheetName}")
+
+        with get_stage_metrics().timer("SaveWorkbook"):
+            workbook.save(report_output)
+
+        _logger.info(f"completed saving inventory into {_get_output_name(report_output)}")
+
+        return _get_output_name(report_output)
+
+# Copies the template package as-is and streams the inventory worksheet's XML so rows are never held in memory. Header rows
+# (everything before the first writeable row) are kept verbatim and data rows reuse the cell styles of the template's first
+# writeable row. Strings are written inline, which avoids having to rebuild the shared strings table.
+class StreamingCreateReportCommandHandler():
+    _rows_per_write = 1000
+
+    def _get_worksheet_part_name(self, template_parts: Dict[str, bytes], worksheet_name: str) -> str:
+        workbook = ElementTree.fromstring(template_parts["xl/workbook.xml"])
+        sheet = next((sheet for sheet in workbook.iter(f"{{{_spreadsheet_namespace}}}sheet") if sheet.get("name") == worksheet_name), None)
+
+        if sheet is None:
+            raise KeyError(f"Worksheet {worksheet_name} does not exist.")
+
+        relationship_id = sheet.get(f"{{{_relationships_namespace}}}id")
+        relationships = ElementTree.fromstring(template_parts["xl/_rels/workbook.xml.rels"])
+        target: str = next(relationship.attrib["Target"] for relationship in relationships.iter(f"{{{_package_relationships_namespace}}}Relationship")
+                      if relationship.get("Id") == relationship_id)
+
+        return target.lstrip("/") if target.startswith("/") else str(PurePosixPath("xl", target))
+
+    def _get_cell_value_xml(self, cell_reference: str, style: str, value) -> str:
+        style_attribute = f' s="{style}"' if style else ''
 
-        _logger.info(f"completed saving inventory into {_workbook_output_file_path}")
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f'<c r="{cell_reference}"{style_attribute}><v>{value}</v></c>'
 
-        return str(_workbook_output_file_path)
+        text = ILLEGAL_CHARACTERS_RE.sub('', str(value))
+        space_attribute = ' xml:space="preserve"' if text != text.strip() else ''
+
+        return f'<c r="{cell_reference}"{style_attribute} t="inlineStr"><is><t{space_attribute}>{escape(text)}</t></is></c>'
+
+    def _get_row_xml(self, row_number: int, row_columns: List[Tuple[str, str, Optional[int]]], values: tuple) -> str:
+        cells: List[str] = []
+
+        for letter, style, value_index in row_columns:
+            cell_reference = f"{letter}{row_number}"
+
+            if value_index is not None and (value := values[value_index]):
+                cells.append(self._get_cell_value_xml(cell_reference, style, value))
+            elif style:
+                cells.append(f'<c r="{cell_reference}" s="{style}"/>')
+
+        return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+    def _get_row_columns(self, data_row_styles: Dict[str, str], report_layout: ReportLayout) -> List[Tuple[str, str, Optional[int]]]:
+        # Styled template cells without a value keep their style, value_index points into the values of ReportLayout.get_values
+        value_index_by_column: Dict[int, Optional[int]] = { column_index_from_string(letter): None for letter in data_row_styles }
+        value_index_by_column.update((column, value_index) for value_index, column in enumerate(report_layout.column_numbers))
+
+        return [(get_column_letter(column), data_row_styles.get(get_column_letter(column), ''), value_index)
+                for column, value_index in sorted(value_index_by_column.items())]
+
+    def _write_worksheet(self, template_xml: str, output: IO[bytes], inventory: Iterable[InventoryData], report_layout: ReportLayout) -> int:
+        first_row_number = report_layout.first_row_number
+
+        if (sheet_data_start := template_xml.find("<sheetData>")) >= 0:
+            sheet_data_start += len("<sheetData>")
+            sheet_data_end = template_xml.index("</sheetData>")
+        else:
+            # Template worksheet without any rows
+            sheet_data_start = template_xml.index("<sheetData/>")
+            sheet_data_end = sheet_data_start + len("<sheetData/>")
+            template_xml = f"{template_xml[:sheet_data_start]}<sheetData>{template_xml[sheet_data_end:]}"
+            sheet_data_start += len("<sheetData>")
+            sheet_data_end = sheet_data_start
+
+        template_rows = [(int(match.group(1)), match.group(0)) for match in _worksheet_row_pattern.finditer(template_xml, sheet_data_start, sheet_data_end)]
+        data_row_styles = next((dict(_worksheet_cell_style_pattern.findall(row_xml)) for row_number, row_xml in template_rows if row_number >= first_row_number), {})
+        row_columns = self._get_row_columns(data_row_styles, report_layout)
+
+        # The dimension element is optional and its range is not known until every row has been written
+        output.write(_worksheet_dimension_pattern.sub('', template_xml[:sheet_data_start], count=1).encode("utf-8"))
+        output.write("".join(row_xml for row_number, row_xml in template_rows if row_number < first_row_number).encode("utf-8"))
+
+        row_number = first_row_number
+        pending_rows: List[str] = []
+
+        for inventory_row in inventory:
+            pending_rows.append(self._get_row_xml(row_number, row_columns, report_layout.get_values(inventory_row)))
+            row_number += 1
+
+            if len(pending_rows) >= self._rows_per_write:
+                output.write("".join(pending_rows).encode("utf-8"))
+                pending_rows.clear()
+
+        output.write("".join(pending_rows).encode("utf-8"))
+
+        # Keep any pre-formatted template rows beyond the inventory so the worksheet looks the same as with the openpyxl engine
+        output.write("".join(row_xml for template_row_number, row_xml in template_rows if template_row_number >= row_number).encode("utf-8"))
+        output.write(template_xml[sheet_data_end:].encode("utf-8"))
+
+        return row_number - first_row_number
+
+    def execute(self, inventory: Iterable[InventoryData], output: Union[PurePath, IO[bytes], None] = None) -> str:
+        report_output = output or _workbook_output_file_path
+        report_layout = get_report_layout()
+        template_parts = get_report_template(report_layout.template_file_name).parts
+        reportWorksheetName = report_layout.worksheet_name
+
+        _logger.info(f"streaming inventory into worksheet {reportWorksheetName} starting at row {report_layout.first_row_number}")
+
+        worksheet_part_name = self._get_worksheet_part_name({ template_part.filename: part_data for template_part, part_data in template_parts }, reportWorksheetName)
+
+        with ZipFile(report_output, "w", ZIP_DEFLATED) as report:
+            for template_part, part_data in template_parts:
+                if template_part.filename == worksheet_part_name:
+                    with report.open(worksheet_part_name, "w", force_zip64=True) as worksheet_output:
+                        row_count = self._write_worksheet(part_data.decode("utf-8"), worksheet_output, inventory, report_layout)
+                else:
+                    report.writestr(template_part, part_data)
+
+        _logger.info(f"wrote {row_count} rows into worksheet {reportWorksheetName}")
+        _logger.info(f"completed saving inventory into {_get_output_name(report_output)}")
+
+        return _get_output_name(report_output)
+
+def get_create_report_command_handler():
+    if os.environ.get("REPORT_ENGINE", DEFAULT_REPORT_ENGINE).lower() == "streaming":
+        return StreamingCreateReportCommandHandler()
+
+    return CreateReportCommandHandler()
+
+def get_report_formats() -> List[str]:
+    report_formats = list(dict.fromkeys(report_format.strip().lower() for report_format in os.environ.get("REPORT_FORMATS", DEFAULT_REPORT_FORMATS).split(",") if report_format.strip()))
+
+    if unsupported_report_formats := [ report_format for report_format in report_formats if report_format != "xlsx" and report_format not in get_report_writer_names() ]:
+        raise ValueError(f"Unsupported report formats {', '.join(unsupported_report_formats)}, expected xlsx or one of {', '.join(get_report_writer_names())}.")
+
+    return report_formats or [ DEFAULT_REPORT_FORMATS ]
+
+# Writes the inventory in several formats with a single pass over it, so rows are only collected and mapped once. Rows are
+# handed to the workbook as they arrive and pushed to the writers of the other formats in batches. Outputs default to the
+# workbook's output path with the format as extension.
+class MultiFormatCreateReportCommandHandler():
+    def __init__(self, report_formats: Optional[List[str]] = None, create_report_command_handler=None, batch_rows: Optional[int] = None):
+        self._report_formats = report_formats or get_report_formats()
+        self._create_report_command_handler = create_report_command_handler or get_create_report_command_handler()
+        self._batch_rows = batch_rows or int(os.environ.get("REPORT_WRITER_BATCH_ROWS", DEFAULT_REPORT_WRITER_BATCH_ROWS))
+
+    @property
+    def report_formats(self) -> List[str]:
+        return self._report_formats
+
+    def _write_batch(self, report_writers: Dict[str, ReportWriter], rows: List[InventoryData]):
+        for report_format, report_writer in report_writers.items():
+            with get_stage_metrics().timer("WriteReport", Format=report_format):
+                report_writer.write_rows(rows)
+
+    def _iter_and_write(self, inventory: Iterable[InventoryData], report_writers: Dict[str, ReportWriter]) -> Iterator[InventoryData]:
+        rows: List[InventoryData] = []
+
+        for inventory_row in inventory:
+            rows.append(inventory_row)
+
+            if len(rows) >= self._batch_rows:
+                self._write_batch(report_writers, rows)
+                rows = []
+
+            yield inventory_row
+
+        if rows:
+            self._write_batch(report_writers, rows)
+
+    def execute(self, inventory: Iterable[InventoryData], outputs: Optional[Mapping[str, Union[PurePath, IO[bytes]]]] = None) -> Dict[str, str]:
+        report_outputs = { report_format: (outputs or {}).get(report_format) or _workbook_output_file_path.with_suffix(f".{report_format}") for report_format in self._report_formats }
+
+        _logger.info(f"writing inventory as {', '.join(self._report_formats)}")
+
+        with ExitStack() as output_stack:
+            report_writers: Dict[str, ReportWriter] = {}
+
+            for report_format, report_output in report_outputs.items():
+                if report_format == "xlsx":
+                    continue
+
+                if isinstance(report_output, (str, PurePath)):
+                    report_output = output_stack.enter_context(open(report_output, "wb"))
+
+                report_writers[report_format] = get_report_writer(report_format, report_output)
+                output_stack.callback(report_writers[report_format].close)
+
+            inventory_rows = self._iter_and_write(inventory, report_writers)
+
+            if "xlsx" in report_outputs:
+                self._create_report_command_handler.execute(inventory_rows, report_outputs["xlsx"])
+            else:
+                deque(inventory_rows, maxlen=0)
+
+        _logger.info(f"completed saving inventory into {', '.join(_get_output_name(report_output) for report_output in report_outputs.values())}")
+
+        return { report_format: _get_output_name(report_output) for report_format, report_output in report_outputs.items() }
+
+class ReportShard(NamedTuple):
+    name: str
+    path: str
+    rows: int
+
+# Splits the inventory by account, asset type or row count and creates one workbook per shard from the same template with the
+# wrapped create report handler. Shards are created in forked worker processes, which inherit the rows of their shard, so rows
+# are buffered (as tuples) until the inventory has been read. Without fork, e.g. on Windows, shards are created one by one.
+class ShardedCreateReportCommandHandler():
+    def __init__(self, create_report_command_handler=None, shard_by: Optional[str] = None, max_rows: Optional[int] = None, max_workers: Optional[int] = None):
+        self._create_report_command_handler = create_report_command_handler or get_create_report_command_handler()
+        self._shard_by = (shard_by or os.environ.get("REPORT_SHARD_BY", "rows")).lower()
+        self._max_rows = max_rows or int(os.environ.get("REPORT_SHARD_MAX_ROWS", DEFAULT_REPORT_SHARD_MAX_ROWS))
+        self._max_workers = max_workers or int(os.environ.get("REPORT_SHARD_MAX_WORKERS", 0)) or os.cpu_count() or 1
+
+        if self._shard_by not in REPORT_SHARD_KEYS:
+            raise ValueError(f"Unsupported report shard key {self._shard_by}, expected one of {', '.join(REPORT_SHARD_KEYS)}.")
+
+    @property
+    def shard_by(self) -> str:
+        return self._shard_by
+
+    def _get_shard_name(self, inventory_row: InventoryData) -> str:
+        if self._shard_by == "account":
+            return f"account-{inventory_row.account_id or 'unknown'}"
+
+        if self._shard_by == "asset_type":
+            return _shard_name_pattern.sub("-", inventory_row.asset_type or "unknown").strip("-").lower()
+
+        return "inventory"
+
+    def _split(self, inventory: Iterable[InventoryData]) -> List[Tuple[str, List[tuple]]]:
+        parts_by_shard_name: Dict[str, List[List[tuple]]] = {}
+
+        for inventory_row in inventory:
+            parts = parts_by_shard_name.setdefault(self._get_shard_name(inventory_row), [[]])
+
+            if len(parts[-1]) >= self._max_rows:
+                parts.append([])
+
+            parts[-1].append(inventory_row.as_tuple())
+
+        return [ (shard_name if len(parts) == 1 and self._shard_by != "rows" else f"{shard_name}-part-{index:04d}", rows)
+                 for shard_name, parts in parts_by_shard_name.items()
+                 for index, rows in enumerate(parts, start=1) ]
+
+    def _create_shard(self, path: PurePath, rows: List[tuple]):
+        self._create_report_command_handler.execute((InventoryData.from_tuple(row) for row in rows), output=path)
+
+    def _join_shard_process(self, shard_name: str, process: BaseProcess):
+        process.join()
+
+        if process.exitcode != 0:
+            raise RuntimeError(f"Creating report shard {shard_name} failed with exit code {process.exitcode}.")
+
+    def execute(self, inventory: Iterable[InventoryData]) -> List[ReportShard]:
+        shards_dir = PurePath(_workbook_output_file_path.parent, f"{_workbook_output_file_path.stem}-shards")
+        os.makedirs(shards_dir, exist_ok=True)
+
+        split_rows = self._split(inventory)
+        shards = [ ReportShard(name=shard_name, path=str(shards_dir / f"{shard_name}.xlsx"), rows=len(rows)) for shard_name, rows in split_rows ]
+
+        _logger.info(f"creating {len(shards)} report shards by {self._shard_by} with up to {self._max_workers} workers")
+
+        if self._max_workers <= 1 or len(shards) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            for shard, (_, rows) in zip(shards, split_rows):
+                self._create_shard(PurePath(shard.path), rows)
+
+            return shards
+
+        # Metrics recorded by the workers stay in the workers, CreateReport covers the shards as a whole
+        process_context = multiprocessing.get_context("fork")
+        running_processes: Deque[Tuple[str, BaseProcess]] = deque()
+
+        for shard, (_, rows) in zip(shards, split_rows):
+            while len(running_processes) >= self._max_workers:
+                self._join_shard_process(*running_processes.popleft())
+
+            process = process_context.Process(target=self._create_shard, args=(PurePath(shard.path), rows), name=f"report-shard-{shard.name}")
+            process.start()
+            running_processes.append((shard.name, process))
+
+        while running_processes:
+            self._join_shard_process(*running_processes.popleft())
+
+        _logger.info(f"completed creating {len(shards)} report shards into {shards_dir}")
+
+        return shards
+
+# Assets added, removed or changed since the previous run as CSV next to the report. Changed rows carry the current values, the
+# names of the changed attributes and their previous values as a JSON object.
+class CreateDeltaReportCommandHandler():
+    def execute(self, delta: InventoryDelta, output_file_name: Optional[Union[str, PurePath]] = None) -> str:
+        output_file_name = str(output_file_name or _workbook_output_file_path.with_name(f"{_workbook_output_file_path.stem}-delta.csv"))
+
+        _logger.info(f"writing {len(delta.rows)} delta rows against the baseline of {delta.previous_generated} to {output_file_name}")
+
+        with open(output_file_name, "w", newline="", encoding="utf-8") as output, get_stage_metrics().timer("WriteReport", Format="delta"):
+            csv_writer = csv.writer(output)
+            csv_writer.writerow(_delta_report_fields)
+
+            for delta_row in delta.rows:
+                previous_values = json.dumps({ name: getattr(delta_row.previous_row, name) for name in delta_row.changed_fields }, separators=(",", ":")) if delta_row.previous_row else ""
+
+                csv_writer.writerow((delta_row.change, ",".join(delta_row.changed_fields), previous_values, *map(get_text_value, delta_row.row.as_tuple())))
+
+        return output_file_name
 
 class DeliverReportCommandHandler():
-    def __init__(self, s3_client=boto3.client('s3')):
-        self._s3_client = s3_client
+    def __init__(self, s3_client=None):
+        self._s3_client = s3_client or get_client('s3')
+        self._report_time: Optional[datetime] = None
 
-    def execute(self, report_file_name: str) -> str:
+    def _get_report_location(self, suffix: str = ".xlsx") -> Tuple[str, str]:
         target_path = os.environ["REPORT_TARGET_BUCKET_PATH"]
         target_bucket = os.environ["REPORT_TARGET_BUCKET_NAME"]
-        report_s3_key = os.path.join(target_path, f"{_workbook_output_file_path.stem}-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.xlsx")
 
-        _logger.info(f"uploading file '{report_file_name}' to bucket '{target_bucket}' with key '{report_s3_key}'")
+        # Reports delivered by the same handler, e.g. one per format, share their timestamp
+        if self._report_time is None:
+            self._report_time = datetime.now()
+
+        return target_bucket, os.path.join(target_path, f"{_workbook_output_file_path.stem}-{self._report_time.strftime('%Y-%m-%d-%H-%M-%S')}{suffix}")
 
-        object_data = open(report_file_name, "rb")
+    def execute(self, report_file_name: str, suffix: Optional[str] = None) -> str:
+        target_bucket, report_s3_key = self._get_report_location(suffix=suffix or PurePath(report_file_name).suffix or ".xlsx")
 
-        self._s3_client.put_object(Bucket=target_bucket, Key=report_s3_key, Body=object_data)
+        _logger.info(f"uploading file '{report_file_name}' to bucket '{target_bucket}' with key '{report_s3_key}'")
+
+        with open(report_file_name, "rb") as object_data, get_stage_metrics().timer("UploadReport"):
+            self._s3_client.put_object(Bucket=target_bucket, Key=report_s3_key, Body=object_data)
 
         _logger.info(f"completed file upload")
 
-        return f"https://{target_bucket}.s3.amazonaws.com/{report_s3_key}"
\ No newline at end of file
+        return f"https://{target_bucket}.s3.amazonaws.com/{report_s3_key}"
+
+    def execute_streaming(self, write_report: Callable[[IO[bytes]], object]) -> str:
+        # The report is written straight into the upload, without a copy in /tmp
+        target_bucket, report_s3_key = self._get_report_location()
+
+        _logger.info(f"streaming report to bucket '{target_bucket}' with key '{report_s3_key}'")
+
+        # Upload streams are raw binary streams, which the writers use like any other binary file
+        with get_stage_metrics().timer("UploadReport"), S3MultipartUploadStream(self._s3_client, target_bucket, report_s3_key) as report_output:
+            write_report(cast(IO[bytes], report_output))
+
+        _logger.info("completed report upload")
+
+        return f"https://{target_bucket}.s3.amazonaws.com/{report_s3_key}"
+
+    def execute_streaming_formats(self, report_formats: List[str], write_reports: Callable[[Dict[str, IO[bytes]]], object]) -> Dict[str, str]:
+        # One upload per format, all written at the same time from a single pass over the inventory
+        report_locations = { report_format: self._get_report_location(suffix=f".{report_format}") for report_format in report_formats }
+
+        _logger.info(f"streaming {', '.join(report_formats)} reports to bucket '{os.environ['REPORT_TARGET_BUCKET_NAME']}'")
+
+        with get_stage_metrics().timer("UploadReport"), ExitStack() as upload_stack:
+            write_reports({ report_format: cast(IO[bytes], upload_stack.enter_context(S3MultipartUploadStream(self._s3_client, target_bucket, report_s3_key)))
+                            for report_format, (target_bucket, report_s3_key) in report_locations.items() })
+
+        _logger.info("completed report uploads")
+
+        return { report_format: f"https://{target_bucket}.s3.amazonaws.com/{report_s3_key}" for report_format, (target_bucket, report_s3_key) in report_locations.items() }
+
+    def _upload_shard(self, target_bucket: str, shard_s3_key: str, shard: ReportShard):
+        with open(shard.path, "rb") as object_data, get_stage_metrics().timer("UploadReport"):
+            self._s3_client.put_object(Bucket=target_bucket, Key=shard_s3_key, Body=object_data)
+
+        # Shards of a large inventory could otherwise fill up the Lambda's /tmp across invocations
+        os.remove(shard.path)
+
+    def execute_sharded(self, shards: List[ReportShard], shard_by: Optional[str] = None) -> str:
+        # Shards and their manifest share one prefix per run, the manifest is uploaded last so it only lists uploaded shards
+        target_bucket, report_s3_prefix = self._get_report_location(suffix="")
+        shard_s3_keys = [ os.path.join(report_s3_prefix, f"{shard.name}.xlsx") for shard in shards ]
+
+        _logger.info(f"uploading {len(shards)} report shards to bucket '{target_bucket}' with prefix '{report_s3_prefix}'")
+
+        with ThreadPoolExecutor(max_workers=int(os.environ.get("REPORT_UPLOAD_MAX_WORKERS", DEFAULT_UPLOAD_MAX_WORKERS))) as executor:
+            for upload in [ executor.submit(self._upload_shard, target_bucket, shard_s3_key, shard) for shard_s3_key, shard in zip(shard_s3_keys, shards) ]:
+                upload.result()
+
+        manifest_s3_key = os.path.join(report_s3_prefix, "manifest.json")
+        manifest = { "generated": datetime.now().isoformat(timespec="seconds"),
+                     "shardBy": shard_by,
+                     "rows": sum(shard.rows for shard in shards),
+                     "shards": [ { "name": shard.name, "key": shard_s3_key, "url": f"https://{target_bucket}.s3.amazonaws.com/{shard_s3_key}", "rows": shard.rows }
+                                 for shard_s3_key, shard in zip(shard_s3_keys, shards) ] }
+
+        self._s3_client.put_object(Bucket=target_bucket, Key=manifest_s3_key, Body=json.dumps(manifest, indent=2).encode("utf-8"), ContentType="application/json")
+
+        _logger.info("completed upload of report shards and manifest")
+
+        return f"https://{target_bucket}.s3.amazonaws.com/{manifest_s3_key}"
@@ -0,0 +1,120 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+import gzip
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+from botocore.exceptions import ClientError
+from inventory.clients import get_client
+from inventory.mappers import INVENTORY_DATA_FIELDS, InventoryData
+
+_logger = logging.getLogger("inventory.snapshots")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+SNAPSHOT_FORMAT_VERSION = 1
+
+class SnapshotResource(NamedTuple):
+    arn: str
+    capture_time: str
+    rows: List[InventoryData]
+
+class InventorySnapshot():
+    def __init__(self, accounts: Optional[dict] = None, mapping_fingerprint: Optional[str] = None):
+        self._accounts: dict = accounts or {}
+        # Rows are only carried over by runs that map resources the same way as the run that took the snapshot
+        self.mapping_fingerprint = mapping_fingerprint
+
+    def get_watermark(self, account_id: str) -> Optional[str]:
+        return self._accounts.get(account_id, {}).get("watermark")
+
+    def get_resources(self, account_id: str) -> Dict[str, SnapshotResource]:
+        return self._accounts.get(account_id, {}).get("resources", {})
+
+    def set_account(self, account_id: str, watermark: Optional[str], resources: Dict[str, SnapshotResource]):
+        self._accounts[account_id] = { "watermark": watermark, "resources": resources }
+
+    def to_json(self) -> str:
+        return json.dumps({ "version": SNAPSHOT_FORMAT_VERSION,
+                            "mappingFingerprint": self.mapping_fingerprint,
+                            "accounts": { account_id: { "watermark": account["watermark"],
+                                                        "resources": { arn: { "captureTime": resource.capture_time,
+                                                                              "rows": [ { name: value for name, value in zip(INVENTORY_DATA_FIELDS, row.as_tuple()) if value is not None } for row in resource.rows ] }
+                                                                       for arn, resource in account["resources"].items() } }
+                                          for account_id, account in self._accounts.items() } },
+                          separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, snapshot_json: str) -> "InventorySnapshot":
+        snapshot_data = json.loads(snapshot_json)
+
+        if snapshot_data.get("version") != SNAPSHOT_FORMAT_VERSION:
+            _logger.warning(f"ignoring snapshot with unsupported version {snapshot_data.get('version')}")
+
+            return cls()
+
+        return cls({ account_id: { "watermark": account["watermark"],
+                                   "resources": { arn: SnapshotResource(arn=arn, capture_time=resource["captureTime"], rows=[ InventoryData(**row) for row in resource["rows"] ])
+                                                  for arn, resource in account["resources"].items() } }
+                     for account_id, account in snapshot_data["accounts"].items() },
+                   snapshot_data.get("mappingFingerprint"))
+
+# Stores keep any document with to_json and from_json, the inventory snapshot by default
+class LocalSnapshotStore():
+    def __init__(self, path: str, snapshot_class=InventorySnapshot):
+        self._path = Path(path)
+        self._snapshot_class = snapshot_class
+
+    def load(self):
+        if not self._path.exists():
+            _logger.info(f"no snapshot found at {self._path}, starting from an empty snapshot")
+
+            return self._snapshot_class()
+
+        return self._snapshot_class.from_json(gzip.decompress(self._path.read_bytes()).decode("utf-8"))
+
+    def save(self, snapshot):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._path.write_bytes(gzip.compress(snapshot.to_json().encode("utf-8")))
+
+        _logger.info(f"saved snapshot to {self._path}")
+
+class S3SnapshotStore():
+    def __init__(self, bucket: str, key: str, s3_client=None, snapshot_class=InventorySnapshot):
+        self._bucket = bucket
+        self._key = key
+        self._snapshot_class = snapshot_class
+        self._s3_client = s3_client or get_client('s3')
+
+    def load(self):
+        try:
+            snapshot_object = self._s3_client.get_object(Bucket=self._bucket, Key=self._key)
+        except ClientError as ex:
+            error_code = ex.response.get("Error", {}).get("Code")
+
+            # Without s3:ListBucket S3 reports a missing key as AccessDenied, which can't be told apart from a denied snapshot
+            if error_code in ("AccessDenied", "403"):
+                _logger.error(f"access denied to snapshot s3://{self._bucket}/{self._key}, a missing snapshot is only reported as such with s3:ListBucket on the bucket")
+
+            if error_code not in ("NoSuchKey", "404"):
+                raise
+
+            _logger.info(f"no snapshot found at s3://{self._bucket}/{self._key}, starting from an empty snapshot")
+
+            return self._snapshot_class()
+
+        return self._snapshot_class.from_json(gzip.decompress(snapshot_object["Body"].read()).decode("utf-8"))
+
+    def save(self, snapshot):
+        self._s3_client.put_object(Bucket=self._bucket, Key=self._key, Body=gzip.compress(snapshot.to_json().encode("utf-8")))
+
+        _logger.info(f"saved snapshot to s3://{self._bucket}/{self._key}")
+
+def get_snapshot_store(location: str, snapshot_class=InventorySnapshot):
+    if location.startswith("s3://"):
+        bucket, _, key = location[len("s3://"):].partition("/")
+
+        return S3SnapshotStore(bucket, key, snapshot_class=snapshot_class)
+
+    return LocalSnapshotStore(location, snapshot_class=snapshot_class)
@@ -0,0 +1,144 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+from botocore.exceptions import ClientError
+from inventory.instrumentation import get_stage_metrics
+
+_logger = logging.getLogger("inventory.throttling")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DEFAULT_API_RATE_LIMITS = { "SelectResourceConfig": 5.0, "SelectAggregateResourceConfig": 5.0, "AssumeRole": 10.0 }
+DEFAULT_API_MAX_ATTEMPTS = 8
+DEFAULT_API_BACKOFF_BASE_SECONDS = 0.5
+DEFAULT_API_BACKOFF_MAX_SECONDS = 20.0
+RETRYABLE_ERROR_CODES = frozenset([ "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException", "TooManyRequestsException",
+                                    "RequestLimitExceeded", "ServiceUnavailable", "InternalFailure", "InternalError" ])
+T = TypeVar("T")
+
+class TokenBucket():
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._rate = rate
+        self._capacity = capacity or max(1.0, rate)
+        self._tokens = self._capacity
+        self._clock = clock
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # Takes a token even when none is left, so concurrent callers queue up behind each other, and returns how long the
+        # caller has to wait before using it
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            self._tokens -= 1
+
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+class ApiMetrics():
+    __slots__ = ("requests", "retries", "failures", "throttled_seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return { "requests": self.requests, "retries": self.retries, "failures": self.failures, "throttled_seconds": round(self.throttled_seconds, 3) }
+
+# Sits in front of the AWS API calls of the readers. Calls are spread out by a token bucket per API and scope, e.g. the config
+# client of an account and region, since that is what the service limits apply to. Throttling and transient errors are retried
+# with jittered exponential backoff, so that a throttled page is retried with the same NextToken instead of the rest of the
+# account being dropped.
+class RequestScheduler():
+    def __init__(self, rate_limits: Optional[Dict[str, float]] = None, max_attempts: Optional[int] = None,
+                 backoff_base_seconds: Optional[float] = None, backoff_max_seconds: Optional[float] = None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self._rate_limits = { **DEFAULT_API_RATE_LIMITS, **(rate_limits if rate_limits is not None else _get_rate_limits_from_environment()) }
+        self._max_attempts = max_attempts or int(os.environ.get("API_MAX_ATTEMPTS", DEFAULT_API_MAX_ATTEMPTS))
+        self._backoff_base_seconds = backoff_base_seconds or float(os.environ.get("API_BACKOFF_BASE_SECONDS", DEFAULT_API_BACKOFF_BASE_SECONDS))
+        self._backoff_max_seconds = backoff_max_seconds or DEFAULT_API_BACKOFF_MAX_SECONDS
+        self._sleep = sleep
+        self._clock = clock
+        self._buckets: Dict[Tuple[str, Hashable], TokenBucket] = {}
+        self._metrics: Dict[str, ApiMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, api_name: str, scope: Hashable) -> Optional[TokenBucket]:
+        if not (rate := self._rate_limits.get(api_name)):
+            return None
+
+        with self._lock:
+            if (bucket := self._buckets.get((api_name, scope))) is None:
+                bucket = self._buckets[(api_name, scope)] = TokenBucket(rate, clock=self._clock)
+
+            return bucket
+
+    def _get_metrics(self, api_name: str) -> ApiMetrics:
+        with self._lock:
+            return self._metrics.setdefault(api_name, ApiMetrics())
+
+    def _get_backoff_seconds(self, attempt: int) -> float:
+        # Full jitter, see https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+        return random.uniform(0, min(self._backoff_max_seconds, self._backoff_base_seconds * 2 ** attempt))
+
+    def _wait(self, api_name: str, metrics: ApiMetrics, seconds: float):
+        if seconds > 0:
+            self._sleep(seconds)
+
+            with self._lock:
+                metrics.throttled_seconds += seconds
+
+            get_stage_metrics().record("Throttled", seconds, Api=api_name)
+
+    def call(self, api_name: str, fn: Callable[..., T], *args, scope: Hashable = None, **kwargs) -> T:
+        with get_stage_metrics().timer(api_name):
+            return self._call(api_name, fn, *args, scope=scope, **kwargs)
+
+    def _call(self, api_name: str, fn: Callable[..., T], *args, scope: Hashable = None, **kwargs) -> T:
+        bucket = self._get_bucket(api_name, scope)
+        metrics = self._get_metrics(api_name)
+        attempt = 0
+
+        while True:
+            if bucket:
+                self._wait(api_name, metrics, bucket.reserve())
+
+            with self._lock:
+                metrics.requests += 1
+
+            try:
+                return fn(*args, **kwargs)
+            except ClientError as ex:
+                attempt += 1
+
+                if ex.response.get("Error", {}).get("Code") not in RETRYABLE_ERROR_CODES or attempt >= self._max_attempts:
+                    with self._lock:
+                        metrics.failures += 1
+
+                    raise
+
+                backoff_seconds = self._get_backoff_seconds(attempt)
+
+                _logger.warning(f"{api_name} call failed with {ex.response['Error']['Code']}, retrying in {backoff_seconds:.2f} seconds (attempt {attempt} of {self._max_attempts})")
+
+                with self._lock:
+                    metrics.retries += 1
+
+                self._wait(api_name, metrics, backoff_seconds)
+
+    @property
+    def metrics(self) -> Dict[str, dict]:
+        with self._lock:
+            return { api_name: metrics.as_dict() for api_name, metrics in self._metrics.items() }
+
+def _get_rate_limits_from_environment() -> Dict[str, float]:
+    # e.g. { "SelectResourceConfig": 2, "AssumeRole": 5 }, a rate of 0 disables the token bucket of the API
+    return { api_name: float(rate) for api_name, rate in json.loads(os.environ.get("API_RATE_LIMITS", "{}")).items() }
@@ -0,0 +1,134 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import io
+import logging
+import os
+from typing import Deque, List, Optional
+from inventory.instrumentation import get_stage_metrics
+
+_logger = logging.getLogger("inventory.uploads")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+DEFAULT_UPLOAD_PART_SIZE_MB = 8
+DEFAULT_UPLOAD_MAX_WORKERS = 4
+# S3 rejects multipart uploads whose parts, other than the last, are smaller than this
+MIN_UPLOAD_PART_SIZE = 5 * 1024 * 1024
+
+# Write-only stream that uploads its bytes to S3 as they are written. Full parts are uploaded in parallel while the report is
+# still being written, so at most part size times (workers + 1) bytes are held in memory and nothing is written to local disk.
+# Objects smaller than one part are sent with a single put_object. Leaving the context with an exception aborts the upload.
+class S3MultipartUploadStream(io.RawIOBase):
+    def __init__(self, s3_client, bucket: str, key: str, part_size: Optional[int] = None, max_workers: Optional[int] = None):
+        super().__init__()
+        self._s3_client = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(MIN_UPLOAD_PART_SIZE, part_size or int(os.environ.get("REPORT_UPLOAD_PART_SIZE_MB", DEFAULT_UPLOAD_PART_SIZE_MB)) * 1024 * 1024)
+        self._max_workers = max_workers or int(os.environ.get("REPORT_UPLOAD_MAX_WORKERS", DEFAULT_UPLOAD_MAX_WORKERS))
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id: Optional[str] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque[Future] = deque()
+        self._parts: List[dict] = []
+
+    @property
+    def name(self) -> str:
+        return f"s3://{self._bucket}/{self._key}"
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def _upload_part(self, part_number: int, data: bytes) -> dict:
+        with get_stage_metrics().timer("UploadPart"):
+            response = self._s3_client.upload_part(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id, PartNumber=part_number, Body=data)
+
+        return { "PartNumber": part_number, "ETag": response["ETag"] }
+
+    def _submit_part(self, data: bytes):
+        if self._upload_id is None:
+            self._upload_id = self._s3_client.create_multipart_upload(Bucket=self._bucket, Key=self._key)["UploadId"]
+
+            _logger.info(f"started multipart upload to {self.name}")
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+
+        # Waiting for the oldest part keeps the number of parts held in memory bounded
+        while len(self._pending) >= self._max_workers:
+            self._parts.append(self._pending.popleft().result())
+
+        self._pending.append(self._executor.submit(self._upload_part, len(self._parts) + len(self._pending) + 1, data))
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed upload stream")
+
+        self._buffer += data
+        self._position += len(data)
+
+        while len(self._buffer) >= self._part_size:
+            self._submit_part(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            if self._upload_id is None:
+                with get_stage_metrics().timer("UploadPart"):
+                    self._s3_client.put_object(Bucket=self._bucket, Key=self._key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+
+                while self._pending:
+                    self._parts.append(self._pending.popleft().result())
+
+                self._s3_client.complete_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id, MultipartUpload={ "Parts": self._parts })
+
+                _logger.info(f"completed multipart upload of {len(self._parts)} parts to {self.name}")
+        except Exception:
+            self.abort()
+
+            raise
+        finally:
+            self._buffer = bytearray()
+
+            if self._executor:
+                self._executor.shutdown(wait=True)
+
+            super().close()
+
+    def abort(self):
+        # Parts still being uploaded have to finish first, otherwise they could recreate storage after the abort
+        for future in self._pending:
+            future.cancel()
+
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+        if self._upload_id is not None:
+            _logger.warning(f"aborting multipart upload to {self.name}")
+
+            self._s3_client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+            self._upload_id = None
+
+        self._pending.clear()
+        self._buffer = bytearray()
+
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,102 @@
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# License:
+# This sample code is made available under the MIT-0 license. See the LICENSE file.
+from abc import ABC, abstractmethod
+import csv
+import io
+import json
+import logging
+import os
+from typing import Dict, IO, List, Optional, Type
+from inventory.mappers import INVENTORY_DATA_FIELDS, InventoryBatch, InventoryData
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+_logger = logging.getLogger("inventory.writers")
+_logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
+_tags_index = INVENTORY_DATA_FIELDS.index("tags")
+
+def get_text_value(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+
+    # The tags of a row are written as a JSON object in formats without nested values
+    return json.dumps(value, separators=(",", ":")) if isinstance(value, dict) else str(value)
+
+# Writers for the machine readable report formats. Rows are pushed to writers in batches, so several writers can be fed from a
+# single pass over the inventory. Writers write into a binary stream they do not own, close() flushes without closing it.
+class ReportWriter(ABC):
+    def __init__(self, output: IO[bytes]):
+        self._output = output
+
+    @abstractmethod
+    def write_rows(self, rows: List[InventoryData]):
+        pass
+
+    def close(self):
+        pass
+
+class CsvReportWriter(ReportWriter):
+    def __init__(self, output: IO[bytes]):
+        super().__init__(output)
+        self._text_output = io.TextIOWrapper(output, encoding="utf-8", newline="", write_through=True)
+        self._csv_writer = csv.writer(self._text_output)
+        self._csv_writer.writerow(INVENTORY_DATA_FIELDS)
+
+    def write_rows(self, rows: List[InventoryData]):
+        self._csv_writer.writerows(map(self._get_values, rows))
+
+    @staticmethod
+    def _get_values(row: InventoryData) -> tuple:
+        values = row.as_tuple()
+
+        if values[_tags_index] is None:
+            return values
+
+        return (*values[:_tags_index], get_text_value(values[_tags_index]), *values[_tags_index + 1:])
+
+    def close(self):
+        self._text_output.flush()
+        self._text_output.detach()
+
+class JsonLinesReportWriter(ReportWriter):
+    def write_rows(self, rows: List[InventoryData]):
+        self._output.write("".join(f"{json.dumps(dict(zip(INVENTORY_DATA_FIELDS, row.as_tuple())), separators=(',', ':'))}\n" for row in rows).encode("utf-8"))
+
+class ParquetReportWriter(ReportWriter):
+    def __init__(self, output: IO[bytes]):
+        if pyarrow is None:
+            raise ImportError("pyarrow is not installed")
+
+        super().__init__(output)
+        # Every attribute is text in the report, values of other types from custom mappers are written as text as well
+        self._schema = pyarrow.schema([ (name, pyarrow.string()) for name in INVENTORY_DATA_FIELDS ])
+        self._parquet_writer = pyarrow.parquet.ParquetWriter(output, self._schema)
+
+    def write_rows(self, rows: List[InventoryData]):
+        batch = InventoryBatch(rows)
+        columns = { name: [ get_text_value(value) for value in batch.column(name) ] for name in INVENTORY_DATA_FIELDS }
+
+        # Each batch becomes one row group
+        self._parquet_writer.write_table(pyarrow.Table.from_pydict(columns, schema=self._schema))
+
+    def close(self):
+        self._parquet_writer.close()
+
+_report_writers: Dict[str, Type[ReportWriter]] = { "csv": CsvReportWriter, "jsonl": JsonLinesReportWriter, "parquet": ParquetReportWriter }
+
+def register_report_writer(name: str, writer_class: Type[ReportWriter]) -> None:
+    _report_writers[name] = writer_class
+
+def get_report_writer_names() -> List[str]:
+    return list(_report_writers)
+
+def get_report_writer(name: str, output: IO[bytes]) -> ReportWriter:
+    if name not in _report_writers:
+        raise ValueError(f"Unsupported report format {name}, expected xlsx or one of {', '.join(_report_writers)}.")
+
+    return _report_writers[name](output)
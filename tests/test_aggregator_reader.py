@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import json
+import os
+from unittest.mock import MagicMock, Mock, patch, ANY
+import boto3
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+from callee import String, Contains
+import pytest
+from inventory.mappers import DynamoDbTableDataMapper, RdsDataMapper
+from inventory.readers import AwsConfigAggregatorInventoryReader
+
+_expected_expression = "SELECT arn, resourceType, configuration, tags, accountId, awsRegion WHERE resourceType IN ('AWS::DynamoDB::Table', 'AWS::RDS::DBInstance') " \
+                       "AND accountId IN ('210987654321', '123456789012')"
+
+def setup_function():
+    os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321" }, { "name": "bar", "id": "123456789012" } ]'
+
+@pytest.fixture()
+def dynamo_table():
+    with open(os.path.join(os.path.dirname(__file__), "sample_config_query_results/sample_dynamo_table.json")) as file_data:
+        return json.load(file_data)
+
+@pytest.fixture()
+def config_client():
+    return boto3.client("config", region_name="us-east-1", aws_access_key_id="testing", aws_secret_access_key="testing")
+
+def test_given_aggregator_then_all_pages_are_mapped_without_assuming_roles(config_client, dynamo_table):
+    mock_sts_client = Mock()
+    second_table = dict(dynamo_table, arn=f"{dynamo_table['arn']}-2")
+
+    with Stubber(config_client) as stubber:
+        stubber.add_response("select_aggregate_resource_config",
+                             { "Results": [ json.dumps(dynamo_table) ], "NextToken": "nextpage" },
+                             { "Expression": _expected_expression, "ConfigurationAggregatorName": "organization", "NextToken": "" })
+        stubber.add_response("select_aggregate_resource_config",
+                             { "Results": [ json.dumps(second_table) ] },
+                             { "Expression": _expected_expression, "ConfigurationAggregatorName": "organization", "NextToken": "nextpage" })
+
+        reader = AwsConfigAggregatorInventoryReader(lambda_context=MagicMock(), aggregator_name="organization", config_client=config_client,
+                                                    sts_client=mock_sts_client, mappers=[DynamoDbTableDataMapper(), RdsDataMapper()])
+
+        all_inventory = reader.get_resources_from_all_accounts()
+
+        stubber.assert_no_pending_responses()
+
+    assert [ row.unique_id for row in all_inventory ] == [ dynamo_table["arn"], second_table["arn"] ]
+    mock_sts_client.assume_role.assert_not_called()
+
+def test_given_long_account_list_then_accounts_are_split_over_expressions_within_the_length_limit():
+    account_ids = [ f"{index:012d}" for index in range(1000) ]
+    mock_config_client = Mock()
+    mock_config_client.select_aggregate_resource_config.return_value = { "Results": [] }
+
+    reader = AwsConfigAggregatorInventoryReader(lambda_context=MagicMock(), aggregator_name="organization", config_client=mock_config_client,
+                                                sts_client=Mock(), mappers=[DynamoDbTableDataMapper(), RdsDataMapper()],
+                                                accounts=[ { "name": account_id, "id": account_id } for account_id in account_ids ])
+
+    assert reader.get_resources_from_all_accounts() == []
+
+    expressions = [ call.kwargs["Expression"] for call in mock_config_client.select_aggregate_resource_config.call_args_list ]
+
+    assert len(expressions) > 1
+    assert all(len(expression) <= 4096 for expression in expressions)
+    assert "".join(expressions).count("'0000000") == len(account_ids)
+    assert all(f"'{account_id}'" in "".join(expressions) for account_id in account_ids)
+
+@patch("inventory.readers._logger", autospec=True)
+def test_given_error_from_aggregator_then_error_is_logged_and_raised(mock_logger, config_client):
+    with Stubber(config_client) as stubber:
+        stubber.add_client_error("select_aggregate_resource_config", service_error_code="NoSuchConfigurationAggregatorException")
+
+        reader = AwsConfigAggregatorInventoryReader(lambda_context=MagicMock(), aggregator_name="organization", config_client=config_client,
+                                                    sts_client=Mock(), mappers=[DynamoDbTableDataMapper(), RdsDataMapper()])
+
+        with pytest.raises(ClientError):
+            reader.get_resources_from_all_accounts()
+
+    mock_logger.error.assert_called_with(String() & Contains("aggregator"), ANY, "organization", exc_info=True)
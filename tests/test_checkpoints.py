@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import json
+import os
+from unittest.mock import MagicMock, Mock, patch
+import pytest
+from inventory.checkpoints import CheckpointDeadlineReached, InventoryCheckpoint, RegionProgress
+from inventory.handler import lambda_handler
+from inventory.mappers import DataMapper, InventoryData
+from inventory.readers import CheckpointingAwsConfigInventoryReader
+from inventory.throttling import RequestScheduler
+
+def setup_function():
+    os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321"} ]'
+    os.environ["CROSS_ACCOUNT_ROLE_NAME"] = "foobar"
+    os.environ["AWS_REGION"] = "us-east-1"
+    os.environ["CHECKPOINT_MARGIN_SECONDS"] = "60"
+    os.environ.pop("INVENTORY_REGIONS", None)
+    os.environ.pop("CONFIG_SELECT_PROJECTION", None)
+    os.environ.pop("CONFIG_AGGREGATOR_NAME", None)
+    os.environ.pop("INVENTORY_SNAPSHOT_LOCATION", None)
+
+class InMemoryCheckpointStore():
+    def __init__(self, checkpoint_json=None):
+        self.checkpoint_json = checkpoint_json
+
+    def load(self) -> InventoryCheckpoint:
+        return InventoryCheckpoint.from_json(self.checkpoint_json) if self.checkpoint_json else InventoryCheckpoint()
+
+    def save(self, checkpoint: InventoryCheckpoint):
+        self.checkpoint_json = checkpoint.to_json()
+
+def _create_mapper() -> DataMapper:
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ InventoryData(unique_id=resource["id"]) ]
+
+    return mock_mapper
+
+def _create_reader(lambda_context, checkpoint_store, mock_select_resource_config) -> CheckpointingAwsConfigInventoryReader:
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = CheckpointingAwsConfigInventoryReader(lambda_context=lambda_context, checkpoint_store=checkpoint_store, sts_client=Mock(), mappers=[_create_mapper()],
+                                                   request_scheduler=RequestScheduler(sleep=Mock()))
+    reader._get_config_client = mock_config_client_factory
+
+    return reader
+
+def test_given_lambda_close_to_timeout_then_progress_is_saved_and_next_invocation_resumes_from_next_token():
+    checkpoint_store = InMemoryCheckpointStore()
+    lambda_context = MagicMock()
+    lambda_context.get_remaining_time_in_millis.side_effect = [ 300000, 30000 ]
+    first_select_resource_config = Mock(return_value={ "NextToken": "nextpage", "Results": [ json.dumps({ "resourceType": "foobar", "id": "first" }) ] })
+
+    with pytest.raises(CheckpointDeadlineReached):
+        _create_reader(lambda_context, checkpoint_store, first_select_resource_config).get_resources_from_all_accounts()
+
+    assert len(first_select_resource_config.mock_calls) == 1, "no page should be retrieved once the deadline is reached"
+    assert checkpoint_store.load().get_region("210987654321:us-east-1").next_token == "nextpage"
+
+    lambda_context.get_remaining_time_in_millis.side_effect = None
+    lambda_context.get_remaining_time_in_millis.return_value = 900000
+    second_select_resource_config = Mock(return_value={ "Results": [ json.dumps({ "resourceType": "foobar", "id": "second" }) ] })
+
+    second_reader = _create_reader(lambda_context, checkpoint_store, second_select_resource_config)
+    all_inventory = second_reader.get_resources_from_all_accounts()
+
+    assert [ row.unique_id for row in all_inventory ] == [ "first", "second" ]
+    assert second_select_resource_config.call_args.kwargs["NextToken"] == "nextpage", "collection should resume from the saved NextToken"
+    assert checkpoint_store.load().completed_regions == 1, "checkpoint should be kept until the report is delivered"
+
+    second_reader.complete()
+
+    assert len(checkpoint_store.load()) == 0, "checkpoint should be cleared once the report is delivered"
+
+def test_given_too_little_time_left_for_the_report_then_collection_stops_with_every_region_complete():
+    os.environ["CHECKPOINT_REPORT_ROWS_PER_SECOND"] = "1"
+    checkpoint_store = InMemoryCheckpointStore()
+    lambda_context = MagicMock(**{ "get_remaining_time_in_millis.return_value": 61500 })
+    mock_select_resource_config = Mock(return_value={ "Results": [ json.dumps({ "resourceType": "foobar", "id": f"row-{index}" }) for index in range(2) ] })
+
+    try:
+        with pytest.raises(CheckpointDeadlineReached):
+            _create_reader(lambda_context, checkpoint_store, mock_select_resource_config).get_resources_from_all_accounts()
+
+        assert checkpoint_store.load().completed_regions == 1, "collected regions should be kept for the next invocation"
+
+        resumed_inventory = _create_reader(lambda_context, checkpoint_store, mock_select_resource_config).get_resources_from_all_accounts()
+    finally:
+        os.environ.pop("CHECKPOINT_REPORT_ROWS_PER_SECOND")
+
+    assert [ row.unique_id for row in resumed_inventory ] == [ "row-0", "row-1" ], "a resumed run with every region complete should go on to the report"
+    assert len(mock_select_resource_config.mock_calls) == 1
+
+def test_given_account_complete_in_checkpoint_then_it_is_not_read_again():
+    checkpoint = InventoryCheckpoint({ "210987654321:us-east-1": RegionProgress(rows=[ InventoryData(unique_id="done") ], complete=True) })
+    checkpoint_store = InMemoryCheckpointStore(checkpoint.to_json())
+    mock_select_resource_config = Mock()
+    reader = _create_reader(MagicMock(**{ "get_remaining_time_in_millis.return_value": 900000 }), checkpoint_store, mock_select_resource_config)
+    reader._assume_role = Mock()
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ row.unique_id for row in all_inventory ] == [ "done" ]
+    reader._assume_role.assert_not_called()
+    mock_select_resource_config.assert_not_called()
+
+def test_given_checkpoint_then_json_round_trip_keeps_progress():
+    checkpoint = InventoryCheckpoint({ "210987654321:us-east-1": RegionProgress(rows=[ InventoryData(unique_id="foo", ip_address="10.0.0.1") ], complete=False,
+                                                                                expression="SELECT arn", next_token="nextpage") })
+
+    restored_progress = InventoryCheckpoint.from_json(checkpoint.to_json()).get_region("210987654321:us-east-1")
+
+    assert restored_progress == checkpoint.get_region("210987654321:us-east-1")
+
+@patch("inventory.handler.get_client")
+@patch("inventory.handler.CheckpointingAwsConfigInventoryReader")
+def test_given_deadline_reached_then_handler_invokes_continuation(mock_reader_class, mock_get_client):
+    os.environ["CHECKPOINT_LOCATION"] = "/tmp/checkpoint.json.gz"
+    mock_reader_class.return_value.get_resources_from_all_accounts.side_effect = CheckpointDeadlineReached()
+    lambda_context = MagicMock(invoked_function_arn="arn:aws:lambda:us-east-1:123456789012:function:InventoryCollector")
+
+    try:
+        result = lambda_handler({ "continuation": 2 }, lambda_context)
+    finally:
+        os.environ.pop("CHECKPOINT_LOCATION")
+
+    assert result["statusCode"] == 202
+    assert "stages" in result["body"]["metrics"], "response should include the stage metrics summary"
+    mock_get_client.return_value.invoke.assert_called_once_with(FunctionName="arn:aws:lambda:us-east-1:123456789012:function:InventoryCollector",
+                                                                InvocationType="Event", Payload=json.dumps({ "continuation": 3 }))
+
+@patch("inventory.handler.DeliverReportCommandHandler")
+@patch("inventory.handler.get_create_report_command_handler")
+@patch("inventory.handler.CheckpointingAwsConfigInventoryReader")
+def test_given_checkpointing_then_checkpoint_is_only_cleared_once_the_report_is_delivered(mock_reader_class, mock_get_create_report_command_handler, mock_deliver_report_command_handler):
+    os.environ["CHECKPOINT_LOCATION"] = "/tmp/checkpoint.json.gz"
+    mock_reader_class.return_value.get_resources_from_all_accounts.return_value = [ InventoryData(unique_id="foo") ]
+    mock_get_create_report_command_handler.return_value.execute.return_value = "/tmp/report.xlsx"
+    mock_deliver_report_command_handler.return_value.execute.side_effect = RuntimeError("upload failed")
+
+    try:
+        with pytest.raises(RuntimeError):
+            lambda_handler({}, MagicMock())
+
+        mock_reader_class.return_value.complete.assert_not_called()
+
+        mock_deliver_report_command_handler.return_value.execute.side_effect = None
+        lambda_handler({}, MagicMock())
+    finally:
+        os.environ.pop("CHECKPOINT_LOCATION")
+
+    mock_reader_class.return_value.complete.assert_called_once_with()
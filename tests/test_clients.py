@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+import pytest
+from inventory.clients import assume_role, clear_cache, get_client
+
+def setup_function():
+    clear_cache()
+
+def _get_sts_response(access_key_id: str, expires_in: timedelta) -> dict:
+    return { "Credentials": { "AccessKeyId": access_key_id, "SecretAccessKey": "secret", "SessionToken": "token",
+                              "Expiration": datetime.now(timezone.utc) + expires_in } }
+
+def test_given_same_service_and_region_then_client_is_reused():
+    assert get_client("config", region_name="us-east-1") is get_client("config", region_name="us-east-1")
+    assert get_client("config", region_name="us-east-1") is not get_client("config", region_name="us-west-2")
+
+def test_given_different_credentials_then_separate_clients_are_created():
+    first_credentials = _get_sts_response("first", timedelta(hours=1))["Credentials"]
+    second_credentials = _get_sts_response("second", timedelta(hours=1))["Credentials"]
+
+    first_client = get_client("config", region_name="us-east-1", credentials=first_credentials)
+
+    assert get_client("config", region_name="us-east-1", credentials=first_credentials) is first_client
+    assert get_client("config", region_name="us-east-1", credentials=second_credentials) is not first_client
+
+def test_given_credentials_close_to_expiry_then_client_is_created_again():
+    credentials = _get_sts_response("expiring", timedelta(minutes=1))["Credentials"]
+
+    first_client = get_client("config", region_name="us-east-1", credentials=credentials)
+
+    assert get_client("config", region_name="us-east-1", credentials=credentials) is not first_client, "client must not be reused within the expiry margin"
+
+def test_given_role_assumed_before_then_cached_credentials_are_used_until_expiry_margin():
+    mock_sts_client = Mock()
+    mock_sts_client.assume_role.return_value = _get_sts_response("cached", timedelta(hours=1))
+
+    first_response = assume_role(mock_sts_client, RoleArn="arn:aws:iam::210987654321:role/foobar", RoleSessionName="session")
+    second_response = assume_role(mock_sts_client, RoleArn="arn:aws:iam::210987654321:role/foobar", RoleSessionName="session")
+    assume_role(mock_sts_client, RoleArn="arn:aws:iam::123456789012:role/foobar", RoleSessionName="session")
+
+    assert first_response is second_response
+    assert len(mock_sts_client.assume_role.mock_calls) == 2, "role should only be assumed once per role ARN"
+
+def test_given_cached_credentials_within_expiry_margin_then_role_is_assumed_again():
+    mock_sts_client = Mock()
+    mock_sts_client.assume_role.side_effect = [ _get_sts_response("expiring", timedelta(minutes=1)), _get_sts_response("fresh", timedelta(hours=1)) ]
+
+    assume_role(mock_sts_client, RoleArn="arn:aws:iam::210987654321:role/foobar", RoleSessionName="session")
+    sts_response = assume_role(mock_sts_client, RoleArn="arn:aws:iam::210987654321:role/foobar", RoleSessionName="session")
+
+    assert sts_response["Credentials"]["AccessKeyId"] == "fresh"
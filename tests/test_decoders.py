@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import json
+import os
+from unittest.mock import patch
+import pytest
+from inventory.decoders import OrjsonJsonDecoder, StdlibJsonDecoder, get_json_decoder
+
+def setup_function():
+    os.environ.pop("INVENTORY_JSON_DECODER", None)
+
+@pytest.fixture()
+def raw_page():
+    with open(os.path.join(os.path.dirname(__file__), "sample_config_query_results/sample.json")) as file_data:
+        return [ json.dumps(resource) for resource in json.load(file_data) ]
+
+def test_given_page_of_results_then_batch_decoding_matches_decoding_each_result(raw_page):
+    decoder = StdlibJsonDecoder()
+
+    assert decoder.decode_page(raw_page) == [ json.loads(raw_resource) for raw_resource in raw_page ]
+    assert decoder.decode_page([]) == []
+
+def test_given_orjson_is_installed_then_it_is_used_by_default_and_decodes_like_stdlib(raw_page):
+    pytest.importorskip("orjson")
+
+    decoder = get_json_decoder()
+
+    assert isinstance(decoder, OrjsonJsonDecoder)
+    assert decoder.decode_page(raw_page) == [ json.loads(raw_resource) for raw_resource in raw_page ]
+    assert decoder.decode(raw_page[0]) == json.loads(raw_page[0])
+
+def test_given_orjson_is_not_installed_then_auto_falls_back_to_stdlib():
+    with patch("inventory.decoders.orjson_loads", None):
+        assert isinstance(get_json_decoder(), StdlibJsonDecoder)
+
+        os.environ["INVENTORY_JSON_DECODER"] = "orjson"
+
+        assert isinstance(get_json_decoder(), StdlibJsonDecoder), "explicitly requested decoder that cannot be imported should fall back to stdlib"
+
+def test_given_unknown_decoder_name_then_stdlib_decoder_is_used():
+    os.environ["INVENTORY_JSON_DECODER"] = "foobar"
+
+    assert isinstance(get_json_decoder(), StdlibJsonDecoder)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import csv
+import json
+import os
+from unittest.mock import MagicMock, patch
+import pytest
+from inventory.deltas import InventoryBaseline, InventoryDeltaTracker, compute_inventory_delta
+from inventory.handler import lambda_handler
+from inventory.mappers import InventoryData
+from inventory.reports import CreateDeltaReportCommandHandler
+from inventory.snapshots import get_snapshot_store
+
+def _get_baseline(rows, generated="2026-09-18T00:00:00"):
+    baseline = InventoryBaseline(generated=generated)
+
+    for row in rows:
+        baseline.add(row)
+
+    return baseline
+
+def test_given_two_runs_then_added_removed_and_changed_rows_are_keyed_by_unique_id_and_ip_address():
+    previous = _get_baseline([ InventoryData(unique_id="i-0", ip_address="10.0.0.1", owner="a"), InventoryData(unique_id="i-0", ip_address="10.0.0.2", owner="a"),
+                               InventoryData(unique_id="db-0", hardware_model="db.t3.micro") ])
+    current = _get_baseline([ InventoryData(unique_id="i-0", ip_address="10.0.0.1", owner="b"), InventoryData(unique_id="db-0", hardware_model="db.t3.micro"),
+                              InventoryData(unique_id="i-1", ip_address="10.0.0.3") ])
+
+    delta = compute_inventory_delta(current, previous)
+
+    assert [ (delta_row.change, delta_row.row.unique_id, delta_row.row.ip_address) for delta_row in delta.rows ] == [ ("changed", "i-0", "10.0.0.1"), ("added", "i-1", "10.0.0.3"),
+                                                                                                                      ("removed", "i-0", "10.0.0.2") ]
+    assert delta.rows[0].changed_fields == ("owner",) and delta.rows[0].previous_row.owner == "a"
+    assert delta.counts == { "added": 1, "removed": 1, "changed": 1 }
+
+def test_given_baseline_stored_before_a_field_was_added_then_rows_are_not_reported_as_changed():
+    current = _get_baseline([ InventoryData(unique_id="i-0", ip_address="10.0.0.1") ])
+    previous = InventoryBaseline.from_json(json.dumps({ "version": 1, "generated": "2026-09-18T00:00:00", "rows": [ list(values[:-1]) for values in current.rows.values() ] }))
+
+    assert compute_inventory_delta(current, previous).rows == []
+
+def test_given_saved_baseline_then_it_is_loaded_with_the_same_rows(tmp_path):
+    baseline = _get_baseline([ InventoryData(unique_id="i-0", ip_address="10.0.0.1", tags={ "environment": "prod" }) ])
+    baseline_store = get_snapshot_store(str(tmp_path / "baseline.json.gz"), snapshot_class=InventoryBaseline)
+
+    baseline_store.save(baseline)
+    loaded_baseline = baseline_store.load()
+
+    assert loaded_baseline.generated == baseline.generated
+    assert loaded_baseline.rows == baseline.rows
+
+def test_given_streamed_inventory_then_tracker_passes_rows_through_and_only_reports_a_delta_once_a_baseline_exists(tmp_path):
+    baseline_store = get_snapshot_store(str(tmp_path / "baseline.json.gz"), snapshot_class=InventoryBaseline)
+    first_tracker = InventoryDeltaTracker(baseline_store)
+
+    assert list(first_tracker.track(iter([ InventoryData(unique_id="i-0") ]))) == [ InventoryData(unique_id="i-0") ]
+    assert first_tracker.compute_delta() is None, "the first run has nothing to compare with"
+
+    first_tracker.save_baseline()
+
+    second_tracker = InventoryDeltaTracker(baseline_store)
+    second_tracker.track([ InventoryData(unique_id="i-1") ])
+
+    assert second_tracker.compute_delta().counts == { "added": 1, "removed": 1, "changed": 0 }
+    assert list(baseline_store.load().rows) == [ ("i-0", None) ], "the baseline should only be replaced once the delta is delivered"
+
+    second_tracker.save_baseline()
+
+    assert list(baseline_store.load().rows) == [ ("i-1", None) ], "the baseline should be replaced by the latest run"
+
+def test_given_delta_then_csv_has_change_changed_fields_and_previous_values(tmp_path):
+    previous = _get_baseline([ InventoryData(unique_id="i-0", ip_address="10.0.0.1", owner="a") ])
+    current = _get_baseline([ InventoryData(unique_id="i-0", ip_address="10.0.0.1", owner="b") ])
+
+    delta_report_path = CreateDeltaReportCommandHandler().execute(compute_inventory_delta(current, previous), tmp_path / "delta.csv")
+
+    with open(delta_report_path, newline="") as delta_report:
+        rows = list(csv.DictReader(delta_report))
+
+    assert [ (row["change"], row["changed_fields"], row["previous_values"], row["unique_id"], row["owner"]) for row in rows ] == [ ("changed", "owner", '{"owner":"a"}', "i-0", "b") ]
+
+@patch("inventory.handler.DeliverReportCommandHandler")
+@patch("inventory.handler.get_create_report_command_handler")
+@patch("inventory.handler.AwsConfigInventoryReader")
+def test_given_delta_baseline_location_then_delta_report_is_delivered_from_the_second_run(mock_reader, mock_get_create_report_command_handler, mock_deliver_report_command_handler, tmp_path):
+    mock_get_create_report_command_handler.return_value.execute.side_effect = lambda inventory: list(inventory) and "/tmp/report.xlsx"
+    mock_deliver_report_command_handler.return_value.execute.side_effect = lambda report_path, suffix=None: f"https://bucket.s3.amazonaws.com/report{suffix or '.xlsx'}"
+
+    with patch.dict(os.environ, { "DELTA_BASELINE_LOCATION": str(tmp_path / "baseline.json.gz") }):
+        mock_reader.return_value.get_resources_from_all_accounts.return_value = [ InventoryData(unique_id="i-0"), InventoryData(unique_id="i-1") ]
+        first_result = lambda_handler({}, MagicMock())
+
+        mock_reader.return_value.get_resources_from_all_accounts.return_value = [ InventoryData(unique_id="i-1"), InventoryData(unique_id="i-2") ]
+
+        with patch("inventory.reports._workbook_output_file_path", tmp_path / "report.xlsx"):
+            second_result = lambda_handler({}, MagicMock())
+
+    assert "delta" not in first_result["body"]["report"]
+    assert second_result["body"]["report"]["delta"] == { "url": "https://bucket.s3.amazonaws.com/report-delta.csv", "added": 1, "removed": 1, "changed": 0 }
+
+@patch("inventory.handler.DeliverReportCommandHandler")
+@patch("inventory.handler.get_create_report_command_handler")
+@patch("inventory.handler.AwsConfigInventoryReader")
+def test_given_delta_upload_fails_then_baseline_is_kept_for_the_next_run(mock_reader, mock_get_create_report_command_handler, mock_deliver_report_command_handler, tmp_path):
+    baseline_store = get_snapshot_store(str(tmp_path / "baseline.json.gz"), snapshot_class=InventoryBaseline)
+    baseline_store.save(_get_baseline([ InventoryData(unique_id="i-0") ]))
+    mock_reader.return_value.get_resources_from_all_accounts.return_value = [ InventoryData(unique_id="i-1") ]
+    mock_get_create_report_command_handler.return_value.execute.return_value = "/tmp/report.xlsx"
+
+    def deliver_report(report_path, suffix=None):
+        if suffix == "-delta.csv":
+            raise RuntimeError("upload failed")
+
+        return "https://bucket.s3.amazonaws.com/report.xlsx"
+
+    mock_deliver_report_command_handler.return_value.execute.side_effect = deliver_report
+
+    with patch.dict(os.environ, { "DELTA_BASELINE_LOCATION": str(tmp_path / "baseline.json.gz") }), patch("inventory.reports._workbook_output_file_path", tmp_path / "report.xlsx"):
+        with pytest.raises(RuntimeError):
+            lambda_handler({}, MagicMock())
+
+    assert list(baseline_store.load().rows) == [ ("i-0", None) ]
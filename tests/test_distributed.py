@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import io
+import json
+import os
+from unittest.mock import MagicMock, Mock, patch
+import pytest
+from inventory.distributed import DistributedInventoryReader, InProcessInvoker, LambdaInvoker, PartialInventory, split_accounts
+from inventory.handler import handle_worker_event, lambda_handler
+from inventory.mappers import InventoryData
+from inventory.snapshots import get_snapshot_store
+
+_accounts = [ { "name": f"account-{index}", "id": f"{100000000000 + index}" } for index in range(5) ]
+
+def setup_function():
+    os.environ["ACCOUNT_LIST"] = json.dumps(_accounts)
+    os.environ["CROSS_ACCOUNT_ROLE_NAME"] = "foobar"
+    os.environ["AWS_REGION"] = "us-east-1"
+    os.environ.pop("DISTRIBUTED_PARTIALS_LOCATION", None)
+    os.environ.pop("CONFIG_AGGREGATOR_NAME", None)
+    os.environ.pop("INVENTORY_SNAPSHOT_LOCATION", None)
+
+class StubWorkerReader():
+    # Stands in for AwsConfigInventoryReader in the workers, one row per account
+    def __init__(self, lambda_context, accounts):
+        self._accounts = accounts
+
+    def get_resources_from_all_accounts(self):
+        return [ InventoryData(unique_id=f"i-{account['id']}", account_id=account["id"]) for account in self._accounts ]
+
+def test_given_accounts_then_they_are_split_into_batches_in_order():
+    assert split_accounts(_accounts, 2) == [ _accounts[0:2], _accounts[2:4], _accounts[4:5] ]
+
+def test_given_partial_inventory_then_rows_survive_a_round_trip():
+    partial_inventory = PartialInventory([ InventoryData(unique_id="i-0", account_id="123456789012"), InventoryData(unique_id="i-1") ])
+
+    assert PartialInventory.from_json(partial_inventory.to_json()).rows == partial_inventory.rows
+
+@patch("inventory.handler.AwsConfigInventoryReader", StubWorkerReader)
+def test_given_in_process_workers_then_partial_files_are_merged_in_account_order(tmp_path):
+    reader = DistributedInventoryReader(InProcessInvoker(handle_worker_event), str(tmp_path), accounts_per_worker=2, max_workers=3)
+
+    inventory = reader.get_resources_from_all_accounts()
+
+    assert [ row.account_id for row in inventory ] == [ account["id"] for account in _accounts ]
+    assert len(list(tmp_path.glob("*/batch-*.json.gz"))) == 3, "every worker should write its own partial file"
+    assert reader.failed_batches == []
+
+@patch("inventory.handler.AwsConfigInventoryReader", StubWorkerReader)
+def test_given_failed_worker_then_its_batch_is_skipped_but_others_are_merged(tmp_path):
+    def handle_event(event, context):
+        if event["worker"]["batch"] == 2:
+            raise RuntimeError("worker timed out")
+
+        return handle_worker_event(event, context)
+
+    reader = DistributedInventoryReader(InProcessInvoker(handle_event), str(tmp_path), accounts_per_worker=2)
+
+    inventory = reader.get_resources_from_all_accounts()
+
+    assert [ row.account_id for row in inventory ] == [ _accounts[index]["id"] for index in (0, 1, 4) ]
+    assert reader.failed_batches == [ 2 ]
+
+@patch("inventory.handler.AwsConfigInventoryReader", StubWorkerReader)
+def test_given_missing_partial_of_successful_worker_then_error_is_raised(tmp_path):
+    def handle_event(event, context):
+        response = handle_worker_event(event, context)
+
+        if event["worker"]["batch"] == 2:
+            os.remove(event["worker"]["location"])
+
+        return response
+
+    reader = DistributedInventoryReader(InProcessInvoker(handle_event), str(tmp_path), accounts_per_worker=2)
+
+    with pytest.raises(RuntimeError, match="batch 2"):
+        reader.get_resources_from_all_accounts()
+
+@patch("inventory.handler.AwsConfigInventoryReader", StubWorkerReader)
+def test_given_empty_partial_of_worker_with_rows_then_error_is_raised(tmp_path):
+    def handle_event(event, context):
+        response = handle_worker_event(event, context)
+
+        get_snapshot_store(event["worker"]["location"], snapshot_class=PartialInventory).save(PartialInventory([]))
+
+        return response
+
+    reader = DistributedInventoryReader(InProcessInvoker(handle_event), str(tmp_path), accounts_per_worker=2)
+
+    with pytest.raises(RuntimeError, match="batch 1"):
+        reader.get_resources_from_all_accounts()
+
+def test_given_local_partials_location_with_lambda_invoker_then_it_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        DistributedInventoryReader(LambdaInvoker("InventoryCollector", lambda_client=Mock()), str(tmp_path))
+
+    assert DistributedInventoryReader(LambdaInvoker("InventoryCollector", lambda_client=Mock()), "s3://bucket/partials")
+
+def test_given_lambda_invoker_then_worker_is_invoked_synchronously_and_errors_are_raised():
+    mock_lambda_client = Mock()
+    mock_lambda_client.invoke.return_value = { "StatusCode": 200, "Payload": io.BytesIO(b'{"body": {"worker": {"batch": 1}}}') }
+
+    response = LambdaInvoker("arn:aws:lambda:us-east-1:123456789012:function:InventoryCollector", lambda_client=mock_lambda_client).invoke({ "worker": { "batch": 1 } })
+
+    assert response == { "body": { "worker": { "batch": 1 } } }
+    mock_lambda_client.invoke.assert_called_once_with(FunctionName="arn:aws:lambda:us-east-1:123456789012:function:InventoryCollector", InvocationType="RequestResponse",
+                                                      Payload=json.dumps({ "worker": { "batch": 1 } }))
+
+    mock_lambda_client.invoke.return_value = { "StatusCode": 200, "FunctionError": "Unhandled", "Payload": io.BytesIO(b'{"errorMessage": "Task timed out"}') }
+
+    with pytest.raises(RuntimeError):
+        LambdaInvoker("InventoryCollector", lambda_client=mock_lambda_client).invoke({ "worker": { "batch": 1 } })
+
+@patch("inventory.handler.DeliverReportCommandHandler")
+@patch("inventory.handler.get_create_report_command_handler")
+@patch("inventory.handler.AwsConfigInventoryReader", StubWorkerReader)
+def test_given_distributed_mode_with_local_invoker_then_report_is_created_from_every_worker(mock_get_create_report_command_handler, mock_deliver_report_command_handler, tmp_path):
+    reported_rows = []
+    mock_get_create_report_command_handler.return_value.execute.side_effect = lambda inventory: reported_rows.extend(inventory) or "/tmp/report.xlsx"
+    mock_deliver_report_command_handler.return_value.execute.return_value = "https://bucket.s3.amazonaws.com/report.xlsx"
+
+    with patch.dict(os.environ, { "DISTRIBUTED_PARTIALS_LOCATION": str(tmp_path), "DISTRIBUTED_INVOKER": "local", "DISTRIBUTED_ACCOUNTS_PER_WORKER": "2" }):
+        result = lambda_handler({}, MagicMock())
+
+    assert result["statusCode"] == 200
+    assert [ row.unique_id for row in reported_rows ] == [ f"i-{account['id']}" for account in _accounts ]
+    assert result["body"]["metrics"]["stages"]["InvokeWorker"]["count"] == 3
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import os
+from unittest.mock import MagicMock, patch
+from inventory.duplicates import InventoryDeduplicator
+from inventory.handler import lambda_handler
+from inventory.instrumentation import get_stage_metrics
+from inventory.mappers import InventoryData
+
+def _get_inventory_rows():
+    return [ InventoryData(asset_type="EC2", unique_id="i-0", ip_address="10.0.0.1", account_id="111111111111"),
+             InventoryData(asset_type="EC2", unique_id="i-0", ip_address="10.0.0.2", account_id="111111111111"),
+             InventoryData(asset_type="EC2", unique_id="i-0", ip_address="10.0.0.1", account_id="222222222222"),
+             InventoryData(asset_type="RDS", unique_id="db-0", account_id="111111111111"),
+             InventoryData(asset_type="RDS", unique_id="db-0", account_id="111111111111") ]
+
+def test_given_list_then_first_row_of_every_key_is_kept_in_order_and_duplicates_are_counted():
+    get_stage_metrics().reset()
+    deduplicator = InventoryDeduplicator()
+
+    inventory = deduplicator.deduplicate(_get_inventory_rows())
+
+    assert [ (row.unique_id, row.ip_address, row.account_id) for row in inventory ] == [ ("i-0", "10.0.0.1", "111111111111"), ("i-0", "10.0.0.2", "111111111111"), ("db-0", None, "111111111111") ]
+    assert (deduplicator.unique_rows, deduplicator.duplicate_rows, deduplicator.duplicate_rows_by_asset_type) == (3, 2, { "EC2": 1, "RDS": 1 })
+    assert get_stage_metrics().summary()["stages"]["DuplicateRows"]["count"] == 2
+
+def test_given_streamed_inventory_then_rows_are_deduplicated_as_they_are_pulled():
+    deduplicator = InventoryDeduplicator()
+
+    inventory = deduplicator.deduplicate(iter(_get_inventory_rows()))
+
+    assert next(inventory).ip_address == "10.0.0.1"
+    assert len(list(inventory)) == 2
+    assert deduplicator.duplicate_rows == 2
+
+def test_given_row_without_ip_address_then_it_is_not_a_duplicate_of_a_row_with_an_ip_address():
+    inventory = InventoryDeduplicator().deduplicate([ InventoryData(unique_id="i-0"), InventoryData(unique_id="i-0", ip_address="None"), InventoryData(unique_id="i-0", ip_address="") ])
+
+    assert len(inventory) == 3
+
+@patch("inventory.handler.DeliverReportCommandHandler")
+@patch("inventory.handler.get_create_report_command_handler")
+@patch("inventory.handler.AwsConfigInventoryReader")
+def test_given_deduplication_enabled_then_report_is_created_without_duplicates(mock_reader, mock_get_create_report_command_handler, mock_deliver_report_command_handler):
+    reported_rows = []
+    mock_reader.return_value.get_resources_from_all_accounts.return_value = _get_inventory_rows()
+    mock_get_create_report_command_handler.return_value.execute.side_effect = lambda inventory: reported_rows.extend(inventory) or "/tmp/report.xlsx"
+
+    with patch.dict(os.environ, { "INVENTORY_DEDUPLICATION": "true" }):
+        result = lambda_handler({}, MagicMock())
+
+    assert len(reported_rows) == 3
+    assert result["body"]["metrics"]["stages"]["DuplicateRows"]["count"] == 2
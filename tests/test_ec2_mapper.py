@@ -13,9 +13,11 @@
 # (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
 # This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
 # http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import copy
 import json
 import os
 import pytest
+from unittest.mock import patch
 from inventory.mappers import EC2DataMapper
 
 @pytest.fixture()
@@ -90,3 +92,45 @@ def test_given_ec2_instance_with_public_dns_name_then_asset_is_marked_as_public(
     assert len(mapped_result) == 2, "Two rows were expected. One for the public IP and one for the private IP"
     assert mapped_result[0].is_public == "Yes", "Instance should have been marked public since it has a public DNS name"
     assert mapped_result[1].is_public == "Yes", "Instance should have been marked public since it has a public DNS name"
+
+def test_given_ec2_instance_with_multiple_nics_and_ips_then_one_row_per_ip_with_nic_mac_address(full_ec2_config):
+    second_nic = copy.deepcopy(full_ec2_config["configuration"]["networkInterfaces"][0])
+    second_nic["macAddress"] = "06:d1:af:2f:a4:47"
+    second_nic["privateIpAddresses"] = [ { "privateIpAddress": "172.31.0.189" }, { "privateIpAddress": "172.31.0.190" } ]
+    full_ec2_config["configuration"]["networkInterfaces"].append(second_nic)
+
+    mapper = EC2DataMapper()
+
+    mapped_result = mapper.map(full_ec2_config)
+
+    assert [ (row.ip_address, row.mac_address) for row in mapped_result ] == [ ("172.31.0.188", "06:d1:af:2f:a4:46"), ("11.111.111.111", "06:d1:af:2f:a4:46"),
+                                                                                ("172.31.0.189", "06:d1:af:2f:a4:47"), ("172.31.0.190", "06:d1:af:2f:a4:47") ]
+    assert all(row.unique_id == full_ec2_config["configuration"]["instanceId"] and row.hardware_model == "t3.micro" for row in mapped_result), "instance attributes should be on every row"
+
+def test_given_ec2_instance_without_network_interfaces_then_empty_array_is_returned(full_ec2_config):
+    full_ec2_config["configuration"]["networkInterfaces"] = []
+
+    mapper = EC2DataMapper()
+
+    assert mapper.map(full_ec2_config) == []
+
+def test_given_tags_in_any_case_then_owner_is_found_and_first_duplicate_key_wins(full_ec2_config):
+    full_ec2_config["tags"] = [ { "key": "Environment", "value": "prod" }, { "key": "OWNER", "value": "team-a" }, { "key": "owner", "value": "team-b" } ]
+
+    mapped_result = EC2DataMapper().map(full_ec2_config)
+
+    assert [ row.owner for row in mapped_result ] == [ "team-a", "team-a" ]
+
+def test_given_inventory_tag_names_then_every_row_of_the_instance_shares_the_configured_tags(full_ec2_config):
+    full_ec2_config["tags"] = [ { "key": "System Owner", "value": "ops" }, { "key": "environment", "value": "prod" }, { "key": "Unrelated", "value": "x" } ]
+
+    with patch.dict(os.environ, { "INVENTORY_TAG_NAMES": "System Owner, Environment,Function" }):
+        mapped_result = EC2DataMapper().map(full_ec2_config)
+
+    assert mapped_result[0].tags == { "system owner": "ops", "environment": "prod", "function": "" }
+    assert all(row.tags is mapped_result[0].tags for row in mapped_result), "tags should be looked up once per instance"
+
+def test_given_no_inventory_tag_names_then_rows_have_no_tags(full_ec2_config):
+    os.environ.pop("INVENTORY_TAG_NAMES", None)
+
+    assert all(row.tags is None for row in EC2DataMapper().map(full_ec2_config))
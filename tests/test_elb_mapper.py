@@ -98,3 +98,12 @@ def test_given_internal_v2elb_then_it_is_not_mapped_as_public(full_v2elb_config)
     assert len(mapped_result) == 1, "Expected one row to be mapped"
     assert mapped_result[0].is_public == "No", "ELB should have been marked as private"
 
+def test_given_v2elb_with_multiple_addresses_then_one_row_per_address(full_v2elb_config):
+    full_v2elb_config["configuration"]["availabilityZones"][0]["loadBalancerAddresses"] = [ { "ipAddress": "22.222.222.222" } ]
+
+    mapper = ElbDataMapper()
+
+    mapped_result = mapper.map(full_v2elb_config)
+
+    assert [ row.ip_address for row in mapped_result ] == [ "22.222.222.222", "11.111.111.111" ]
+    assert all(row.unique_id == full_v2elb_config["arn"] and row.is_public == "Yes" for row in mapped_result), "load balancer attributes should be on every row"
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import json
+import os
+from unittest.mock import patch
+from inventory.instrumentation import StageMetrics, profiling
+
+def test_given_recorded_stages_then_summary_totals_stages_and_groups_by_dimension():
+    stage_metrics = StageMetrics()
+
+    stage_metrics.record("Map", 1.5, ResourceType="AWS::EC2::Instance")
+    stage_metrics.record("Map", 0.5, ResourceType="AWS::RDS::DBInstance")
+    stage_metrics.record("Map", 0.5, ResourceType="AWS::RDS::DBInstance")
+    stage_metrics.record("SaveWorkbook", 2.0)
+
+    assert stage_metrics.summary() == { "stages": { "Map": { "seconds": 2.5, "count": 3 }, "SaveWorkbook": { "seconds": 2.0, "count": 1 } },
+                                        "ResourceType": { "AWS::EC2::Instance": { "Map": { "seconds": 1.5, "count": 1 } },
+                                                          "AWS::RDS::DBInstance": { "Map": { "seconds": 1.0, "count": 2 } } } }
+
+def test_given_timed_iterator_then_only_time_producing_items_is_counted():
+    stage_metrics = StageMetrics()
+    clock = iter([ 0.0, 1.0, 5.0, 6.0, 10.0, 11.0 ])
+
+    with patch("inventory.instrumentation.time.perf_counter", side_effect=lambda: next(clock)):
+        assert list(stage_metrics.timed_iter(iter([ "a", "b" ]), "CollectAccount", AccountId="210987654321")) == [ "a", "b" ]
+
+    assert stage_metrics.summary()["AccountId"] == { "210987654321": { "CollectAccount": { "seconds": 3.0, "count": 2 } } }
+
+def test_given_recorded_stages_then_embedded_metric_format_records_are_produced():
+    stage_metrics = StageMetrics()
+    stage_metrics.record("AssumeRole", 0.25)
+    stage_metrics.record("Throttled", 2.0, Api="SelectResourceConfig")
+
+    assume_role_record, throttled_record = [ json.loads(record) for record in stage_metrics.to_embedded_metrics("InventoryCollector") ]
+
+    assert assume_role_record["_aws"]["CloudWatchMetrics"][0]["Namespace"] == "InventoryCollector"
+    assert assume_role_record["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [ [ "Stage" ] ]
+    assert (assume_role_record["Stage"], assume_role_record["Duration"], assume_role_record["Count"]) == ("AssumeRole", 0.25, 1)
+    assert throttled_record["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [ [ "Stage", "Api" ] ]
+    assert throttled_record["Api"] == "SelectResourceConfig"
+
+@patch("inventory.instrumentation._logger")
+def test_given_cprofile_profiler_then_statistics_are_logged(mock_logger):
+    os.environ["INVENTORY_PROFILER"] = "cprofile"
+
+    try:
+        with profiling():
+            sorted(range(1000))
+    finally:
+        os.environ.pop("INVENTORY_PROFILER")
+
+    assert "cProfile statistics" in mock_logger.info.call_args.args[0]
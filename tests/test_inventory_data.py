@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import json
+import os
+import pytest
+from inventory.mappers import INVENTORY_DATA_FIELDS, EC2DataMapper, InventoryBatch, InventoryData
+
+@pytest.fixture()
+def full_ec2_config():
+    with open(os.path.join(os.path.dirname(__file__), "sample_config_query_results/sample_ec2.json")) as file_data:
+        file_contents = file_data.read()
+        
+    return json.loads(file_contents)
+
+def test_given_inventory_data_then_attributes_cannot_be_added_outside_of_fields():
+    inventory_data = InventoryData(unique_id="i-1")
+
+    with pytest.raises(AttributeError):
+        inventory_data.not_a_field = "foo"
+
+def test_given_inventory_data_tuple_then_same_inventory_data_is_created():
+    inventory_data = InventoryData(asset_type="EC2", unique_id="i-1", ip_address="10.0.0.1", owner="owner")
+
+    assert InventoryData.from_tuple(inventory_data.as_tuple()) == inventory_data
+    assert len(inventory_data.as_tuple()) == len(INVENTORY_DATA_FIELDS)
+
+def test_given_equal_inventory_data_then_hashes_are_equal_and_rows_can_be_kept_in_sets():
+    inventory_data = InventoryData(asset_type="EC2", unique_id="i-1", ip_address="10.0.0.1", tags={ "environment": "prod" })
+    same_inventory_data = InventoryData.from_tuple(inventory_data.as_tuple())
+
+    assert hash(inventory_data) == hash(same_inventory_data)
+    assert { inventory_data, same_inventory_data, InventoryData(unique_id="i-2") } == { inventory_data, InventoryData(unique_id="i-2") }
+
+def test_given_tuple_then_every_field_is_set_from_its_position():
+    inventory_data = InventoryData.from_tuple(tuple(f"value-{name}" for name in INVENTORY_DATA_FIELDS))
+
+    assert all(getattr(inventory_data, name) == f"value-{name}" for name in INVENTORY_DATA_FIELDS)
+
+def test_given_tuple_from_before_a_field_was_added_then_missing_fields_are_none():
+    inventory_data = InventoryData.from_tuple(("EC2", "i-1"))
+
+    assert inventory_data == InventoryData(asset_type="EC2", unique_id="i-1")
+
+def test_given_mapper_appends_into_batch_then_columns_hold_one_value_per_row(full_ec2_config):
+    batch = InventoryBatch()
+
+    EC2DataMapper().map_into(full_ec2_config, batch)
+
+    assert len(batch) == 2, "Two rows were expected. One for the public IP and one for the private IP"
+    assert batch.column("ip_address") == [ "172.31.0.188", "11.111.111.111" ]
+    assert batch.column("unique_id") == [ full_ec2_config["configuration"]["instanceId"] ] * 2
+
+def test_given_batch_then_iteration_returns_rows_in_append_order():
+    rows = [ InventoryData(unique_id="i-1", ip_address="10.0.0.1"), InventoryData(unique_id="i-2") ]
+
+    batch = InventoryBatch(rows)
+
+    assert list(batch) == rows
+    assert list(batch.rows()) == [ row.as_tuple() for row in rows ]
@@ -19,13 +19,19 @@ import json
 import os
 from unittest.mock import MagicMock, Mock, patch, ANY
 import pytest
-from inventory.mappers import DataMapper
+import threading
+from inventory.mappers import DataMapper, InventoryData
 import inventory.readers
-from inventory.readers import AwsConfigInventoryReader
+from inventory.readers import AwsConfigInventoryReader, IncrementalAwsConfigInventoryReader
+from inventory.snapshots import InventorySnapshot, SnapshotResource
+from inventory.throttling import RequestScheduler
 
 def setup_function():
     os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321"} ]'
     os.environ["CROSS_ACCOUNT_ROLE_NAME"] = "foobar"
+    os.environ["AWS_REGION"] = "us-east-1"
+    os.environ.pop("INVENTORY_REGIONS", None)
+    os.environ.pop("CONFIG_SELECT_PROJECTION", None)
 
 def test_given_valid_arn_then_aws_partition_determined():
     mock_lambda_context = Mock()
@@ -40,7 +46,7 @@ def test_given_valid_arn_then_aws_partition_determined():
 @patch("inventory.readers._logger", autospec=True)
 def test_given_unsupported_resource_type_then_warning_is_logged(mock_logger):
     mock_mapper = Mock(spec=DataMapper)
-    mock_mapper.can_map.return_value = False
+    mock_mapper.supported_resource_types = frozenset()
     mock_config_client_factory = Mock()
     mock_config_client_factory.return_value \
                               .select_resource_config \
@@ -59,7 +65,7 @@ def test_given_unsupported_resource_type_then_warning_is_logged(mock_logger):
 def test_given_error_from_boto_then_account_is_skipped_but_others_still_processed(mock_logger):
     os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321" }, { "name": "bar", "id": "123456789012" } ]'
     mock_mapper = Mock(spec=DataMapper)
-    mock_mapper.can_map.return_value = True
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
     mock_mapper.map.return_value = [ { "test": True }]
     mock_select_resource_config = Mock(side_effect=[ ClientError(error_response={'Error': {'Code': 'ResourceInUseException'}}, operation_name="select_resource_config"),
                                                     { "NextToken": None,
@@ -75,11 +81,11 @@ def test_given_error_from_boto_then_account_is_skipped_but_others_still_processe
 
     assert len(all_inventory) == 1, "inventory from the successful call should be returned"
     assert len(mock_select_resource_config.mock_calls) == 2, "boto should have been called twice to page through results"
-    mock_logger.error.assert_called_with(String() & Contains("moving onto next account"), ANY, ANY, exc_info=True)
+    mock_logger.error.assert_called_with(String() & Contains("moving onto next account"), ANY, ANY, ANY, exc_info=True)
 
 def test_given_multiple_resource_pages_from_boto_then_reader_loops_through_all_pages():
     mock_mapper = Mock(spec=DataMapper)
-    mock_mapper.can_map.return_value = False
+    mock_mapper.supported_resource_types = frozenset()
     mock_select_resource_config = Mock(side_effect=[{ "NextToken": "nextpage",
                                                       "Results": [ json.dumps({ "resourceType": "foobar" }) ] },
                                                     { "NextToken": None,
@@ -96,3 +102,279 @@ def test_given_multiple_resource_pages_from_boto_then_reader_loops_through_all_p
     assert len(all_inventory) == 0, "no inventory should be returned since there was nothing to map"
     assert len(mock_select_resource_config.mock_calls) == 2, "boto should have been called twice to page through results"
     assert mock_select_resource_config.call_args.kwargs["NextToken"] == "nextpage", "NextToken must use value from previous select_resource_config call"
+
+def test_given_throttling_error_on_later_page_then_page_is_retried_and_rest_of_account_is_kept():
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ InventoryData(unique_id=resource["id"]) ]
+    mock_select_resource_config = Mock(side_effect=[{ "NextToken": "nextpage",
+                                                      "Results": [ json.dumps({ "resourceType": "foobar", "id": "first" }) ] },
+                                                    ClientError(error_response={'Error': {'Code': 'ThrottlingException'}}, operation_name="select_resource_config"),
+                                                    { "Results": [ json.dumps({ "resourceType": "foobar", "id": "second" }) ] }])
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=Mock(), mappers=[mock_mapper], request_scheduler=RequestScheduler(sleep=Mock()))
+    reader._get_config_client = mock_config_client_factory
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ row.unique_id for row in all_inventory ] == [ "first", "second" ]
+    assert [ mock_call.kwargs["NextToken"] for mock_call in mock_select_resource_config.call_args_list ] == [ "", "nextpage", "nextpage" ], "throttled page should be retried with its NextToken"
+
+def test_given_multiple_workers_then_inventory_is_returned_in_account_list_order():
+    os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321" }, { "name": "bar", "id": "123456789012" }, { "name": "baz", "id": "111111111111" } ]'
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ resource["accountId"] ]
+    mock_sts_client = Mock()
+    mock_sts_client.assume_role.side_effect = lambda RoleArn, **kwargs: { "AccountId": RoleArn.split(":")[4] }
+    first_account_may_finish = threading.Event()
+
+    def select_resource_config_for(account_id):
+        def select_resource_config(**kwargs):
+            # Hold the first account until the last one has been collected so the workers finish out of order
+            if account_id == "210987654321":
+                first_account_may_finish.wait(timeout=5)
+            elif account_id == "111111111111":
+                first_account_may_finish.set()
+
+            return { "NextToken": None, "Results": [ json.dumps({ "resourceType": "foobar", "accountId": account_id }) ] }
+
+        return Mock(select_resource_config=Mock(side_effect=select_resource_config))
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=mock_sts_client, mappers=[mock_mapper], max_workers=3)
+    reader._get_config_client = lambda sts_response, region_name=None: select_resource_config_for(sts_response["AccountId"])
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert all_inventory == [ "210987654321", "123456789012", "111111111111" ], "inventory must follow the order of the account list"
+
+@patch("inventory.readers._logger", autospec=True)
+def test_given_multiple_workers_and_error_from_boto_then_account_is_skipped_but_others_still_processed(mock_logger):
+    os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321" }, { "name": "bar", "id": "123456789012" } ]'
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.return_value = [ { "test": True }]
+    mock_sts_client = Mock()
+    mock_sts_client.assume_role.side_effect = [ ClientError(error_response={'Error': {'Code': 'AccessDenied'}}, operation_name="assume_role"),
+                                                { "Credentials": {} } ]
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config \
+                              .return_value = { "NextToken": None,
+                                                "Results": [ json.dumps({ "resourceType": "foobar" }) ] }
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=mock_sts_client, mappers=[mock_mapper], max_workers=2)
+    reader._get_config_client = mock_config_client_factory
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert len(all_inventory) == 1, "inventory from the successful account should be returned"
+    mock_logger.error.assert_called_with(String() & Contains("moving onto next account"), ANY, ANY, exc_info=True)
+
+def test_given_streaming_iteration_then_pages_are_only_retrieved_as_rows_are_consumed():
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ resource["page"] ]
+    mock_select_resource_config = Mock(side_effect=[{ "NextToken": "nextpage",
+                                                      "Results": [ json.dumps({ "resourceType": "foobar", "page": 1 }) ] },
+                                                    { "NextToken": None,
+                                                      "Results": [ json.dumps({ "resourceType": "foobar", "page": 2 }) ] }])
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=Mock(), mappers=[mock_mapper])
+    reader._get_config_client = mock_config_client_factory
+
+    inventory = reader.iter_resources_from_all_accounts()
+
+    assert next(inventory) == 1, "first row should come from the first page"
+    assert len(mock_select_resource_config.mock_calls) == 1, "second page must not be retrieved before the first page is consumed"
+    assert list(inventory) == [ 2 ], "remaining rows should come from the second page"
+    assert len(mock_select_resource_config.mock_calls) == 2, "boto should have been called twice to page through results"
+
+def test_given_previous_snapshot_then_only_resources_changed_since_watermark_are_remapped():
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ InventoryData(unique_id=resource["arn"], owner="remapped") ]
+    previous_snapshot = InventorySnapshot()
+    previous_snapshot.set_account("210987654321:us-east-1", "2020-01-01T00:00:00.000Z",
+                                  { "unchanged": SnapshotResource(arn="unchanged", capture_time="2019-12-01T00:00:00.000Z", rows=[ InventoryData(unique_id="unchanged", owner="previous") ]),
+                                    "deleted": SnapshotResource(arn="deleted", capture_time="2019-12-01T00:00:00.000Z", rows=[ InventoryData(unique_id="deleted", owner="previous") ]) })
+    mock_snapshot_store = Mock()
+    mock_snapshot_store.load.return_value = previous_snapshot
+
+    def select_resource_config(Expression, NextToken):
+        if "configuration," not in Expression:
+            return { "Results": [ json.dumps({ "arn": "unchanged", "configurationItemCaptureTime": "2019-12-01T00:00:00.000Z" }),
+                                  json.dumps({ "arn": "created", "configurationItemCaptureTime": "2020-02-01T00:00:00.000Z" }) ] }
+
+        return { "Results": [ json.dumps({ "arn": "created", "resourceType": "foobar", "configurationItemCaptureTime": "2020-02-01T00:00:00.000Z" }) ] }
+
+    mock_select_resource_config = Mock(side_effect=select_resource_config)
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = IncrementalAwsConfigInventoryReader(lambda_context=MagicMock(), snapshot_store=mock_snapshot_store, sts_client=Mock(), mappers=[mock_mapper])
+    reader._get_config_client = mock_config_client_factory
+    previous_snapshot.mapping_fingerprint = reader.get_mapping_fingerprint()
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ (row.unique_id, row.owner) for row in all_inventory ] == [ ("unchanged", "previous"), ("created", "remapped") ], "unchanged rows must come from the snapshot and deleted resources must be dropped"
+    assert mock_select_resource_config.call_args.kwargs["Expression"].endswith("AND configurationItemCaptureTime > '2020-01-01T00:00:00.000Z'"), "only resources changed since the watermark should be selected"
+    saved_snapshot = mock_snapshot_store.save.call_args.args[0]
+    assert saved_snapshot.get_watermark("210987654321:us-east-1") == "2020-02-01T00:00:00.000Z", "watermark should move to the latest capture time"
+    assert list(saved_snapshot.get_resources("210987654321:us-east-1")) == [ "unchanged", "created" ]
+
+def test_given_no_previous_snapshot_then_all_resources_are_retrieved():
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ InventoryData(unique_id=resource["arn"]) ]
+    mock_snapshot_store = Mock()
+    mock_snapshot_store.load.return_value = InventorySnapshot()
+    mock_select_resource_config = Mock(return_value={ "Results": [ json.dumps({ "arn": "created", "resourceType": "foobar", "configurationItemCaptureTime": "2020-02-01T00:00:00.000Z" }) ] })
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = IncrementalAwsConfigInventoryReader(lambda_context=MagicMock(), snapshot_store=mock_snapshot_store, sts_client=Mock(), mappers=[mock_mapper])
+    reader._get_config_client = mock_config_client_factory
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ row.unique_id for row in all_inventory ] == [ "created" ]
+    assert len(mock_select_resource_config.mock_calls) == 1, "without a watermark every resource is retrieved in a single query"
+    assert "configurationItemCaptureTime >" not in mock_select_resource_config.call_args.kwargs["Expression"]
+
+def test_given_snapshot_of_other_tag_names_then_it_is_discarded_and_all_resources_are_remapped():
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ InventoryData(unique_id=resource["arn"], owner="remapped") ]
+    previous_snapshot = InventorySnapshot()
+    previous_snapshot.set_account("210987654321:us-east-1", "2020-01-01T00:00:00.000Z",
+                                  { "unchanged": SnapshotResource(arn="unchanged", capture_time="2019-12-01T00:00:00.000Z", rows=[ InventoryData(unique_id="unchanged", owner="previous") ]) })
+    mock_snapshot_store = Mock()
+    mock_snapshot_store.load.return_value = previous_snapshot
+    mock_select_resource_config = Mock(return_value={ "Results": [ json.dumps({ "arn": "unchanged", "resourceType": "foobar", "configurationItemCaptureTime": "2019-12-01T00:00:00.000Z" }) ] })
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = IncrementalAwsConfigInventoryReader(lambda_context=MagicMock(), snapshot_store=mock_snapshot_store, sts_client=Mock(), mappers=[mock_mapper])
+    reader._get_config_client = mock_config_client_factory
+    previous_snapshot.mapping_fingerprint = reader.get_mapping_fingerprint()
+
+    with patch.dict(os.environ, { "INVENTORY_TAG_NAMES": "owner" }):
+        assert reader.get_mapping_fingerprint() != previous_snapshot.mapping_fingerprint
+
+        all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ (row.unique_id, row.owner) for row in all_inventory ] == [ ("unchanged", "remapped") ], "rows mapped with other tag names must not be carried over"
+    assert "configurationItemCaptureTime >" not in mock_select_resource_config.call_args.kwargs["Expression"]
+    assert mock_snapshot_store.save.call_args.args[0].mapping_fingerprint != previous_snapshot.mapping_fingerprint
+
+@patch("inventory.readers._logger", autospec=True)
+def test_given_error_from_boto_in_incremental_mode_then_previous_snapshot_is_kept_for_account(mock_logger):
+    previous_snapshot = InventorySnapshot()
+    previous_snapshot.set_account("210987654321:us-east-1", "2020-01-01T00:00:00.000Z",
+                                  { "unchanged": SnapshotResource(arn="unchanged", capture_time="2019-12-01T00:00:00.000Z", rows=[ InventoryData(unique_id="unchanged") ]) })
+    mock_snapshot_store = Mock()
+    mock_snapshot_store.load.return_value = previous_snapshot
+    mock_sts_client = Mock()
+    mock_sts_client.assume_role.side_effect = ClientError(error_response={'Error': {'Code': 'AccessDenied'}}, operation_name="assume_role")
+
+    reader = IncrementalAwsConfigInventoryReader(lambda_context=MagicMock(), snapshot_store=mock_snapshot_store, sts_client=mock_sts_client, mappers=[])
+    previous_snapshot.mapping_fingerprint = reader.get_mapping_fingerprint()
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ row.unique_id for row in all_inventory ] == [ "unchanged" ]
+    assert mock_snapshot_store.save.call_args.args[0].get_watermark("210987654321:us-east-1") == "2020-01-01T00:00:00.000Z", "watermark must not move when the account failed"
+    mock_logger.error.assert_called_with(String() & Contains("moving onto next account"), ANY, ANY, exc_info=True)
+
+def test_given_multiple_regions_then_role_is_assumed_once_and_regions_are_merged_in_order():
+    os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321", "regions": [ "us-gov-west-1", "us-gov-east-1" ] }, { "name": "bar", "id": "123456789012" } ]'
+    os.environ["INVENTORY_REGIONS"] = '[ "us-east-1", "us-west-2", "eu-west-1" ]'
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ resource["region"] ]
+    mock_sts_client = Mock()
+    mock_sts_client.assume_role.side_effect = lambda RoleArn, **kwargs: { "AccountId": RoleArn.split(":")[4] }
+    config_client_regions = []
+
+    def get_config_client(sts_response, region_name=None):
+        config_client_regions.append((sts_response["AccountId"], region_name))
+
+        return Mock(select_resource_config=Mock(return_value={ "Results": [ json.dumps({ "resourceType": "foobar", "region": f"{sts_response['AccountId']}:{region_name}" }) ] }))
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=mock_sts_client, mappers=[mock_mapper], max_region_workers=3)
+    reader._get_config_client = get_config_client
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert all_inventory == [ "210987654321:us-gov-west-1", "210987654321:us-gov-east-1", "123456789012:us-east-1", "123456789012:us-west-2", "123456789012:eu-west-1" ], \
+           "regions of the account take precedence over the default regions and results follow the region order"
+    assert len(mock_sts_client.assume_role.mock_calls) == 2, "role should be assumed once per account"
+    assert sorted(config_client_regions) == sorted([ ("210987654321", "us-gov-west-1"), ("210987654321", "us-gov-east-1"),
+                                                     ("123456789012", "us-east-1"), ("123456789012", "us-west-2"), ("123456789012", "eu-west-1") ])
+
+@patch("inventory.readers._logger", autospec=True)
+def test_given_error_from_boto_in_one_region_then_other_regions_are_still_processed(mock_logger):
+    os.environ["INVENTORY_REGIONS"] = '[ "us-east-1", "us-west-2" ]'
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ resource["region"] ]
+
+    def get_config_client(sts_response, region_name=None):
+        if region_name == "us-east-1":
+            return Mock(select_resource_config=Mock(side_effect=ClientError(error_response={'Error': {'Code': 'AccessDenied'}}, operation_name="select_resource_config")))
+
+        return Mock(select_resource_config=Mock(return_value={ "Results": [ json.dumps({ "resourceType": "foobar", "region": region_name }) ] }))
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=Mock(), mappers=[mock_mapper], max_region_workers=1)
+    reader._get_config_client = get_config_client
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert all_inventory == [ "us-west-2" ]
+    mock_logger.error.assert_called_with(String() & Contains("moving onto next account or region"), ANY, "210987654321", "us-east-1", exc_info=True)
+
+def test_given_account_resources_then_mappers_receive_the_account_of_each_resource():
+    os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321" }, { "name": "bar", "id": "123456789012" } ]'
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ InventoryData(unique_id=resource["resourceId"], account_id=resource.get("accountId")) ]
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config \
+                              .side_effect = [ { "Results": [ json.dumps({ "resourceType": "foobar", "resourceId": "first" }) ] },
+                                               { "Results": [ json.dumps({ "resourceType": "foobar", "resourceId": "second" }) ] } ]
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=Mock(), mappers=[mock_mapper])
+    reader._get_config_client = mock_config_client_factory
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ (row.unique_id, row.account_id) for row in all_inventory ] == [ ("first", "210987654321"), ("second", "123456789012") ]
+
+@pytest.mark.parametrize("mapping_workers", [ 0, 2 ])
+def test_given_mapping_workers_then_rows_are_the_same_and_in_page_order(mapping_workers):
+    mock_mapper = Mock(spec=DataMapper)
+    mock_mapper.supported_resource_types = frozenset([ "foobar" ])
+    mock_mapper.map.side_effect = lambda resource: [ InventoryData(unique_id=resource["resourceId"], ip_address=f"10.0.0.{index}") for index in range(2) ]
+    pages = [ { "Results": [ json.dumps({ "resourceType": "foobar", "resourceId": f"r-{page}-{index}" }) for index in range(3) ], "NextToken": f"{page + 1}" if page < 4 else "" } for page in range(5) ]
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value.select_resource_config.side_effect = pages
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=Mock(), mappers=[mock_mapper], mapping_workers=mapping_workers)
+    reader._get_config_client = mock_config_client_factory
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ (row.unique_id, row.ip_address) for row in all_inventory ] == [ (f"r-{page}-{index}", f"10.0.0.{ip}") for page in range(5) for index in range(3) for ip in range(2) ]
+
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import json
+import os
+import subprocess
+import sys
+from typing import List
+from unittest.mock import MagicMock, Mock, patch
+import pytest
+import inventory
+from inventory.mappers import DataMapper, DynamoDbTableDataMapper, EC2DataMapper, ElbDataMapper, InventoryData, MapperRegistry, RdsDataMapper, get_default_mapper_registry
+from inventory.readers import AwsConfigInventoryReader
+
+def setup_function():
+    os.environ["ACCOUNT_LIST"] = '[ { "name": "foo", "id": "210987654321"} ]'
+    os.environ["CROSS_ACCOUNT_ROLE_NAME"] = "foobar"
+    os.environ["AWS_REGION"] = "us-east-1"
+    os.environ.pop("INVENTORY_REGIONS", None)
+    os.environ.pop("CONFIG_SELECT_PROJECTION", None)
+
+class FooDataMapper(DataMapper):
+    def _get_supported_resource_type(self) -> List[str]:
+        return ["AWS::Foo::Bar"]
+
+    def _do_mapping(self, config_resource: dict) -> List[InventoryData]:
+        return [InventoryData(unique_id=config_resource["arn"])]
+
+def test_given_default_registry_then_all_builtin_resource_types_are_registered():
+    registry = get_default_mapper_registry()
+
+    assert set(registry.resource_types) == { "AWS::EC2::Instance", "AWS::ElasticLoadBalancingV2::LoadBalancer", "AWS::ElasticLoadBalancing::LoadBalancer",
+                                             "AWS::DynamoDB::Table", "AWS::RDS::DBInstance" }
+    assert isinstance(registry.get_mapper("AWS::ElasticLoadBalancing::LoadBalancer"), ElbDataMapper)
+    assert registry.get_mapper("AWS::ElasticLoadBalancingV2::LoadBalancer") is registry.get_mapper("AWS::ElasticLoadBalancing::LoadBalancer"), "one mapper instance should serve all of its resource types"
+
+def test_given_different_hash_seeds_then_resource_types_are_registered_in_the_same_order():
+    # Checkpoints are resumed by the text of the select query, which has to be the same in every container
+    registry_source = "from inventory.mappers import get_default_mapper_registry; print(get_default_mapper_registry().resource_types)"
+    python_path = os.path.dirname(os.path.dirname(inventory.__file__))
+
+    resource_types_by_seed = { subprocess.run([ sys.executable, "-c", registry_source ], env={ **os.environ, "PYTHONHASHSEED": seed, "PYTHONPATH": python_path },
+                                              capture_output=True, text=True, check=True).stdout for seed in ("0", "5", "8") }
+
+    assert len(resource_types_by_seed) == 1
+
+def test_given_unregistered_resource_type_then_no_mapper_is_returned():
+    registry = MapperRegistry([EC2DataMapper()])
+
+    assert registry.get_mapper("AWS::Foo::Bar") is None
+
+def test_given_mapper_entry_point_then_mapper_is_registered():
+    mock_entry_point = Mock()
+    mock_entry_point.load.return_value = FooDataMapper
+    registry = MapperRegistry()
+
+    with patch("inventory.mappers.entry_points") as mock_entry_points:
+        mock_entry_points.return_value.select.return_value = [mock_entry_point]
+
+        registry.register_entry_points()
+
+    mock_entry_points.return_value.select.assert_called_with(group="inventory.mappers")
+    assert isinstance(registry.get_mapper("AWS::Foo::Bar"), FooDataMapper)
+    assert len(registry.mappers) == 1
+
+def test_given_registry_then_reader_selects_and_dispatches_registered_resource_types():
+    mock_select_resource_config = Mock(return_value={ "Results": [ json.dumps({ "resourceType": "AWS::Foo::Bar", "arn": "foo" }) ] })
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=Mock(), mappers=[FooDataMapper()])
+    reader._get_config_client = mock_config_client_factory
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert mock_select_resource_config.call_args.kwargs["Expression"].endswith("WHERE resourceType IN ('AWS::Foo::Bar')"), "query must only select registered resource types"
+    assert [ row.unique_id for row in all_inventory ] == [ "foo" ]
+
+@pytest.mark.parametrize("sample_file,mapper", [ ("sample_ec2.json", EC2DataMapper()),
+                                                 ("sample_classic_elb.json", ElbDataMapper()),
+                                                 ("sample_v2elb.json", ElbDataMapper()),
+                                                 ("sample_rds_db.json", RdsDataMapper()),
+                                                 ("sample_dynamo_table.json", DynamoDbTableDataMapper()) ])
+def test_given_resource_projected_to_declared_configuration_paths_then_mapping_is_unchanged(sample_file, mapper):
+    with open(os.path.join(os.path.dirname(__file__), "sample_config_query_results", sample_file)) as file_data:
+        sample_data = json.load(file_data)
+
+    projected_data = { **sample_data, "configuration": { path: value for path, value in sample_data["configuration"].items() if path in mapper.configuration_paths } }
+
+    assert mapper.map(projected_data) == mapper.map(sample_data)
+
+def test_given_projection_enabled_then_reader_selects_only_declared_configuration_paths_per_mapper():
+    os.environ["CONFIG_SELECT_PROJECTION"] = "true"
+    mock_select_resource_config = Mock(side_effect=[{ "Results": [ json.dumps({ "resourceType": "AWS::RDS::DBInstance", "arn": "rds", "tags": [],
+                                                                                 "configuration": { "publiclyAccessible": False, "dBInstanceClass": "db.t3.micro", "engine": "mysql", "engineVersion": "8.0" } }) ] },
+                                                    { "Results": [ json.dumps({ "resourceType": "AWS::Foo::Bar", "arn": "foo" }) ] }])
+    mock_config_client_factory = Mock()
+    mock_config_client_factory.return_value \
+                              .select_resource_config = mock_select_resource_config
+
+    reader = AwsConfigInventoryReader(lambda_context=MagicMock(), sts_client=Mock(), mappers=[RdsDataMapper(), FooDataMapper()])
+    reader._get_config_client = mock_config_client_factory
+
+    all_inventory = reader.get_resources_from_all_accounts()
+
+    assert [ call.kwargs["Expression"] for call in mock_select_resource_config.call_args_list ] == \
+           [ "SELECT arn, resourceType, tags, configuration.publiclyAccessible, configuration.dBInstanceClass, configuration.engine, configuration.engineVersion, configuration.dBSubnetGroup WHERE resourceType IN ('AWS::RDS::DBInstance')",
+             "SELECT arn, resourceType, configuration, tags WHERE resourceType IN ('AWS::Foo::Bar')" ], "mappers without declared paths must still select the whole configuration"
+    assert [ row.unique_id for row in all_inventory ] == [ "rds", "foo" ]
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import os
+import pytest
+from inventory.processes import ForkedProcessPool, is_fork_available
+
+pytestmark = pytest.mark.skipif(not is_fork_available(), reason="worker processes are forked")
+
+def _describe(value: int) -> tuple:
+    if value < 0:
+        raise ValueError("negative value")
+
+    return (value * 2, os.getpid())
+
+def test_given_tasks_then_results_are_returned_from_worker_processes():
+    with ForkedProcessPool(_describe, 2) as pool:
+        results = [ future.result() for future in [ pool.submit(value) for value in range(20) ] ]
+
+    assert [ doubled for doubled, _ in results ] == [ value * 2 for value in range(20) ]
+    assert os.getpid() not in { pid for _, pid in results }, "tasks should run in the worker processes"
+
+def test_given_failing_task_then_error_is_raised_and_pool_keeps_working():
+    with ForkedProcessPool(_describe, 1) as pool:
+        failed = pool.submit(-1)
+        succeeded = pool.submit(1)
+
+        with pytest.raises(RuntimeError, match="negative value"):
+            failed.result()
+
+        assert succeeded.result()[0] == 2
+
+def test_given_worker_process_exits_then_pending_tasks_fail_instead_of_hanging():
+    with ForkedProcessPool(os._exit, 1) as pool:
+        with pytest.raises(RuntimeError):
+            pool.submit(1).result(timeout=10)
+
+        with pytest.raises(RuntimeError):
+            pool.submit(1).result(timeout=10)
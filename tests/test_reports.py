@@ -13,20 +13,24 @@
 # (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
 # This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
 # http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import io
+import json
 import os
 from unittest.mock import Mock, mock_open, patch, ANY
 from callee import String, Contains
 import pytest
 import inventory.reports
-from inventory.reports import CreateReportCommandHandler, DeliverReportCommandHandler
+from inventory.mappers import InventoryData
+from openpyxl import load_workbook
+from inventory.reports import CreateReportCommandHandler, DeliverReportCommandHandler, ReportLayout, ReportShard, ReportTemplate, ShardedCreateReportCommandHandler, StreamingCreateReportCommandHandler, get_create_report_command_handler
 
-@patch('inventory.reports.load_workbook')
-def test_given_empty_inventory_list_then_report_is_still_written(mock_load_workbook):
+@patch('inventory.reports.ReportTemplate.new_workbook')
+def test_given_empty_inventory_list_then_report_is_still_written(mock_new_workbook):
     report_handler = CreateReportCommandHandler()
 
     report_handler.execute([])
 
-    mock_load_workbook.return_value.save.assert_called()
+    mock_new_workbook.return_value.save.assert_called()
 
 @patch('builtins.open')
 @patch('inventory.reports.datetime')
@@ -42,4 +46,157 @@ def test_given_report_file_exists_then_delivery_to_s3_uses_correct_file_naming_c
     # Only verifying that we try to format the datetime correctly as that's the most import part of the report file name
     mock_datetime.now.return_value.strftime.assert_called_with("%Y-%m-%d-%H-%M-%S")
     mock_s3_client.put_object.assert_called_with(Key=ANY, Bucket=test_bucket_name, Body=ANY)
-    assert report_url is not None and len(report_url) > 0, "report URL should be returned"
\ No newline at end of file
+    assert report_url is not None and len(report_url) > 0, "report URL should be returned"
+
+@patch('inventory.reports.ReportTemplate.new_workbook')
+def test_given_inventory_generator_then_every_row_is_written(mock_new_workbook):
+    mock_worksheet = mock_new_workbook.return_value.__getitem__.return_value
+    report_handler = CreateReportCommandHandler()
+
+    report_handler.execute(InventoryData(unique_id=f"id-{index}") for index in range(3))
+
+    written_unique_ids = [ call.kwargs["value"] for call in mock_worksheet.cell.mock_calls if call.kwargs["column"] == 1 ]
+    assert written_unique_ids == [ "id-0", "id-1", "id-2" ], "every row produced by the generator should be written"
+    mock_new_workbook.return_value.save.assert_called()
+
+def test_given_streaming_engine_then_header_rows_are_kept_and_inventory_is_written_with_template_styles(tmp_path):
+    os.environ["REPORT_WORKSHEET_NAME"] = "Inventory"
+    os.environ["REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER"] = "6"
+    template_worksheet = load_workbook(inventory.reports._workbook_template_file_name)["Inventory"]
+
+    with patch("inventory.reports._workbook_output_file_path", tmp_path / "report.xlsx"):
+        report_path = StreamingCreateReportCommandHandler().execute(InventoryData(unique_id=f"id-{index}", owner="<owner & co>") for index in range(2))
+
+    report_worksheet = load_workbook(report_path)["Inventory"]
+
+    assert report_worksheet["A5"].value == template_worksheet["A5"].value, "header rows must be copied from the template"
+    assert [ report_worksheet["A6"].value, report_worksheet["A7"].value ] == [ "id-0", "id-1" ], "inventory must start at the first writeable row"
+    assert report_worksheet["V6"].value == "<owner & co>" and report_worksheet["W6"].value == "<owner & co>", "owner should be written to both owner columns"
+    assert report_worksheet["B6"].value is None, "cells without a value must be left blank"
+    assert report_worksheet["A6"].style_id == template_worksheet["A6"].style_id, "data rows should use the template's data row styling"
+
+def test_given_streaming_engine_configured_then_streaming_report_handler_is_used():
+    with patch.dict(os.environ, { "REPORT_ENGINE": "streaming" }):
+        assert isinstance(get_create_report_command_handler(), StreamingCreateReportCommandHandler)
+
+    with patch.dict(os.environ, { "REPORT_ENGINE": "openpyxl" }):
+        assert isinstance(get_create_report_command_handler(), CreateReportCommandHandler)
+
+@pytest.mark.parametrize("report_handler", [ CreateReportCommandHandler(), StreamingCreateReportCommandHandler() ])
+def test_given_stream_delivery_then_report_is_written_straight_into_s3(report_handler):
+    os.environ["REPORT_TARGET_BUCKET_NAME"] = "bucket"
+    os.environ["REPORT_TARGET_BUCKET_PATH"] = "test/path"
+    os.environ["REPORT_WORKSHEET_NAME"] = "Inventory"
+    os.environ["REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER"] = "6"
+    mock_s3_client = Mock()
+
+    with patch("inventory.reports._workbook_output_file_path", Mock(stem="report")):
+        report_url = DeliverReportCommandHandler(s3_client=mock_s3_client).execute_streaming(lambda report_output: report_handler.execute([ InventoryData(unique_id="id-0") ], report_output))
+
+    report_worksheet = load_workbook(io.BytesIO(mock_s3_client.put_object.call_args.kwargs["Body"]))["Inventory"]
+
+    assert report_worksheet["A6"].value == "id-0"
+    assert report_url.startswith("https://bucket.s3.amazonaws.com/test/path/report-")
+
+@pytest.mark.parametrize("max_workers", [ 1, 2 ])
+def test_given_shard_by_asset_type_then_one_workbook_per_asset_type_is_created_and_large_shards_are_split(tmp_path, max_workers):
+    os.environ["REPORT_WORKSHEET_NAME"] = "Inventory"
+    os.environ["REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER"] = "6"
+    inventory_rows = [ InventoryData(asset_type="EC2", unique_id=f"ec2-{index}") for index in range(3) ] + [ InventoryData(asset_type="RDS DB Instance", unique_id="rds-0") ]
+
+    with patch("inventory.reports._workbook_output_file_path", tmp_path / "report.xlsx"):
+        shards = ShardedCreateReportCommandHandler(StreamingCreateReportCommandHandler(), shard_by="asset_type", max_rows=2, max_workers=max_workers).execute(inventory_rows)
+
+    assert [ (shard.name, shard.rows) for shard in shards ] == [ ("ec2-part-0001", 2), ("ec2-part-0002", 1), ("rds-db-instance", 1) ]
+    assert [ load_workbook(shard.path)["Inventory"]["A6"].value for shard in shards ] == [ "ec2-0", "ec2-2", "rds-0" ], "every shard should be created from the template"
+
+def test_given_shard_by_account_then_rows_are_grouped_by_account(tmp_path):
+    inventory_rows = [ InventoryData(unique_id="a", account_id="111111111111"), InventoryData(unique_id="b", account_id="222222222222"), InventoryData(unique_id="c", account_id="111111111111") ]
+    mock_create_report_handler = Mock()
+    written_rows = {}
+    mock_create_report_handler.execute.side_effect = lambda inventory, output: written_rows.setdefault(output.name, [ row.unique_id for row in inventory ])
+
+    with patch("inventory.reports._workbook_output_file_path", tmp_path / "report.xlsx"):
+        shards = ShardedCreateReportCommandHandler(mock_create_report_handler, shard_by="account", max_workers=1).execute(inventory_rows)
+
+    assert [ shard.name for shard in shards ] == [ "account-111111111111", "account-222222222222" ]
+    assert written_rows == { "account-111111111111.xlsx": [ "a", "c" ], "account-222222222222.xlsx": [ "b" ] }
+
+def test_given_unsupported_shard_key_then_error_is_raised():
+    with pytest.raises(ValueError):
+        ShardedCreateReportCommandHandler(Mock(), shard_by="region")
+
+def test_given_report_shards_then_shards_and_manifest_are_uploaded_under_one_prefix(tmp_path):
+    os.environ["REPORT_TARGET_BUCKET_NAME"] = "bucket"
+    os.environ["REPORT_TARGET_BUCKET_PATH"] = "test/path"
+    shards = [ ReportShard(name=f"part-{index}", path=str(tmp_path / f"part-{index}.xlsx"), rows=index) for index in range(1, 3) ]
+
+    for shard in shards:
+        (tmp_path / f"{shard.name}.xlsx").write_bytes(b"workbook")
+
+    mock_s3_client = Mock()
+
+    with patch("inventory.reports._workbook_output_file_path", Mock(stem="report")):
+        manifest_url = DeliverReportCommandHandler(s3_client=mock_s3_client).execute_sharded(shards, "rows")
+
+    manifest_call = mock_s3_client.put_object.call_args_list[-1]
+    manifest = json.loads(manifest_call.kwargs["Body"])
+    report_prefix = manifest_call.kwargs["Key"][:-len("/manifest.json")]
+
+    assert manifest_url == f"https://bucket.s3.amazonaws.com/{manifest_call.kwargs['Key']}"
+    assert report_prefix.startswith("test/path/report-")
+    assert manifest["shardBy"] == "rows" and manifest["rows"] == 3
+    assert [ (shard["name"], shard["key"], shard["rows"]) for shard in manifest["shards"] ] == [ ("part-1", f"{report_prefix}/part-1.xlsx", 1), ("part-2", f"{report_prefix}/part-2.xlsx", 2) ]
+    assert sorted(call.kwargs["Key"] for call in mock_s3_client.put_object.call_args_list[:-1]) == [ f"{report_prefix}/part-1.xlsx", f"{report_prefix}/part-2.xlsx" ]
+    assert not list(tmp_path.iterdir()), "uploaded shards should be removed from local storage"
+
+def test_given_report_template_then_every_report_gets_its_own_workbook():
+    report_template = ReportTemplate(inventory.reports._workbook_template_file_name)
+    workbooks = [ report_template.new_workbook() for _ in range(4) ]
+
+    for index, workbook in enumerate(workbooks):
+        workbook["Inventory"]["A6"] = f"report-{index}"
+
+    assert [ workbook["Inventory"]["A6"].value for workbook in workbooks ] == [ f"report-{index}" for index in range(4) ], "every report should have its own workbook"
+    assert report_template.new_workbook()["Inventory"]["A6"].value is None, "changes to one report must not leak into another"
+
+@pytest.mark.parametrize("report_handler", [ CreateReportCommandHandler(), StreamingCreateReportCommandHandler() ])
+def test_given_custom_report_layout_then_columns_of_the_layout_are_written(tmp_path, report_handler):
+    layout_file = tmp_path / "layout.json"
+    layout_file.write_text(json.dumps({ "version": 1, "template": inventory.reports._workbook_template_file_name, "worksheet": "Inventory", "firstWriteableRow": 6,
+                                        "columns": { "A": "asset_type", "C": "unique_id" } }))
+    os.environ.pop("REPORT_WORKSHEET_NAME", None)
+    os.environ.pop("REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER", None)
+
+    with patch.dict(os.environ, { "REPORT_COLUMN_LAYOUT": str(layout_file) }):
+        report_path = report_handler.execute([ InventoryData(asset_type="EC2", unique_id="id-0", ip_address="10.0.0.1") ], tmp_path / "report.xlsx")
+
+    report_worksheet = load_workbook(report_path)["Inventory"]
+
+    assert [ report_worksheet["A6"].value, report_worksheet["B6"].value, report_worksheet["C6"].value ] == [ "EC2", None, "id-0" ]
+
+@pytest.mark.parametrize("report_handler", [ CreateReportCommandHandler(), StreamingCreateReportCommandHandler() ])
+def test_given_report_layout_with_tag_columns_then_tag_values_are_written(tmp_path, report_handler):
+    layout_file = tmp_path / "layout.json"
+    layout_file.write_text(json.dumps({ "version": 1, "template": inventory.reports._workbook_template_file_name, "worksheet": "Inventory", "firstWriteableRow": 6,
+                                        "columns": { "A": "unique_id", "B": "tags.Environment", "C": "tags.System Owner" } }))
+    os.environ.pop("REPORT_WORKSHEET_NAME", None)
+    os.environ.pop("REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER", None)
+
+    with patch.dict(os.environ, { "REPORT_COLUMN_LAYOUT": str(layout_file), "INVENTORY_TAG_NAMES": "environment,system owner" }):
+        report_path = report_handler.execute([ InventoryData(unique_id="id-0", tags={ "environment": "prod", "system owner": "ops" }), InventoryData(unique_id="id-1") ], tmp_path / "report.xlsx")
+
+    report_worksheet = load_workbook(report_path)["Inventory"]
+
+    assert [ [ report_worksheet[f"{column}{row}"].value for column in "ABC" ] for row in (6, 7) ] == [ [ "id-0", "prod", "ops" ], [ "id-1", None, None ] ]
+
+def test_given_report_layout_with_unknown_attribute_then_error_is_raised():
+    with pytest.raises(ValueError):
+        ReportLayout(template_file_name="template.xlsx", worksheet_name="Inventory", first_row_number=6, columns=[ (1, "unique_id"), (2, "serial_number") ])
+
+def test_given_report_layout_then_values_are_returned_in_column_order():
+    report_layout = ReportLayout(template_file_name="template.xlsx", worksheet_name="Inventory", first_row_number=6, columns=[ (3, "owner"), (1, "unique_id") ])
+
+    assert report_layout.column_numbers == (1, 3)
+    assert report_layout.get_values(InventoryData(unique_id="id-0", owner="owner")) == ("id-0", "owner")
+
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+from unittest.mock import Mock
+from botocore.exceptions import ClientError
+import pytest
+from inventory.mappers import InventoryData
+from inventory.snapshots import InventorySnapshot, LocalSnapshotStore, S3SnapshotStore, SnapshotResource, get_snapshot_store
+
+def _get_sample_snapshot() -> InventorySnapshot:
+    snapshot = InventorySnapshot(mapping_fingerprint="0123456789abcdef")
+    snapshot.set_account("210987654321", "2020-01-01T00:00:00.000Z",
+                         { "arn:ec2": SnapshotResource(arn="arn:ec2", capture_time="2019-12-01T00:00:00.000Z",
+                                                       rows=[ InventoryData(unique_id="i-1", ip_address="10.0.0.1"), InventoryData(unique_id="i-1", ip_address="1.1.1.1") ]) })
+
+    return snapshot
+
+def test_given_saved_local_snapshot_then_it_is_loaded_with_the_same_rows(tmp_path):
+    store = LocalSnapshotStore(str(tmp_path / "snapshots" / "inventory.json.gz"))
+
+    store.save(_get_sample_snapshot())
+    loaded_snapshot = store.load()
+
+    assert loaded_snapshot.get_watermark("210987654321") == "2020-01-01T00:00:00.000Z"
+    assert [ row.ip_address for row in loaded_snapshot.get_resources("210987654321")["arn:ec2"].rows ] == [ "10.0.0.1", "1.1.1.1" ]
+    assert loaded_snapshot.mapping_fingerprint == "0123456789abcdef"
+
+def test_given_missing_local_snapshot_then_empty_snapshot_is_loaded(tmp_path):
+    loaded_snapshot = LocalSnapshotStore(str(tmp_path / "missing.json.gz")).load()
+
+    assert loaded_snapshot.get_watermark("210987654321") is None
+    assert loaded_snapshot.get_resources("210987654321") == {}
+
+def test_given_missing_s3_snapshot_then_empty_snapshot_is_loaded():
+    mock_s3_client = Mock()
+    mock_s3_client.get_object.side_effect = ClientError(error_response={'Error': {'Code': 'NoSuchKey'}}, operation_name="get_object")
+
+    loaded_snapshot = S3SnapshotStore("bucket", "snapshot.json.gz", s3_client=mock_s3_client).load()
+
+    assert loaded_snapshot.get_resources("210987654321") == {}
+
+def test_given_missing_s3_snapshot_without_list_bucket_then_access_denied_is_raised(caplog):
+    mock_s3_client = Mock()
+    mock_s3_client.get_object.side_effect = ClientError(error_response={'Error': {'Code': 'AccessDenied'}}, operation_name="get_object")
+
+    with pytest.raises(ClientError):
+        S3SnapshotStore("bucket", "snapshot.json.gz", s3_client=mock_s3_client).load()
+
+    assert "s3:ListBucket" in caplog.text
+
+def test_given_s3_snapshot_then_it_is_loaded_from_the_saved_body():
+    mock_s3_client = Mock()
+    store = S3SnapshotStore("bucket", "snapshot.json.gz", s3_client=mock_s3_client)
+
+    store.save(_get_sample_snapshot())
+    mock_s3_client.get_object.return_value = { "Body": Mock(read=Mock(return_value=mock_s3_client.put_object.call_args.kwargs["Body"])) }
+
+    assert store.load().get_watermark("210987654321") == "2020-01-01T00:00:00.000Z"
+
+def test_given_s3_location_then_s3_snapshot_store_is_used():
+    assert isinstance(get_snapshot_store("s3://bucket/path/snapshot.json.gz"), S3SnapshotStore)
+    assert isinstance(get_snapshot_store("/tmp/snapshot.json.gz"), LocalSnapshotStore)
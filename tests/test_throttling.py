@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+from unittest.mock import Mock, call, patch
+import pytest
+from botocore.exceptions import ClientError
+from inventory.throttling import RequestScheduler, TokenBucket
+
+def _throttling_error() -> ClientError:
+    return ClientError(error_response={'Error': {'Code': 'ThrottlingException'}}, operation_name="select_resource_config")
+
+def test_given_throttling_error_then_call_is_retried_with_backoff():
+    mock_sleep = Mock()
+    mock_api = Mock(side_effect=[ _throttling_error(), _throttling_error(), { "Results": [] } ])
+    scheduler = RequestScheduler(rate_limits={ "SelectResourceConfig": 0 }, backoff_base_seconds=1, sleep=mock_sleep)
+
+    with patch("inventory.throttling.random.uniform", side_effect=lambda low, high: high):
+        assert scheduler.call("SelectResourceConfig", mock_api, Expression="foo", NextToken="page2") == { "Results": [] }
+
+    assert mock_api.call_args_list == [ call(Expression="foo", NextToken="page2") ] * 3, "retries must resume from the same NextToken"
+    assert mock_sleep.call_args_list == [ call(2), call(4) ], "backoff should grow exponentially"
+    assert scheduler.metrics == { "SelectResourceConfig": { "requests": 3, "retries": 2, "failures": 0, "throttled_seconds": 6 } }
+
+def test_given_non_retryable_error_then_it_is_raised_without_retrying():
+    mock_sleep = Mock()
+    mock_api = Mock(side_effect=ClientError(error_response={'Error': {'Code': 'AccessDenied'}}, operation_name="assume_role"))
+    scheduler = RequestScheduler(sleep=mock_sleep)
+
+    with pytest.raises(ClientError):
+        scheduler.call("AssumeRole", mock_api)
+
+    assert len(mock_api.mock_calls) == 1
+    assert scheduler.metrics["AssumeRole"]["failures"] == 1
+
+def test_given_throttling_persists_then_error_is_raised_after_max_attempts():
+    mock_api = Mock(side_effect=_throttling_error())
+    scheduler = RequestScheduler(max_attempts=3, sleep=Mock())
+
+    with pytest.raises(ClientError):
+        scheduler.call("SelectResourceConfig", mock_api)
+
+    assert len(mock_api.mock_calls) == 3
+    assert scheduler.metrics["SelectResourceConfig"]["retries"] == 2
+
+def test_given_token_bucket_is_empty_then_callers_wait_for_refill_in_turn():
+    now = [ 0.0 ]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+
+    assert [ bucket.reserve() for _ in range(4) ] == [ 0, 0, 0.5, 1.0 ]
+
+    now[0] = 10.0
+
+    assert bucket.reserve() == 0, "bucket should refill up to its capacity over time"
+
+def test_given_rate_limit_then_calls_of_each_scope_are_limited_separately():
+    mock_sleep = Mock()
+    scheduler = RequestScheduler(rate_limits={ "SelectResourceConfig": 1 }, sleep=mock_sleep, clock=lambda: 0.0)
+
+    for scope in [ "account-1", "account-2", "account-1" ]:
+        scheduler.call("SelectResourceConfig", Mock(), scope=scope)
+
+    assert mock_sleep.call_args_list == [ call(1.0) ], "only the second call within the same scope should wait"
+    assert scheduler.metrics["SelectResourceConfig"]["throttled_seconds"] == 1.0
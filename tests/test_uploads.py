@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+from unittest.mock import Mock
+import pytest
+from inventory.uploads import MIN_UPLOAD_PART_SIZE, S3MultipartUploadStream
+
+def _create_s3_client() -> Mock:
+    mock_s3_client = Mock()
+    mock_s3_client.create_multipart_upload.return_value = { "UploadId": "upload-1" }
+    mock_s3_client.upload_part.side_effect = lambda PartNumber, **kwargs: { "ETag": f"etag-{PartNumber}" }
+
+    return mock_s3_client
+
+def test_given_object_smaller_than_part_then_it_is_uploaded_with_put_object():
+    mock_s3_client = _create_s3_client()
+
+    with S3MultipartUploadStream(mock_s3_client, "bucket", "report.xlsx") as upload:
+        upload.write(b"small report")
+
+    mock_s3_client.put_object.assert_called_once_with(Bucket="bucket", Key="report.xlsx", Body=b"small report")
+    mock_s3_client.create_multipart_upload.assert_not_called()
+
+def test_given_object_larger_than_part_then_parts_are_uploaded_in_order_and_completed():
+    mock_s3_client = _create_s3_client()
+    data = bytes(range(256)) * (MIN_UPLOAD_PART_SIZE * 5 // 2 // 256)
+
+    with S3MultipartUploadStream(mock_s3_client, "bucket", "report.xlsx", part_size=MIN_UPLOAD_PART_SIZE, max_workers=2) as upload:
+        for offset in range(0, len(data), 1000000):
+            upload.write(data[offset:offset + 1000000])
+
+        assert upload.tell() == len(data)
+
+    uploaded_parts = sorted(mock_s3_client.upload_part.call_args_list, key=lambda call: call.kwargs["PartNumber"])
+
+    assert b"".join(call.kwargs["Body"] for call in uploaded_parts) == data, "parts should add up to the written bytes"
+    assert [ len(call.kwargs["Body"]) for call in uploaded_parts[:-1] ] == [ MIN_UPLOAD_PART_SIZE ] * 2
+    mock_s3_client.complete_multipart_upload.assert_called_once_with(Bucket="bucket", Key="report.xlsx", UploadId="upload-1",
+                                                                     MultipartUpload={ "Parts": [ { "PartNumber": part_number, "ETag": f"etag-{part_number}" } for part_number in (1, 2, 3) ] })
+    mock_s3_client.put_object.assert_not_called()
+
+def test_given_error_while_writing_then_multipart_upload_is_aborted():
+    mock_s3_client = _create_s3_client()
+
+    with pytest.raises(RuntimeError):
+        with S3MultipartUploadStream(mock_s3_client, "bucket", "report.xlsx", part_size=MIN_UPLOAD_PART_SIZE) as upload:
+            upload.write(b"0" * (MIN_UPLOAD_PART_SIZE + 1))
+
+            raise RuntimeError("report failed")
+
+    mock_s3_client.abort_multipart_upload.assert_called_once_with(Bucket="bucket", Key="report.xlsx", UploadId="upload-1")
+    mock_s3_client.complete_multipart_upload.assert_not_called()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# AWS DISCLAMER
+# ---
+
+# The following files are provided by AWS Professional Services describe the process to create a IAM Policy with description.
+
+# These are non-production ready and are to be used for testing purposes.
+
+# These files is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND, either express or implied. See the License
+# for the specific language governing permissions and limitations under the License.
+
+# (c) 2019 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http://aws.amazon.com/agreement or other written agreement between Customer and Amazon Web Services, Inc.​
+import csv
+import io
+import json
+import os
+from unittest.mock import Mock, patch
+import pytest
+from openpyxl import load_workbook
+from inventory.mappers import INVENTORY_DATA_FIELDS, InventoryData
+from inventory.reports import DeliverReportCommandHandler, MultiFormatCreateReportCommandHandler, StreamingCreateReportCommandHandler, get_report_formats
+from inventory.writers import CsvReportWriter, JsonLinesReportWriter, get_report_writer
+
+def _get_inventory_rows():
+    return [ InventoryData(asset_type="EC2", unique_id="i-0", ip_address="10.0.0.1", owner="a, \"b\""), InventoryData(asset_type="RDS", unique_id="db-0", account_id="123456789012") ]
+
+def test_given_csv_writer_then_header_and_rows_are_written_and_output_is_left_open():
+    output = io.BytesIO()
+
+    report_writer = CsvReportWriter(output)
+    report_writer.write_rows(_get_inventory_rows())
+    report_writer.close()
+
+    rows = list(csv.reader(io.StringIO(output.getvalue().decode("utf-8"))))
+
+    assert not output.closed
+    assert rows[0] == list(INVENTORY_DATA_FIELDS)
+    assert [ dict(zip(rows[0], row))["owner"] for row in rows[1:] ] == [ "a, \"b\"", "" ]
+
+def test_given_rows_with_tags_then_csv_writer_writes_tags_as_json_object():
+    output = io.BytesIO()
+
+    report_writer = CsvReportWriter(output)
+    report_writer.write_rows([ InventoryData(unique_id="i-0", tags={ "environment": "prod" }), InventoryData(unique_id="i-1") ])
+    report_writer.close()
+
+    rows = list(csv.DictReader(io.StringIO(output.getvalue().decode("utf-8"))))
+
+    assert [ row["tags"] for row in rows ] == [ "{\"environment\":\"prod\"}", "" ]
+
+def test_given_json_lines_writer_then_one_object_per_row_is_written():
+    output = io.BytesIO()
+
+    report_writer = JsonLinesReportWriter(output)
+    report_writer.write_rows(_get_inventory_rows())
+    report_writer.close()
+
+    rows = [ json.loads(line) for line in output.getvalue().decode("utf-8").splitlines() ]
+
+    assert [ (row["unique_id"], row["account_id"]) for row in rows ] == [ ("i-0", None), ("db-0", "123456789012") ]
+
+def test_given_parquet_writer_then_rows_can_be_read_back():
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    output = io.BytesIO()
+
+    report_writer = get_report_writer("parquet", output)
+    report_writer.write_rows(_get_inventory_rows())
+    report_writer.close()
+
+    table = pyarrow_parquet.read_table(io.BytesIO(output.getvalue()))
+
+    assert table.column_names == list(INVENTORY_DATA_FIELDS)
+    assert table.column("unique_id").to_pylist() == [ "i-0", "db-0" ]
+
+def test_given_unsupported_report_format_then_error_is_raised():
+    with pytest.raises(ValueError):
+        get_report_writer("xml", io.BytesIO())
+
+    with patch.dict(os.environ, { "REPORT_FORMATS": "xlsx,xml" }), pytest.raises(ValueError):
+        get_report_formats()
+
+def test_given_report_formats_then_duplicates_are_removed_and_order_is_kept():
+    with patch.dict(os.environ, { "REPORT_FORMATS": "jsonl, CSV,xlsx,csv" }):
+        assert get_report_formats() == [ "jsonl", "csv", "xlsx" ]
+
+def test_given_several_report_formats_then_inventory_is_read_once_and_written_to_every_format(tmp_path):
+    os.environ["REPORT_WORKSHEET_NAME"] = "Inventory"
+    os.environ["REPORT_WORKSHEET_FIRST_WRITEABLE_ROW_NUMBER"] = "6"
+    inventory = iter(_get_inventory_rows())
+
+    with patch("inventory.reports._workbook_output_file_path", tmp_path / "report.xlsx"):
+        report_paths = MultiFormatCreateReportCommandHandler([ "xlsx", "csv", "jsonl" ], StreamingCreateReportCommandHandler(), batch_rows=1).execute(inventory)
+
+    assert report_paths == { "xlsx": str(tmp_path / "report.xlsx"), "csv": str(tmp_path / "report.csv"), "jsonl": str(tmp_path / "report.jsonl") }
+    assert [ load_workbook(report_paths["xlsx"])["Inventory"][f"A{row}"].value for row in (6, 7) ] == [ "i-0", "db-0" ]
+    assert len((tmp_path / "report.csv").read_text().splitlines()) == 3
+    assert len((tmp_path / "report.jsonl").read_text().splitlines()) == 2
+
+def test_given_only_columnar_report_formats_then_no_workbook_is_created(tmp_path):
+    mock_create_report_handler = Mock()
+
+    with patch("inventory.reports._workbook_output_file_path", tmp_path / "report.xlsx"):
+        report_paths = MultiFormatCreateReportCommandHandler([ "jsonl" ], mock_create_report_handler).execute(_get_inventory_rows())
+
+    mock_create_report_handler.execute.assert_not_called()
+    assert list(report_paths) == [ "jsonl" ]
+    assert len((tmp_path / "report.jsonl").read_text().splitlines()) == 2
+
+def test_given_stream_delivery_of_several_formats_then_every_format_is_uploaded_with_the_same_timestamp():
+    os.environ["REPORT_TARGET_BUCKET_NAME"] = "bucket"
+    os.environ["REPORT_TARGET_BUCKET_PATH"] = "test/path"
+    mock_s3_client = Mock()
+
+    with patch("inventory.reports._workbook_output_file_path", Mock(stem="report")):
+        report_urls = DeliverReportCommandHandler(s3_client=mock_s3_client).execute_streaming_formats([ "csv", "jsonl" ], lambda report_outputs: MultiFormatCreateReportCommandHandler([ "csv", "jsonl" ], Mock()).execute(_get_inventory_rows(), report_outputs))
+
+    uploaded_keys = [ call.kwargs["Key"] for call in mock_s3_client.put_object.call_args_list ]
+
+    assert sorted(uploaded_keys) == sorted(url.split(".amazonaws.com/")[1] for url in report_urls.values())
+    assert { key.rsplit(".", 1)[0] for key in uploaded_keys } == { uploaded_keys[0].rsplit(".", 1)[0] }, "every format should share the report timestamp"
+    assert [ url.rsplit(".", 1)[1] for url in report_urls.values() ] == [ "csv", "jsonl" ]